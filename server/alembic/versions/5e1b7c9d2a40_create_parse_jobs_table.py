@@ -0,0 +1,54 @@
+"""create parse jobs table
+
+Revision ID: 5e1b7c9d2a40
+Revises: 0d03ae5e3938
+Create Date: 2026-10-18 16:40:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1b7c9d2a40'
+down_revision: Union[str, None] = '0d03ae5e3938'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('parse_jobs',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.String(length=255), nullable=False),
+    sa.Column('repo_name', sa.Text(), nullable=True),
+    sa.Column('branch_name', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=255), nullable=True),
+    sa.Column('phase', sa.String(length=255), nullable=True),
+    sa.Column('files_processed', sa.Integer(), nullable=True),
+    sa.Column('files_total', sa.Integer(), nullable=True),
+    sa.Column('message', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('started_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('phase_started_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('finished_at', sa.TIMESTAMP(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.drop_constraint('check_status', 'projects', type_='check')
+    op.create_check_constraint(
+        'check_status', 'projects', "status IN ('created', 'parsing', 'ready', 'error')"
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE projects SET status = 'created' WHERE status = 'parsing'")
+    op.drop_constraint('check_status', 'projects', type_='check')
+    op.create_check_constraint(
+        'check_status', 'projects', "status IN ('created', 'ready', 'error')"
+    )
+    op.drop_table('parse_jobs')
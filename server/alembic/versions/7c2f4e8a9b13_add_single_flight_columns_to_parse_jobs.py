@@ -0,0 +1,28 @@
+"""add single flight columns to parse jobs
+
+Revision ID: 7c2f4e8a9b13
+Revises: 5e1b7c9d2a40
+Create Date: 2026-10-18 18:05:41.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f4e8a9b13'
+down_revision: Union[str, None] = '5e1b7c9d2a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('parse_jobs', sa.Column('head_sha', sa.String(length=255)))
+    op.add_column('parse_jobs', sa.Column('superseded_by', sa.String(length=36)))
+
+
+def downgrade() -> None:
+    op.drop_column('parse_jobs', 'superseded_by')
+    op.drop_column('parse_jobs', 'head_sha')
@@ -1,44 +1,39 @@
-from server.utils.graph_db_helper import Neo4jGraph
+from server.utils.graph_db_helper import GraphSingleton
+from server.utils.graph_snapshot import GraphSnapshotStoreSingleton
 from server.db.session import SessionManager
 from server.schemas import Endpoint
 
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
 
 
 def find_entry_points(identifiers, directory, project_id):
-    all_inbound_nodes = set()
-
-    for identifier in identifiers:
-        traversal_result = neo4j_graph.traverse(identifier=identifier,
-                                                project_id=project_id, neighbors_fn=neo4j_graph.find_inbound_neighbors)
-        for item in traversal_result:
-            if isinstance(item, dict):
-                all_inbound_nodes.update([frozenset(item.items())])
-
-    entry_points = set()
-    for node in all_inbound_nodes:
-        node_dict = dict(node)
-        traversal_result = neo4j_graph.traverse(identifier=node_dict['id'],
-                                                project_id=project_id, neighbors_fn=neo4j_graph.find_inbound_neighbors)
-        if len(traversal_result) == 1:
-            entry_points.add(node)
-
-    return entry_points
+    # Ids of the endpoints that reach the changed functions, looked up in the
+    # snapshot's reachability index, or by a traversal on the graph backend
+    # when the project has no snapshot
+    if not identifiers:
+        return set()
+    snapshot = GraphSnapshotStoreSingleton.get_instance().get(project_id)
+    if snapshot is not None:
+        return snapshot.find_reaching_endpoints(identifiers)
+    with SessionManager() as db:
+        endpoint_ids = [
+            identifier for identifier, in db.query(Endpoint.identifier).filter(
+                Endpoint.project_id == project_id
+            )
+        ]
+    return graph_db.find_reaching_endpoints(identifiers, endpoint_ids, project_id)
 
 
 
 def find_paths(entry_points, project_id):
-    paths = {}
+    if not entry_points:
+        return {}
     with SessionManager() as db:
-        for entry_point in entry_points:
-            entry_point_dict = dict(entry_point)
-            endpoint = db.query(Endpoint.path).filter(
-                Endpoint.identifier == entry_point_dict['id'],
-                Endpoint.project_id == project_id
-            ).first()
-            if endpoint:
-                paths[entry_point_dict['id']] = endpoint.path
-    return paths
+        endpoints = db.query(Endpoint.identifier, Endpoint.path).filter(
+            Endpoint.project_id == project_id,
+            Endpoint.identifier.in_(list(entry_points))
+        ).all()
+    return {endpoint.identifier: endpoint.path for endpoint in endpoints}
 
 
 def get_paths_from_identifiers(identifiers, directory, project_id):
@@ -7,6 +7,8 @@ import os
 import argparse
 import logging
 
+from server.utils.local_git_service import LocalGitService
+
 # Load Python grammar for Tree-sitter
 parser = get_parser("python")
 
@@ -60,9 +62,12 @@ def get_pattern(repo_name, branch_name):
 
 def _parse_functions_from_file(file_path, repo_details, branch_name):
     if isinstance(repo_details, dict):
-        # Local repository handling
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        # Local repository handling: the file at the head of the branch, read
+        # from the object store rather than the working tree
+        relative_path = os.path.relpath(file_path, repo_details["path"])
+        content = LocalGitService.read_files(
+            repo_details["path"], branch_name, [relative_path]
+        )[relative_path]
     else:
         # GitHub repository handling
         file_path_extracted = extract_file_name(repo_details.name, branch_name, file_path)
@@ -4,17 +4,17 @@ from langchain_openai.chat_models import ChatOpenAI
 import os
 
 from server.utils.github_helper import GithubService
-from server.utils.graph_db_helper import Neo4jGraph
+from server.utils.graph_db_helper import GraphSingleton
 from server.parse import get_node, get_flow
 
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
 
 db_path = ".momentum/momentum.db"
 
 class Dependencies:
     def __init__(self, user_id):
         self.user_id = user_id
-        self.neo4j_graph = Neo4jGraph()
+        self.graph_db = GraphSingleton.get_instance()
         self.openai_client = get_llm_client(user_id, "gpt-3.5-turbo-0125")
         self.user_pref_openai_client = get_llm_client(user_id, os.environ['OPENAI_MODEL_REASONING'])
         self.plan_client = self.user_pref_openai_client
@@ -30,7 +30,7 @@ class Dependencies:
         flow: list,
         print_text: bool = True,  # optionally prints text; helpful for understanding the function & debugging
     ) -> str:
-        calls = self.neo4j_graph.fetch_first_order_neighbors(function_identifier, project_details["id"])
+        calls = self.graph_db.fetch_first_order_neighbors(function_identifier, project_details["id"])
 
         # Step 1: Generate an explanation of the function
         detect_system_message = SystemMessage(
@@ -81,9 +81,8 @@ class Dependencies:
         flow = get_flow(function_identifier, project_details["id"])
         flow_trimmed = [x.split(':')[1] for x in flow if x != function_identifier]
         output = []
-        for function in flow:
-            node = get_node(function, project_details)
-            code = GithubService.fetch_method_from_repo(node)
+        nodes = [get_node(function, project_details) for function in flow]
+        for function, code in zip(flow, GithubService.fetch_methods_from_repo(nodes)):
             output += ( await self.dependencies_from_function(project_details, function, code, flow_trimmed))
         return output+flow_trimmed
 
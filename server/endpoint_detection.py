@@ -2,9 +2,8 @@ import asyncio
 import json
 import os
 import re
-from pathlib import Path
 from typing import Optional
-import os
+from sqlalchemy.dialects.postgresql import insert
 from server.db.session import SessionManager
 from server.schemas import Project, Endpoint, Explanation, Pydantic
 import logging
@@ -12,14 +11,20 @@ import logging
 from tree_sitter_languages import get_language, get_parser
 from fastapi import HTTPException
 from server.utils.github_helper import GithubService
-from server.utils.graph_db_helper import Neo4jGraph
+from server.utils.file_filter import FileFilter
+from server.utils.graph_db_helper import GraphSingleton
+from server.utils.streamed_sources import read_source
+from server.utils.symbol_index import SymbolIndex
 from server.celery_worker import celery_worker
 
 PY_LANGUAGE = get_language("python")
+DECORATED_DEFINITION_QUERY = PY_LANGUAGE.query(
+    "(decorated_definition) @decorated_definition"
+)
 
 codebase_map = f"/.momentum/momentum.db"
 
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
 
 
 class EndpointManager:
@@ -29,15 +34,27 @@ class EndpointManager:
          directory: str,
         router_prefix_file_mapping: Optional[dict] = {},
         file_index: Optional[dict] = {},
+        symbol_index: Optional[SymbolIndex] = None,
+        sources: Optional[dict] = None,
+        edge_recorder=None,
     ):
         self.directory = directory
         self.db_path = f"{directory}/.momentum/momentum.db"
         self.router_prefix_file_mapping = router_prefix_file_mapping
         self.file_index = file_index
+        self._symbol_index = symbol_index
+        # function identifier -> response model of the route
+        self.response_models = {}
+        # In-memory contents of a streamed repository
+        self.sources = sources
+        # Collects the edges of a parse, which writes them along with the
+        # call edges; without one they go straight to the graph
+        self.edge_recorder = edge_recorder
 
 
     
-    def extract_path(self, decorator):
+    @staticmethod
+    def extract_path(decorator):
         # Find the position of the first opening parenthesis and the following comma
         start = decorator.find("(") + 1
         end = decorator.find(",", start)
@@ -52,380 +69,367 @@ class EndpointManager:
             path = "/"
         return path
 
-    def identify_django_endpoints(self, project_path, project_id):
-        parser = get_parser("python")
-
-        endpoints = []
-
-        # Find all urls.py files in the project
-        urls_files = list(Path(project_path).rglob("urls.py"))
-
-        for urls_file in urls_files:
-            # Read the content of the urls.py file
-            with open(urls_file, "r") as file:
-                content = file.read()
-
-            # Parse the urls.py file using tree-sitter
-            tree = parser.parse(bytes(content, "utf8"))
-            root_node = tree.root_node
-
-            # Find the assignment node for the urlpatterns variable
-            assignment_nodes = [
-                node
-                for node in root_node.children
-                if node.type == "expression_statement"
-            ]
-            for assignment_node in assignment_nodes:
-                if assignment_node.children[0].type == "assignment":
-                    urlpatterns_node = assignment_node.children[0].children[2]
-                    if urlpatterns_node.type == "list":
-                        # Iterate over the URL patterns in the urlpatterns list
-                        for url_pattern_node in urlpatterns_node.children:
-                            if url_pattern_node.type == "call":
-                                url_pattern = None
-                                view_name = None
-                                endpoint_name = None
-
-                                # Find the argument list node
-                                argument_list_node = None
-                                for child_node in url_pattern_node.children:
-                                    if child_node.type == "argument_list":
-                                        argument_list_node = child_node
-                                        break
-
-                                if argument_list_node:
-                                    # Iterate over the arguments in the argument list
-                                    for (
-                                        argument_node
-                                    ) in argument_list_node.children:
-                                        if argument_node.type == "string":
-                                            url_pattern = (
-                                                argument_node.text.decode(
-                                                    "utf8"
-                                                ).strip("'\"")
-                                            )
-                                            if url_pattern == "":
-                                                url_pattern = "/"
-                                        elif argument_node.type == "call":
-                                            # Find the identifier node inside the call
-                                            identifier_node = None
-                                            for (
-                                                child_node
-                                            ) in argument_node.children:
-                                                if (
-                                                    child_node.type
-                                                    == "attribute"
-                                                ):
-                                                    identifier_node = (
-                                                        child_node
-                                                    )
-                                                    break
-
-                                            if identifier_node:
-                                                view_name = identifier_node.text.decode(
-                                                    "utf8"
-                                                )
-                                        elif (
-                                            argument_node.type
-                                            == "keyword_argument"
-                                        ):
-                                            # Check if the keyword argument is 'name'
+    @property
+    def symbol_index(self):
+        if self._symbol_index is None:
+            self._symbol_index = SymbolIndex(self.file_index)
+        return self._symbol_index
+
+    @staticmethod
+    def extract_django_urlpatterns(tree):
+        # Pure part of Django detection: the (url pattern, view) pairs of
+        # every module level list assignment, such as urlpatterns in urls.py
+        root_node = tree.root_node
+        urlpatterns = []
+
+        # Find the assignment node for the urlpatterns variable
+        assignment_nodes = [
+            node
+            for node in root_node.children
+            if node.type == "expression_statement"
+        ]
+        for assignment_node in assignment_nodes:
+            if assignment_node.children[0].type == "assignment":
+                urlpatterns_node = assignment_node.children[0].children[2]
+                if urlpatterns_node.type == "list":
+                    # Iterate over the URL patterns in the urlpatterns list
+                    for url_pattern_node in urlpatterns_node.children:
+                        if url_pattern_node.type == "call":
+                            url_pattern = None
+                            view_name = None
+
+                            # Find the argument list node
+                            argument_list_node = None
+                            for child_node in url_pattern_node.children:
+                                if child_node.type == "argument_list":
+                                    argument_list_node = child_node
+                                    break
+
+                            if argument_list_node:
+                                # Iterate over the arguments in the argument list
+                                for (
+                                    argument_node
+                                ) in argument_list_node.children:
+                                    if argument_node.type == "string":
+                                        url_pattern = (
+                                            argument_node.text.decode(
+                                                "utf8"
+                                            ).strip("'\"")
+                                        )
+                                        if url_pattern == "":
+                                            url_pattern = "/"
+                                    elif argument_node.type == "call":
+                                        # Find the identifier node inside the call
+                                        identifier_node = None
+                                        for (
+                                            child_node
+                                        ) in argument_node.children:
                                             if (
-                                                argument_node.children[
-                                                    0
-                                                ].text.decode("utf8")
-                                                == "name"
+                                                child_node.type
+                                                == "attribute"
                                             ):
-                                                endpoint_name = (
-                                                    argument_node.children[2]
-                                                    .text.decode("utf8")
-                                                    .strip("'\"")
+                                                identifier_node = (
+                                                    child_node
                                                 )
+                                                break
+
+                                        if identifier_node:
+                                            view_name = identifier_node.text.decode(
+                                                "utf8"
+                                            )
 
-                                if url_pattern and view_name:
-                                    # Determine the view type (function or class-based)
+                            if url_pattern and view_name:
+                                urlpatterns.append({
+                                    "url_pattern": url_pattern,
+                                    "view_name": view_name,
+                                })
+        return urlpatterns
+
+    def get_django_endpoints(self, urlpatterns, urls_file, project_id):
+        endpoints = []
+        for urlpattern in urlpatterns:
+            url_pattern = urlpattern["url_pattern"]
+            view_name = urlpattern["view_name"]
+            # Determine the view type (function or class-based)
 
-                                    if view_name.endswith("as_view"):
-                                        view_type = "class"
-                                    else:
-                                        view_type = "function"
+            if view_name.endswith("as_view"):
+                view_type = "class"
+            else:
+                view_type = "function"
 
-                                    view = (
-                                        view_name
-                                        if not view_name.endswith("as_view")
-                                        else view_name.rsplit(".", 1)[0]
+            view = (
+                view_name
+                if not view_name.endswith("as_view")
+                else view_name.rsplit(".", 1)[0]
+            )
+            logging.info(f"project_id: {project_id} get_django_endpoints -> view_name : ,{view_name}")
+            file_path, identifier = (
+                self.resolve_called_view_name(
+                    view,
+                    str(urls_file),
+                    view_type,
+                )
+            )
+            logging.info(f"project_id: {project_id} get_django_endpoints -> file_path : ,{file_path},  and identifier : {identifier}")
+            if identifier:
+                entry_point = (
+                    file_path.replace(
+                        self.directory, ""
+                    )
+                    + ":"
+                    + identifier
+                )
+                # Append the endpoint information to the list
+                endpoints.append((
+                    "HTTP " + url_pattern,
+                    entry_point,
+                ))
+
+                node = self.get_node(entry_point, project_id)
+                if node:
+                    generic_django_views = [
+                        "RedirectView",
+                        "TemplateView",
+                        "View",
+                        "ArchiveIndexView",
+                        "DateDetailView",
+                        "DayArchiveView",
+                        "MonthArchiveView",
+                        "TodayArchiveView",
+                        "WeekArchiveView",
+                        "YearArchiveView",
+                        "DetailView",
+                        "CreateView",
+                        "DeleteView",
+                        "FormView",
+                        "UpdateView",
+                    ]
+                    for view in generic_django_views:
+                        code = GithubService.fetch_method_from_repo(node)
+                        if view in code:
+                            model_match = re.search(
+                                r"model\s*=\s*(\w+)",
+                                code,
+                            )
+                            if model_match:
+                                model_value = (
+                                    model_match.group(
+                                        1
                                     )
-                                    logging.info(f"project_id: {project_id} identify_django_endpoints -> view_name : ,{view_name}")
-                                    file_path, identifier = (
-                                        self.resolve_called_view_name(
-                                            view,
-                                            str(urls_file),
-                                            self.file_index,
+                                )
+                                (
+                                    model_file,
+                                    model_name,
+                                ) = self.resolve_called_view_name(
+                                    model_value,
+                                    file_path,
+                                    "class",
+                                )
+                                if model_name:
+                                    model_identifier = (
+                                        model_file.replace(
                                             self.directory,
-                                            view_type,
+                                            "",
                                         )
+                                        + ":"
+                                        + model_name
                                     )
-                                    logging.info(f"project_id: {project_id} identify_django_endpoints -> file_path : ,{file_path},  and identifier : {identifier}")
-                                    if identifier:
-                                        entry_point = (
-                                            file_path.replace(
-                                                self.directory, ""
+                                    self.connect_nodes(
+                                        entry_point,
+                                        model_identifier,
+                                        project_id,
+                                        {
+                                            "action": (
+                                                "calls"
                                             )
-                                            + ":"
-                                            + identifier
+                                        },
+                                    )
+                            code = GithubService.fetch_method_from_repo(node)
+                            form_match = re.search(
+                                r"form_class\s*=\s*(\w+)",
+                                code,
+                            )
+                            if form_match:
+                                form_value = (
+                                    form_match.group(1)
+                                )
+                                (
+                                    form_file,
+                                    form_name,
+                                ) = self.resolve_called_view_name(
+                                    form_value,
+                                    file_path,
+                                    "class",
+                                )
+                                if form_name:
+                                    form_identifier = (
+                                        form_file.replace(
+                                            self.directory,
+                                            "",
                                         )
-                                        # Append the endpoint information to the list
-                                        endpoints.append((
-                                            "HTTP " + url_pattern,
-                                            entry_point,
-                                        ))
-
-                                        node = self.get_node(entry_point, project_id)
-                                        if node:
-                                            generic_django_views = [
-                                                "RedirectView",
-                                                "TemplateView",
-                                                "View",
-                                                "ArchiveIndexView",
-                                                "DateDetailView",
-                                                "DayArchiveView",
-                                                "MonthArchiveView",
-                                                "TodayArchiveView",
-                                                "WeekArchiveView",
-                                                "YearArchiveView",
-                                                "DetailView",
-                                                "CreateView",
-                                                "DeleteView",
-                                                "FormView",
-                                                "UpdateView",
-                                            ]
-                                            for view in generic_django_views:
-                                                code = GithubService.fetch_method_from_repo(node)
-                                                if view in code:
-                                                    model_match = re.search(
-                                                        r"model\s*=\s*(\w+)",
-                                                        code,
-                                                    )
-                                                    if model_match:
-                                                        model_value = (
-                                                            model_match.group(
-                                                                1
-                                                            )
-                                                        )
-                                                        (
-                                                            model_file,
-                                                            model_name,
-                                                        ) = self.resolve_called_view_name(
-                                                            model_value,
-                                                            file_path,
-                                                            self.file_index,
-                                                            self.directory,
-                                                            "class",
-                                                        )
-                                                        if model_name:
-                                                            model_identifier = (
-                                                                model_file.replace(
-                                                                    self.directory,
-                                                                    "",
-                                                                )
-                                                                + ":"
-                                                                + model_name
-                                                            )
-                                                            neo4j_graph.connect_nodes(
-                                                                entry_point,
-                                                                model_identifier,
-                                                                project_id,
-                                                                {
-                                                                    "action": (
-                                                                        "calls"
-                                                                    )
-                                                                },
-                                                            )
-                                                    code = GithubService.fetch_method_from_repo(node)
-                                                    form_match = re.search(
-                                                        r"form_class\s*=\s*(\w+)",
-                                                        code,
-                                                    )
-                                                    if form_match:
-                                                        form_value = (
-                                                            form_match.group(1)
-                                                        )
-                                                        (
-                                                            form_file,
-                                                            form_name,
-                                                        ) = self.resolve_called_view_name(
-                                                            form_value,
-                                                            file_path,
-                                                            self.file_index,
-                                                            self.directory,
-                                                            "class",
-                                                        )
-                                                        if form_name:
-                                                            form_identifier = (
-                                                                form_file.replace(
-                                                                    self.directory,
-                                                                    "",
-                                                                )
-                                                                + ":"
-                                                                + form_name
-                                                            )
-                                                            neo4j_graph.connect_nodes(
-                                                                entry_point,
-                                                                form_identifier,
-                                                                project_id,
-                                                                {
-                                                                    "action": (
-                                                                        "calls"
-                                                                    )
-                                                                },
-                                                            )
+                                        + ":"
+                                        + form_name
+                                    )
+                                    self.connect_nodes(
+                                        entry_point,
+                                        form_identifier,
+                                        project_id,
+                                        {
+                                            "action": (
+                                                "calls"
+                                            )
+                                        },
+                                    )
 
         return endpoints
 
-    def find_endpoints_from_decorator(self, source_code, filename, project_id):
-        parser = get_parser("python")
-        tree = parser.parse(bytes(source_code, "utf8"))
-
+    def get_decorator_endpoints(self, decorator_endpoints, filename, project_id):
         endpoints = []
+        for decorator_endpoint in decorator_endpoints:
+            function_identifier = (
+                filename.replace(self.directory, "")
+                + ":"
+                + decorator_endpoint["function"]
+            )
+            response = decorator_endpoint["response_model"]
+            if response is not None:
+                # Written to the graph in one batch by analyse_endpoints
+                self.response_models[function_identifier] = response
+            for entrypoint in decorator_endpoint["endpoints"]:
+                endpoints.append((entrypoint, function_identifier))
+        return endpoints
+
+    @staticmethod
+    def extract_decorator_endpoints(source_code, tree=None, decorated_definitions=None):
+        # Pure part of decorator based detection: returns the endpoints found
+        # per decorated function without touching the graph, so it can run in
+        # a parse worker. decorated_definitions, in source order, can be passed
+        # in when the caller already queried the tree for them.
+        if tree is None:
+            parser = get_parser("python")
+            tree = parser.parse(bytes(source_code, "utf8"))
+        if decorated_definitions is None:
+            decorated_definitions = [
+                node for node, _ in DECORATED_DEFINITION_QUERY.captures(tree.root_node)
+            ]
+
+        decorator_endpoints = []
 
-        def visit_node(node):
-            if node.type == "decorated_definition":
-                for child in node.children:
-                    if child.type == "decorator":
-                        decorator_text = source_code[
-                            child.start_byte : child.end_byte
-                        ]
-                        decorators = [
-                            ".get",
-                            ".post",
-                            ".put",
-                            ".patch",
-                            ".delete",
-                            ".options",
-                            ".head",
-                            ".trace",
-                            ".websocket",
-                            ".route",
-                        ]
-                        if any(
-                            decorator in decorator_text
-                            for decorator in decorators
+        for node in decorated_definitions:
+            for child in node.children:
+                if child.type == "decorator":
+                    decorator_text = source_code[
+                        child.start_byte : child.end_byte
+                    ]
+                    decorators = [
+                        ".get",
+                        ".post",
+                        ".put",
+                        ".patch",
+                        ".delete",
+                        ".options",
+                        ".head",
+                        ".trace",
+                        ".websocket",
+                        ".route",
+                    ]
+                    if any(
+                        decorator in decorator_text
+                        for decorator in decorators
+                    ):
+                        if (
+                            ".patch." in decorator_text
+                        ):  # hardcoded to handle decorators with 3 levels
+                            continue
+                        function_name, parameters, start, end, text = (
+                            EndpointManager.extract_function_metadata(node)
+                        )
+                        response = None
+                        endpoint = (
+                            (
+                                (decorator_text.split("(")[0]).split(".")[
+                                    -1
+                                ]
+                            ).upper()
+                            + " "
+                            + EndpointManager.extract_path(decorator_text)
+                        )
+                        endpoint_list = [endpoint]
+                        # handle flask endpoint definitions
+                        if (
+                            ".route" in decorator_text
+                            and "methods" in decorator_text
                         ):
-                            if (
-                                ".patch." in decorator_text
-                            ):  # hardcoded to handle decorators with 3 levels
-                                continue
-                            function_name, parameters, start, end, text = (
-                                self.extract_function_metadata(node)
-                            )
-                            function_identifier = (
-                                filename.replace(self.directory, "")
-                                + ":"
-                                + function_name
+                            methods_text = (
+                                decorator_text.split("methods=")[1]
+                                .split(")")[0]
+                                .strip()
                             )
-                            endpoint = (
-                                (
-                                    (decorator_text.split("(")[0]).split(".")[
-                                        -1
-                                    ]
-                                ).upper()
-                                + " "
-                                + self.extract_path(decorator_text)
+                            methods_text = methods_text.strip("[").strip(
+                                "]"
                             )
-                            endpoint_list = [endpoint]
-                            # handle flask endpoint definitions
-                            if (
-                                ".route" in decorator_text
-                                and "methods" in decorator_text
-                            ):
-                                methods_text = (
-                                    decorator_text.split("methods=")[1]
-                                    .split(")")[0]
-                                    .strip()
-                                )
-                                methods_text = methods_text.strip("[").strip(
-                                    "]"
-                                )
-                                methods = [
-                                    method.strip()
-                                    .replace("'", "")
-                                    .replace('"', "")
-                                    for method in methods_text.split(",")
-                                ]
-                                endpoint_list = [
-                                    endpoint.replace("ROUTE", method.upper())
-                                    for method in methods
-                                ]
-                            elif (
-                                ".route" in decorator_text
-                                and "methods" not in decorator_text
-                            ):
-                                endpoint_list = [
-                                    endpoint.replace("ROUTE", "GET")
-                                ]
+                            methods = [
+                                method.strip()
+                                .replace("'", "")
+                                .replace('"', "")
+                                for method in methods_text.split(",")
+                            ]
+                            endpoint_list = [
+                                endpoint.replace("ROUTE", method.upper())
+                                for method in methods
+                            ]
+                        elif (
+                            ".route" in decorator_text
+                            and "methods" not in decorator_text
+                        ):
+                            endpoint_list = [
+                                endpoint.replace("ROUTE", "GET")
+                            ]
 
-                            for grandchild in child.children:
-                                if grandchild.type == "call":
-                                    for element in grandchild.children:
-                                        if element.type == "argument_list":
-                                            for kid in element.children:
+                        for grandchild in child.children:
+                            if grandchild.type == "call":
+                                for element in grandchild.children:
+                                    if element.type == "argument_list":
+                                        for kid in element.children:
+                                            if (
+                                                kid.type
+                                                == "keyword_argument"
+                                            ):
                                                 if (
-                                                    kid.type
-                                                    == "keyword_argument"
+                                                    kid.children[
+                                                        0
+                                                    ].text.decode("utf8")
+                                                    == "response_model"
                                                 ):
-                                                    if (
+                                                    response = (
                                                         kid.children[
-                                                            0
-                                                        ].text.decode("utf8")
-                                                        == "response_model"
-                                                    ):
-                                                        response = (
-                                                            kid.children[
-                                                                2
-                                                            ].text.decode(
-                                                                "utf8"
-                                                            )
-                                                        )
-                                                        obj = self.get_node(
-                                                            function_identifier,
-                                                            project_id,
-                                                        )
-                                                        obj["response"] = (
-                                                            response
+                                                            2
+                                                        ].text.decode(
+                                                            "utf8"
                                                         )
-                                                        self.update_node(
-                                                            function_identifier,
-                                                            obj,
-                                                            project_id,
-                                                        )
-                            for entrypoint in endpoint_list:
-                                endpoints.append(
-                                    (entrypoint, function_identifier)
-                                )
-
-            for child in node.children:
-                visit_node(child)
+                                                    )
+                        decorator_endpoints.append({
+                            "function": function_name,
+                            "endpoints": endpoint_list,
+                            "response_model": response,
+                        })
 
-        visit_node(tree.root_node)
-        return [(decorator, func_name) for decorator, func_name in endpoints]
+        return decorator_endpoints
 
     def get_python_filepaths(self, directory_path):
-        python_filepaths = []
-        for root, dirs, files in os.walk(directory_path):
-            for file in files:
-                if file.endswith(".py") and not file.startswith("test"):
-                    file_path = os.path.join(root, file)
-                    python_filepaths.append(file_path)
-        return python_filepaths
-
-    def extract_function_metadata(self, node):
+        return FileFilter(directory_path, sources=self.sources).list_python_files()
+
+    @staticmethod
+    def extract_function_metadata(node):
         function_name = None
 
         if node.type == "decorated_definition":
             # Find the actual function_definition node
             for child in node.children:
                 if child.type == "function_definition":
-                    function_name = self.extract_function_metadata(child)[0]
+                    function_name = EndpointManager.extract_function_metadata(
+                        child
+                    )[0]
 
         parameters = []
 
@@ -444,22 +448,44 @@ class EndpointManager:
 
         return function_name, parameters, start, end, text
 
-    async def analyse_endpoints(self, project_id, user_id):
+    def iter_endpoint_metadata(self):
+        # Per-file endpoint metadata captured during extraction. Without a
+        # file index, when detection runs on its own, each file is parsed once
+        # here instead.
+        if self.file_index:
+            for file_path, file_entry in self.file_index.items():
+                yield file_path, file_entry.endpoints
+            return
+        parser = get_parser("python")
+        for file_path in self.get_python_filepaths(self.directory):
+            source_code = read_source(file_path, self.sources)
+            tree = parser.parse(bytes(source_code, "utf8"))
+            yield file_path, extract_endpoint_metadata(file_path, source_code, tree)
+
+    def analyse_endpoints(self, project_id, user_id):
+        # Returns the identifiers of the detected endpoints
         with SessionManager() as db:
             detected_endpoints = []
-            detected_endpoints = self.identify_django_endpoints(
-            self.directory, project_id
-        )
-
-            file_paths = self.get_python_filepaths(self.directory)
-            for file_path in file_paths:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    source_code = file.read()
-                    decorator_endpoints = self.find_endpoints_from_decorator(
-                        source_code, file_path, project_id
+            endpoint_metadata = list(self.iter_endpoint_metadata())
+            for detector in ENDPOINT_DETECTORS:
+                for file_path, metadata in endpoint_metadata:
+                    if detector.name in metadata:
+                        detected_endpoints.extend(
+                            detector.detect(
+                                self, file_path, metadata[detector.name], project_id
+                            )
+                        )
+            if self.response_models:
+                graph_writer = graph_db.bulk_writer(project_id)
+                for function_identifier, response in self.response_models.items():
+                    graph_writer.set_node_properties(
+                        function_identifier, {"response": response}
                     )
-                    if decorator_endpoints:
-                        detected_endpoints.extend(decorator_endpoints)
+                graph_writer.flush()
+
+            # One row per identifier, the first detected path wins
+            endpoint_rows = {}
+            depends = []
             for path, identifier in detected_endpoints:
                 router_info = self.router_prefix_file_mapping.get(
                     identifier.split(":")[0], {}
@@ -467,19 +493,37 @@ class EndpointManager:
                 prefix = router_info.get("prefix", None)
                 depends = router_info.get("depends", [])
                 path = self.get_qualified_endpoint_name(path, prefix)
-                endpoint = db.query(Endpoint).filter(
-                    Endpoint.identifier == identifier,
-                    Endpoint.project_id == project_id
-                ).first()
-                if not endpoint:
-                    endpoint = Endpoint(path=path, identifier=identifier, project_id=project_id)
-                    db.add(endpoint)
-                db.commit()
+                endpoint_rows.setdefault(identifier, {
+                    "path": path,
+                    "identifier": identifier,
+                    "project_id": project_id,
+                })
+            if endpoint_rows:
+                statement = insert(Endpoint).values(list(endpoint_rows.values()))
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[Endpoint.project_id, Endpoint.identifier],
+                        set_={"path": statement.excluded.path},
+                    )
+                )
+            # An incremental parse keeps the endpoints of the previous one, so
+            # drop those that are no longer detected
+            db.query(Endpoint).filter(
+                Endpoint.project_id == project_id,
+                Endpoint.identifier.notin_(
+                    [identifier for _, identifier in detected_endpoints]
+                ),
+            ).delete(synchronize_session=False)
+            # Upsert and pruning are committed together
+            db.commit()
             for dependency in depends:
-                neo4j_graph.connect_nodes(
+                self.connect_nodes(
                     identifier, dependency, project_id, {"action": "calls"}
                 )
+        return list(endpoint_rows)
 
+    def infer_flows(self, project_id, user_id):
+        # Run once the edges of the endpoints are in the graph
         celery_worker.send_task(
                  'knowledgegraph.task.infer_flows',
                  kwargs={
@@ -489,6 +533,12 @@ class EndpointManager:
                  }
          )
 
+    def connect_nodes(self, source, target, project_id, relationship_properties):
+        if self.edge_recorder is not None:
+            self.edge_recorder.connect_nodes(source, target, relationship_properties)
+        else:
+            graph_db.connect_nodes(source, target, project_id, relationship_properties)
+
     def get_qualified_endpoint_name(self, path, prefix):
         if prefix == None:
             return path
@@ -587,347 +637,22 @@ class EndpointManager:
 
     # graph database changes
     def get_node(self, function_identifier, project_id):
-        return neo4j_graph.get_node_by_id(function_identifier, project_id)
+        return graph_db.get_node_by_id(function_identifier, project_id)
 
     def update_node(self, function_identifier, body, project_id):
-        return neo4j_graph.upsert_node(function_identifier, body, project_id)
-
-    def find_py_files_with_substring(self, dir_path, substring):
-        for root, dirs, files in os.walk(dir_path):
-            for file in files:
-                path = os.path.join(root, file)
-                if (
-                    substring in path
-                    and file.endswith(".py")
-                    and not file.startswith("test")
-                ):
-                    yield os.path.join(root, file)
-
-    def resolve_called_function_name(
-        self, name, file_path, file_index, directory
-    ):
-        # handle DEPENDS later
-        if len(name.split(".")) >= 2:
-            instance = name.split(".")[0]
-
-            function = ".".join(name.split(".")[1:])
-        elif "." not in name:
-            function = name
-            instance = name
-        else:
-            return file_path, None
-        if instance in file_index[file_path]["class_instances"].keys():
-            class_context = file_index[file_path]["class_instances"][instance]
-            if class_context in file_index[file_path]["class_definition"]:
-                return file_path, class_context + "." + function
-            module_value = None
-            for import_entry in file_index[file_path]["imports"]:
-                if import_entry.get("alias") == class_context:
-                    module_value = import_entry.get("module")
-                    break
-                elif class_context in import_entry.get("module"):
-                    module_value = import_entry.get("module")
-                    break
-            if module_value:
-                if module_value.startswith("."):
-                    num_up_dirs = len(module_value) - len(
-                        module_value.lstrip(".")
-                    )  # Count the number of leading dots to determine relative depth
-                    file_path_parts = file_path.split("/")[
-                        :-1
-                    ]  # Remove the filename
-                    # Use the last num_up_dirs elements from file_path_parts if num_up_dirs is not more than the length of file_path_parts
-                    base_path_parts = (
-                        file_path_parts[-num_up_dirs:]
-                        if num_up_dirs <= len(file_path_parts)
-                        else []
-                    )
-                    module_parts = module_value.lstrip(".").split(
-                        "."
-                    )  # Remove leading dots and split
-                    potential_module = "/".join(
-                        base_path_parts + module_parts[:-1]
-                    )  # Combine the paths
-                else:
-                    module_parts = module_value.split(".")
-                    potential_module = (
-                        "/".join(module_parts[:-1])
-                        if len(module_parts) > 1
-                        else ""
-                    )
-                potential_class_or_instance = module_parts[-1]
+        return graph_db.upsert_node(function_identifier, body, project_id)
 
-                candidate_files = list(
-                    self.find_py_files_with_substring(
-                        directory, potential_module
-                    )
-                )
-                for candidate_file in candidate_files:
-                    candidate_path = os.path.join(directory, candidate_file)
-                    if candidate_path in file_index:
-                        # Check if it's a class definition
-                        if (
-                            potential_class_or_instance
-                            in file_index[candidate_path]["class_definition"]
-                        ):
-                            return (
-                                candidate_path,
-                                potential_class_or_instance + "." + function,
-                            )
-                        # Check if it's a class instance
-                        elif (
-                            potential_class_or_instance
-                            in file_index[candidate_path][
-                                "class_instances"
-                            ].keys()
-                        ):
-                            return (
-                                candidate_path,
-                                file_index[candidate_path]["class_instances"][
-                                    potential_class_or_instance
-                                ]
-                                + "."
-                                + function,
-                            )
-            # TODO DEDUP   # If no class or instance match, return with the function appended
-        module_value = None
-        for import_entry in file_index[file_path]["imports"]:
-            if import_entry.get("alias") == instance:
-                module_value = import_entry.get("module")
-                break
-            elif instance in import_entry.get("module"):
-                module_value = import_entry.get("module")
-                break
-        if module_value:
-            if module_value.startswith("."):
-                num_up_dirs = len(module_value) - len(
-                    module_value.lstrip(".")
-                )  # Count the number of leading dots to determine relative depth
-                file_path_parts = file_path.split("/")[
-                    :-1
-                ]  # Remove the filename
-                # Use the last num_up_dirs elements from file_path_parts if num_up_dirs is not more than the length of file_path_parts
-                base_path_parts = (
-                    file_path_parts[-num_up_dirs:]
-                    if num_up_dirs <= len(file_path_parts)
-                    else []
-                )
-                module_parts = module_value.lstrip(".").split(
-                    "."
-                )  # Remove leading dots and split
-                potential_module = "/".join(
-                    base_path_parts + module_parts[:-1]
-                )  # Combine the paths
-            else:
-                module_parts = module_value.split(".")
-                potential_module = (
-                    "/".join(module_parts[:-1])
-                    if len(module_parts) > 1
-                    else ""
-                )
-            potential_class_or_instance = module_parts[-1]
-
-            candidate_files = list(
-                self.find_py_files_with_substring(directory, potential_module)
-            )
-            for candidate_file in candidate_files:
-                candidate_path = os.path.join(directory, candidate_file)
-                if candidate_path in file_index:
-                    # Check if it's a class definition
-                    if (
-                        potential_class_or_instance
-                        in file_index[candidate_path]["class_definition"]
-                    ):
-                        return (
-                            candidate_path,
-                            potential_class_or_instance + "." + function,
-                        )
-                    # Check if it's a class instance
-                    elif (
-                        potential_class_or_instance
-                        in file_index[candidate_path]["class_instances"].keys()
-                    ):
-                        return (
-                            candidate_path,
-                            file_index[candidate_path]["class_instances"][
-                                potential_class_or_instance
-                            ]
-                            + "."
-                            + function,
-                        )
-                    elif potential_class_or_instance in [
-                        key.split(":")[-1]
-                        for key in file_index[candidate_path][
-                            "functions"
-                        ].keys()
-                    ]:
-                        return candidate_path, potential_class_or_instance
-            # If no class or instance match, return with the function appended
-        return file_path, None
-
-    def resolve_called_class_name(
-        self, name, file_path, file_index, directory
-    ):
-        # handle DEPENDS later
-        if len(name.split(".")) >= 2:
-            base = name.split(".")[0]
-
-            function = ".".join(name.split(".")[1:])
-        elif "." not in name:
-            function = name
-            base = name
-        else:
-            return file_path, None
-        if base in file_index[file_path]["class_instances"].keys():
-            class_context = file_index[file_path]["class_instances"][base]
-            if class_context in file_index[file_path]["class_definition"]:
-                return file_path, class_context
-            module_value = None
-            for import_entry in file_index[file_path]["imports"]:
-                if import_entry.get("alias") == class_context:
-                    module_value = import_entry.get("module")
-                    break
-                elif class_context in import_entry.get("module"):
-                    module_value = import_entry.get("module")
-                    break
-            if module_value:
-                if module_value.startswith("."):
-                    num_up_dirs = len(module_value) - len(
-                        module_value.lstrip(".")
-                    )  # Count the number of leading dots to determine relative depth
-                    file_path_parts = file_path.split("/")[
-                        :-1
-                    ]  # Remove the filename
-                    # Use the last num_up_dirs elements from file_path_parts if num_up_dirs is not more than the length of file_path_parts
-                    base_path_parts = (
-                        file_path_parts[-num_up_dirs:]
-                        if num_up_dirs <= len(file_path_parts)
-                        else []
-                    )
-                    module_parts = module_value.lstrip(".").split(
-                        "."
-                    )  # Remove leading dots and split
-                    potential_module = "/".join(
-                        base_path_parts + module_parts[:-1]
-                    )  # Combine the paths
-                else:
-                    module_parts = module_value.split(".")
-                    potential_module = (
-                        "/".join(module_parts[:-1])
-                        if len(module_parts) > 1
-                        else ""
-                    )
-                potential_class_or_instance = module_parts[-1]
+    def resolve_called_function_name(self, name, file_path):
+        return self.symbol_index.resolve_function(name, file_path)
 
-                candidate_files = list(
-                    self.find_py_files_with_substring(
-                        directory, potential_module
-                    )
-                )
-                for candidate_file in candidate_files:
-                    candidate_path = os.path.join(directory, candidate_file)
-                    if candidate_path in file_index:
-                        # Check if it's a class definition
-                        if (
-                            potential_class_or_instance
-                            in file_index[candidate_path]["class_definition"]
-                        ):
-                            return candidate_path, potential_class_or_instance
-                        # Check if it's a class instance
-                        elif (
-                            potential_class_or_instance
-                            in file_index[candidate_path][
-                                "class_instances"
-                            ].keys()
-                        ):
-                            return (
-                                candidate_path,
-                                file_index[candidate_path]["class_instances"][
-                                    potential_class_or_instance
-                                ],
-                            )
-            # TODO DEDUP   # If no class or instance match, return with the function appended
-        module_value = None
-        for import_entry in file_index[file_path]["imports"]:
-            if import_entry.get("alias") == base:
-                module_value = import_entry.get("module")
-                break
-            elif base in import_entry.get("module"):
-                module_value = import_entry.get("module")
-                break
-        if module_value:
-            if module_value.startswith("."):
-                num_up_dirs = len(module_value) - len(
-                    module_value.lstrip(".")
-                )  # Count the number of leading dots to determine relative depth
-                file_path_parts = file_path.split("/")[
-                    :-1
-                ]  # Remove the filename
-                # Use the last num_up_dirs elements from file_path_parts if num_up_dirs is not more than the length of file_path_parts
-                base_path_parts = (
-                    file_path_parts[-num_up_dirs:]
-                    if num_up_dirs <= len(file_path_parts)
-                    else []
-                )
-                module_parts = module_value.lstrip(".").split(
-                    "."
-                )  # Remove leading dots and split
-                potential_module = "/".join(
-                    base_path_parts + module_parts[:-1]
-                )  # Combine the paths
-            else:
-                module_parts = module_value.split(".")
-                potential_module = (
-                    "/".join(module_parts[:-1])
-                    if len(module_parts) > 1
-                    else ""
-                )
-            potential_class_or_instance = function
+    def resolve_called_class_name(self, name, file_path):
+        return self.symbol_index.resolve_class(name, file_path)
 
-            candidate_files = list(
-                self.find_py_files_with_substring(directory, potential_module)
-            )
-            for candidate_file in candidate_files:
-                candidate_path = os.path.join(directory, candidate_file)
-                if candidate_path in file_index:
-                    # Check if it's a class definition
-                    if (
-                        potential_class_or_instance
-                        in file_index[candidate_path]["class_definition"]
-                    ):
-                        return candidate_path, potential_class_or_instance
-                    # Check if it's a class instance
-                    elif (
-                        potential_class_or_instance
-                        in file_index[candidate_path]["class_instances"].keys()
-                    ):
-                        return (
-                            candidate_path,
-                            file_index[candidate_path]["class_instances"][
-                                potential_class_or_instance
-                            ],
-                        )
-                    elif potential_class_or_instance in [
-                        key.split(":")[-1]
-                        for key in file_index[candidate_path][
-                            "functions"
-                        ].keys()
-                    ]:
-                        return candidate_path, potential_class_or_instance
-            # If no class or instance match, return with the function appended
-        return file_path, None
-
-    def resolve_called_view_name(
-        self, name, file_path, file_index, directory, view_type
-    ):
+    def resolve_called_view_name(self, name, file_path, view_type):
         if view_type == "function":
-            return self.resolve_called_function_name(
-                name, file_path, file_index, directory
-            )
+            return self.resolve_called_function_name(name, file_path)
         else:
-            return self.resolve_called_class_name(
-                name, file_path, file_index, directory
-            )
+            return self.resolve_called_class_name(name, file_path)
 
     def get_endpoint_id_from_path(self, endpoint_path, project_id):
         with SessionManager() as db:
@@ -939,3 +664,66 @@ class EndpointManager:
             return endpoint
         else:
             return None
+
+
+class EndpointDetector:
+    """
+    One way of declaring endpoints. extract runs on every file during
+    extraction, possibly in a parse worker, and returns plain metadata for
+    the file or None; detect turns the metadata of one file into
+    (path, identifier) pairs once the whole repository is indexed.
+    """
+
+    name = None
+
+    def extract(self, file_path, source_code, tree, decorated_definitions=None):
+        raise NotImplementedError
+
+    def detect(self, endpoint_manager, file_path, metadata, project_id):
+        raise NotImplementedError
+
+
+def is_django_urls_file(file_path):
+    # Django urlpatterns are only looked for in urls.py modules
+    return os.path.basename(file_path) == "urls.py"
+
+
+class DjangoEndpointDetector(EndpointDetector):
+    name = "django"
+
+    def extract(self, file_path, source_code, tree, decorated_definitions=None):
+        if not is_django_urls_file(file_path):
+            return None
+        return EndpointManager.extract_django_urlpatterns(tree) or None
+
+    def detect(self, endpoint_manager, file_path, metadata, project_id):
+        if not is_django_urls_file(file_path):
+            return []
+        return endpoint_manager.get_django_endpoints(metadata, file_path, project_id)
+
+
+class DecoratorEndpointDetector(EndpointDetector):
+    # FastAPI and Flask style route decorators
+    name = "decorator"
+
+    def extract(self, file_path, source_code, tree, decorated_definitions=None):
+        return EndpointManager.extract_decorator_endpoints(
+            source_code, tree, decorated_definitions
+        ) or None
+
+    def detect(self, endpoint_manager, file_path, metadata, project_id):
+        return endpoint_manager.get_decorator_endpoints(metadata, file_path, project_id)
+
+
+# Run in this order, Django urls first
+ENDPOINT_DETECTORS = [DjangoEndpointDetector(), DecoratorEndpointDetector()]
+
+
+def extract_endpoint_metadata(file_path, source_code, tree, decorated_definitions=None):
+    # detector name -> metadata, for the detectors that found something
+    endpoint_metadata = {}
+    for detector in ENDPOINT_DETECTORS:
+        metadata = detector.extract(file_path, source_code, tree, decorated_definitions)
+        if metadata:
+            endpoint_metadata[detector.name] = metadata
+    return endpoint_metadata
@@ -16,6 +16,7 @@ from server.key_management.secret_manager import router as secret_router
 from server.routers.webhook import router as webhook_router
 from server.router import api_router as code_router
 
+from server.utils.extraction_cache import ExtractionCacheSingleton
 from server.utils.posthog_middleware import PostHogMiddleware
 from sentry_sdk.integrations.logging import LoggingIntegration
 
@@ -95,4 +96,8 @@ app.include_router(router=webhook_router)
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/health/extraction-cache")
+def extraction_cache_stats():
+    return ExtractionCacheSingleton.get_instance().stats()
\ No newline at end of file
@@ -45,9 +45,23 @@ class PreferenceDetails(BaseModel):
 class GetTestPlan(BaseModel):
     identifier: str
 
+
+class ParseIgnoreDetails(BaseModel):
+    project_id: int
+    patterns: List[str]
+
 class ProjectStatusEnum(str, Enum):
     CREATED = 'created'
+    PARSING = 'parsing'
     READY = 'ready' 
     ERROR = 'error'
 
 
+class ParseJobStatusEnum(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    SUPERSEDED = 'superseded'
+
+
@@ -1,26 +1,68 @@
 import ast
 import io
-import json
 import logging
+import multiprocessing
 import os
 import re
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
 
-import psycopg2
 from sqlalchemy.orm import class_mapper
 from sqlalchemy.orm.exc import DetachedInstanceError
 from tree_sitter_languages import get_language, get_parser
 from tree_sitter import Node
 
-from server.endpoint_detection import EndpointManager
+from server.endpoint_detection import (
+    EndpointManager,
+    extract_endpoint_metadata,
+    is_django_urls_file,
+)
+from server.projects import ProjectManager
 from server.schemas import Project
 from server.utils.github_helper import GithubService
-from server.utils.graph_db_helper import Neo4jGraph
-from server.utils.parse_helper import delete_folder
+from server.utils.extraction_cache import (
+    ExtractionCacheSingleton,
+    is_extraction_cache_enabled,
+)
+from server.utils.file_filter import FileFilter
+from server.utils.file_records import FileRecord
+from server.utils.graph_db_helper import GraphSingleton
+from server.utils.graph_snapshot import (
+    GraphSnapshot,
+    get_call_graph,
+    is_graph_snapshot_enabled,
+)
+from server.utils.parse_manifest import (
+    EdgeRecorder,
+    ParseManifest,
+    file_digest,
+    is_incremental_parse_enabled,
+)
+from server.utils.parse_report import ParseReport
+from server.utils.snippet_store import SnippetStoreSingleton, is_snippet_store_enabled
+from server.utils.streamed_sources import get_sources, read_source
+from server.utils.symbol_index import SymbolIndex
+from server.utils.class_index import ClassIndex
 from server.utils.model_helper import model_to_dict
 
 parser = get_parser("python")
+# Everything extraction needs from below the top level of a file, captured
+# in one query run per file instead of recursive walks in Python
+FILE_QUERY = get_language("python").query(
+    """
+    (call) @call
+    (default_parameter) @default_parameter
+    (class_definition) @class_definition
+    (decorated_definition) @decorated_definition
+    """
+)
+# Part of every extraction cache key: bump it whenever the output of
+# map_user_defined_functions or of an endpoint detector changes
+EXTRACTION_VERSION = f"4-tree-sitter-languages-{version('tree-sitter-languages')}"
 codebase_map = f"/.momentum/momentum.db"
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
+project_manager = ProjectManager()
 
 logger = logging.getLogger(__name__)
 
@@ -29,53 +71,44 @@ def add_codebase_map_path(directory):
 
 
 def add_node_safe(
+    graph_writer,
     directory,
     file_path,
     function_name,
-    node,
     parameters,
     start,
     end,
-    project_id,
     response=None,
 ):
     function_identifier = (
         file_path.replace(directory, "") + ":" + function_name
     )
-    try:
-        neo4j_graph.upsert_node(
-            function_identifier,
-            {
-                "type": "function",
-                "file": file_path,
-                "parameters": parameters,
-                "start": start,
-                "end": end,
-                "response": response
-            },
-            project_id,
-        )
-    except psycopg2.IntegrityError:
-        logging.error(f"project_id: {project_id}, Node with identifier {function_identifier} already exists. Skipping insert.")
-    return function_identifier 
+    graph_writer.upsert_node(
+        function_identifier,
+        {
+            "type": "function",
+            "file": file_path,
+            "parameters": parameters,
+            "start": start,
+            "end": end,
+            "response": response
+        },
+    )
+    return function_identifier
 
 
-def add_class_node_safe(directory, file_path, class_name, start, end, project_id):
+def add_class_node_safe(graph_writer, directory, file_path, class_name, start, end):
     function_identifier = file_path.replace(directory, '') + ":" + class_name
-    try:
-        neo4j_graph.upsert_node(
-            function_identifier,
-            {
-                "type": "class",
-                "file": file_path,
-                "start": start,
-                "class_name": class_name,
-                "end": end
-            },
-            project_id,
-        )
-    except psycopg2.IntegrityError:
-        logging.warn(f"project_id: {project_id}, Node with identifier {function_identifier} already exists. Skipping insert.")
+    graph_writer.upsert_node(
+        function_identifier,
+        {
+            "type": "class",
+            "file": file_path,
+            "start": start,
+            "class_name": class_name,
+            "end": end
+        },
+    )
     return function_identifier
 
 
@@ -85,30 +118,28 @@ def get_node_text(node, source_code):
     return source_code[start_byte:end_byte]
 
 
-def is_pydantic_base_model(node, pydantic_class_list):
-    return node.type == "identifier" and (
-        node.text.decode("utf8") == "BaseModel"
-        or node.text.decode("utf8") in pydantic_class_list
-    )
+def get_class_bases(node):
+    # Identifiers listed in the superclass argument list of a class definition
+    bases = []
+    for child in node.children:
+        if child.type == "argument_list":
+            bases.extend(
+                base.text.decode("utf8")
+                for base in child.children
+                if base.type == "identifier"
+            )
+    return bases
 
 
-def find_pydantic_class(node, pydantic_class_list, file_path):
-    # Recursive function to walk the AST and find Pydantic models.
-    if node.type == "class_definition":
-        for child in node.children:
-            if any(
-                is_pydantic_base_model(n, pydantic_class_list)
-                for n in child.children
-            ):
-                pydantic_class_list[
-                    f"{node.children[1].text.decode('utf8')}"
-                ] = (file_path, node.text.decode("utf8"))
-
-    for child in node.children:
-        pydantic_class_list = find_pydantic_class(
-            child, pydantic_class_list, file_path
-        )
-    return pydantic_class_list
+def collect_inner_classes(node, file_captures):
+    return [
+        {
+            "name": child.children[1].text.decode("utf8"),
+            "bases": get_class_bases(child),
+        }
+        for child, _ in iter_captures(file_captures, node, ("class_definition",))
+        if child != node
+    ]
 
 
 def extract_path_after_project(full_path):
@@ -119,46 +150,33 @@ def extract_path_after_project(full_path):
     else:
         return None
 
-def extract_parent_class(value):
-    # Split the string to find the parent class name
-    parts = value.split("(")
-    # Extract the parent class name
-    parent_class = parts[1].split(")")[0].strip()
-    return parent_class
-
-
-# Function to recursively append parent class definitions
-def append_parent_class(key, current_dict, original_dict, project_id, iteration=0):
-    # Base cases
-    if iteration >= 3 or key == "BaseModel":
-        return current_dict[key][1]
-
-    # Extract the parent class name
-    parent_class = extract_parent_class(current_dict[key][1])
-
-    # If parent class is BaseModel, return the current class definition
-    if parent_class == "BaseModel":
-        return current_dict[key][1]
-    else:
-        # Append parent class definition to the current class definition
-        parent_classes = [cls.strip() for cls in parent_class.split(",")]
-        for cls in parent_classes:
-            parent_class_id = f"{extract_path_after_project(current_dict[key][0])}:{key}"
-            base_class_id = f"{extract_path_after_project(current_dict[cls][0])}:{cls}"
-
-            neo4j_graph.add_extends_relationship(base_class_id, parent_class_id, project_id)
-            append_parent_class(
-                cls.strip(), original_dict, original_dict, project_id, iteration + 1
+def add_pydantic_extends(pydantic_classes, graph_writer):
+    # One EXTENDS edge per Pydantic model and each of its bases that is a
+    # Pydantic model itself
+    for key, (file_path, bases) in pydantic_classes.items():
+        class_id = f"{extract_path_after_project(file_path)}:{key}"
+        for base in bases:
+            if base not in pydantic_classes:
+                continue
+            base_class_id = (
+                f"{extract_path_after_project(pydantic_classes[base][0])}:{base}"
             )
+            graph_writer.add_extends_relationship(base_class_id, class_id)
 
 
-def map_user_defined_functions(directory, source_code, file_path, user_id, project_id):
-    tree = parser.parse(bytes(source_code, "utf8"))
+def map_user_defined_functions(source_code, tree=None, file_captures=None):
+    # Extracts everything the later phases need from a single file. The result
+    # only holds plain, picklable values (no tree-sitter nodes) and does not
+    # depend on where the file lives, so it can be produced in a worker process.
+    if tree is None:
+        tree = parser.parse(bytes(source_code, "utf8"))
     root_node = tree.root_node
+    if file_captures is None:
+        file_captures = get_file_captures(root_node)
 
     user_defined_functions = {}
     class_definition = []
-    class_nodes = []
+    classes = []
     class_instances = {}
     file_imports = (
         []
@@ -340,15 +358,13 @@ def map_user_defined_functions(directory, source_code, file_path, user_id, proje
             )  # Assuming the class name is always the second child
             class_context = class_name  # Set the current class context
             class_definition.append(class_name)
-            add_class_node_safe(
-                directory,
-                file_path,
-                class_name,
-                node.start_point[0],
-                node.end_point[0],
-                project_id,
-            )
-            class_nodes.append(node)
+            classes.append({
+                "name": class_name,
+                "start": node.start_point[0],
+                "end": node.end_point[0],
+                "bases": get_class_bases(node),
+                "inner_classes": collect_inner_classes(node, file_captures),
+            })
             for class_child in node.children:
                 if class_child.type == "block":
                     for child in class_child.children:
@@ -366,25 +382,15 @@ def map_user_defined_functions(directory, source_code, file_path, user_id, proje
                                 child, [], class_context
                             )
                             if function_name:
-                                add_node_safe(
-                                    directory,
-                                    file_path,
-                                    function_name,
-                                    node,
-                                    params,
-                                    start,
-                                    end,
-                                    project_id,
-                                    response,
-                                )
-                                function_identifier = (
-                                    file_path.replace(directory, "")
-                                    + ":"
-                                    + function_name
-                                )
-                                user_defined_functions[function_identifier] = (
-                                    child
-                                )
+                                user_defined_functions[function_name] = {
+                                    "parameters": params,
+                                    "start": start,
+                                    "end": end,
+                                    "response": response,
+                                    "calls": collect_function_calls(
+                                        child, class_context, file_captures
+                                    ),
+                                }
 
         elif (
             node.type == "function_definition"
@@ -394,123 +400,96 @@ def map_user_defined_functions(directory, source_code, file_path, user_id, proje
                 extract_function_metadata(node, [], None)
             )
             if function_name:
-                add_node_safe(
-                    directory,
-                    file_path,
-                    function_name,
-                    node,
-                    params,
-                    start,
-                    end,
-                    project_id,
-                    response,
-                )
-                function_identifier = (
-                    file_path.replace(directory, "") + ":" + function_name
-                )
-                user_defined_functions[function_identifier] = node
-
-    return (
-        user_defined_functions,
-        file_imports,
-        class_instances,
-        class_definition,
-        class_nodes,
-        router_metadata,
-    )
+                user_defined_functions[function_name] = {
+                    "parameters": params,
+                    "start": start,
+                    "end": end,
+                    "response": response,
+                    "calls": collect_function_calls(
+                        node, None, file_captures
+                    ),
+                }
+
+    return {
+        "imports": file_imports,
+        "class_instances": class_instances,
+        "class_definition": class_definition,
+        "classes": classes,
+        "functions": user_defined_functions,
+        "router_prefixes": router_metadata,
+    }
 
 
 # Process Function Calls and Update Edges
 def process_function_calls(
     directory,
     user_defined_functions,
-    source_code,
-    file_path,
-    file_index,
-    project_id,
-):
-    for function_identifier, node in file_index[file_path][
-        "functions"
-    ].items():
-        function_ref = function_identifier.split(":")[1]
-        class_context = (
-            function_ref.split(".")[0] if "." in function_ref else None
-        )
-        traverse_node(
-            directory,
-            node,
-            function_identifier,
-            user_defined_functions,
-            file_path,
-            file_index,
-            project_id,
-            class_context,
-        )
-
-
-def traverse_node(
-    directory,
-    node,
-    parent_function,
-    user_defined_functions,
     file_path,
     file_index,
-    project_id,
-    class_context=None,
+    symbol_index,
+    graph_writer,
 ):
-    depends_call = (
-        node.type == "default_parameter"
-        and "Depends" in node.text.decode("utf8")
-    )
-
-    if depends_call:
-        depends_text = node.text.decode("utf8")
-        depends_function_names = []
-        start_index = 0
-        while True:
-            start_index = depends_text.find("Depends(", start_index)
-            if start_index == -1:
-                break
-            start_index += len("Depends(")
-            end_index = depends_text.find(")", start_index)
-            depends_function_names.append(depends_text[start_index:end_index])
-            start_index = end_index
-        for functions in depends_function_names:
-            connect_nodes(
-                parent_function,
-                functions,
-                user_defined_functions,
-                directory,
-                file_path,
-                file_index,
-                project_id,
-            )
-
-    if node.type == "call":
-        called_function = extract_called_function_name(node, class_context)
-        if called_function:
-            # Logic to handle method calls within the class context
+    for function_identifier, function in file_index[file_path].functions.items():
+        for called_function in function.calls:
             connect_nodes(
-                parent_function,
+                function_identifier,
                 called_function,
                 user_defined_functions,
                 directory,
                 file_path,
-                file_index,
-                project_id,
+                symbol_index,
+                graph_writer,
             )
 
-    for child in node.children:
-        traverse_node(
-            directory,
-            child,
-            parent_function,
-            user_defined_functions,
-            file_path,
-            file_index,
-            project_id,
-            class_context,
-        )
+
+def get_file_captures(node):
+    # FILE_QUERY captures under node in the order a pre-order walk would reach
+    # them: by start byte, enclosing nodes first.
+    captures = sorted(
+        FILE_QUERY.captures(node),
+        key=lambda capture: (capture[0].start_byte, -capture[0].end_byte),
+    )
+    return [capture[0].start_byte for capture in captures], captures
+
+
+def iter_captures(file_captures, node, capture_names):
+    # Captures with the given names inside the byte range of node, including
+    # node itself
+    starts, captures = file_captures
+    for index in range(bisect_left(starts, node.start_byte), len(starts)):
+        capture_node, capture_name = captures[index]
+        if capture_node.start_byte >= node.end_byte:
+            break
+        if capture_name in capture_names and capture_node.end_byte <= node.end_byte:
+            yield capture_node, capture_name
+
+
+def collect_function_calls(node, class_context=None, file_captures=None):
+    if file_captures is None:
+        file_captures = get_file_captures(node)
+    calls = {}
+    for capture_node, capture_name in iter_captures(
+        file_captures, node, ("call", "default_parameter")
+    ):
+        if capture_name == "default_parameter":
+            depends_text = capture_node.text.decode("utf8")
+            start_index = 0
+            while True:
+                start_index = depends_text.find("Depends(", start_index)
+                if start_index == -1:
+                    break
+                start_index += len("Depends(")
+                end_index = depends_text.find(")", start_index)
+                calls[depends_text[start_index:end_index]] = None
+                start_index = end_index
+        else:
+            called_function = extract_called_function_name(
+                capture_node, class_context
+            )
+            if called_function:
+                # Logic to handle method calls within the class context
+                calls[called_function] = None
+    return list(calls)
 
 
 def connect_nodes(
@@ -519,197 +498,37 @@ def connect_nodes(
     user_defined_functions: dict,
     directory: str,
     file_path: str,
-    file_index: dict,
-    project_id,
+    symbol_index: SymbolIndex,
+    graph_writer,
 ):
     called_function_identifier = (
         f"{file_path.replace(directory, '')}:{called_function}"
     )
     if called_function_identifier in user_defined_functions:
-        neo4j_graph.connect_nodes(
+        graph_writer.connect_nodes(
             parent_function,
             called_function_identifier,
-            project_id,
             {"action": "calls"},
         )
     else:
         file_path, called_function = resolve_called_function_name(
-            called_function, file_path, file_index, directory
+            called_function, file_path, symbol_index
         )
         if called_function:
             called_function_identifier = (
                 f"{file_path.replace(directory, '')}:{called_function}"
             )
             if called_function_identifier in user_defined_functions:
-                neo4j_graph.connect_nodes(
+                graph_writer.connect_nodes(
                     parent_function,
                     called_function_identifier,
-                    project_id,
                     {"action": "calls"},
                 )
 
 
-def find_py_files_with_substring(dir_path, substring):
-    for root, dirs, files in os.walk(dir_path):
-        for file in files:
-            path = os.path.join(root, file)
-            if (
-                substring in path
-                and file.endswith(".py")
-                and not file.startswith("test")
-            ):
-                yield os.path.join(root, file)
-
-
-def resolve_called_function_name(name, file_path, file_index, directory):
+def resolve_called_function_name(name, file_path, symbol_index):
     # handle DEPENDS later
-    if len(name.split(".")) >= 2:
-        instance = name.split(".")[0]
-
-        function = ".".join(name.split(".")[1:])
-    elif "." not in name:
-        function = name
-        instance = name
-    else:
-        return file_path, None
-    if instance in file_index[file_path]["class_instances"].keys():
-        class_context = file_index[file_path]["class_instances"][instance]
-        if class_context in file_index[file_path]["class_definition"]:
-            return file_path, class_context + "." + function
-        module_value = None
-        for import_entry in file_index[file_path]["imports"]:
-            if import_entry.get("alias") == class_context:
-                module_value = import_entry.get("module")
-                break
-            elif class_context in import_entry.get("module"):
-                module_value = import_entry.get("module")
-                break
-        if module_value:
-            if module_value.startswith("."):
-                num_up_dirs = len(module_value) - len(
-                    module_value.lstrip(".")
-                )  # Count the number of leading dots to determine relative depth
-                file_path_parts = file_path.split("/")[
-                    :-1
-                ]  # Remove the filename
-                # Use the last num_up_dirs elements from file_path_parts if num_up_dirs is not more than the length of file_path_parts
-                base_path_parts = (
-                    file_path_parts[-num_up_dirs:]
-                    if num_up_dirs <= len(file_path_parts)
-                    else []
-                )
-                module_parts = module_value.lstrip(".").split(
-                    "."
-                )  # Remove leading dots and split
-                potential_module = "/".join(
-                    base_path_parts + module_parts[:-1]
-                )  # Combine the paths
-            else:
-                module_parts = module_value.split(".")
-                potential_module = (
-                    "/".join(module_parts[:-1])
-                    if len(module_parts) > 1
-                    else ""
-                )
-            potential_class_or_instance = module_parts[-1]
-
-            candidate_files = list(
-                find_py_files_with_substring(directory, potential_module)
-            )
-            for candidate_file in candidate_files:
-                candidate_path = os.path.join(directory, candidate_file)
-                if candidate_path in file_index:
-                    # Check if it's a class definition
-                    if (
-                        potential_class_or_instance
-                        in file_index[candidate_path]["class_definition"]
-                    ):
-                        return (
-                            candidate_path,
-                            potential_class_or_instance + "." + function,
-                        )
-                    # Check if it's a class instance
-                    elif (
-                        potential_class_or_instance
-                        in file_index[candidate_path]["class_instances"].keys()
-                    ):
-                        return (
-                            candidate_path,
-                            file_index[candidate_path]["class_instances"][
-                                potential_class_or_instance
-                            ]
-                            + "."
-                            + function,
-                        )
-        # TODO DEDUP   # If no class or instance match, return with the function appended
-    module_value = None
-    for import_entry in file_index[file_path]["imports"]:
-        if import_entry.get("alias") == instance:
-            module_value = import_entry.get("module")
-            break
-        elif instance in import_entry.get("module"):
-            module_value = import_entry.get("module")
-            break
-    if module_value:
-        if module_value.startswith("."):
-            num_up_dirs = len(module_value) - len(
-                module_value.lstrip(".")
-            )  # Count the number of leading dots to determine relative depth
-            file_path_parts = file_path.split("/")[:-1]  # Remove the filename
-            # Use the last num_up_dirs elements from file_path_parts if num_up_dirs is not more than the length of file_path_parts
-            base_path_parts = (
-                file_path_parts[-num_up_dirs:]
-                if num_up_dirs <= len(file_path_parts)
-                else []
-            )
-            module_parts = module_value.lstrip(".").split(
-                "."
-            )  # Remove leading dots and split
-            potential_module = "/".join(
-                base_path_parts + module_parts[:-1]
-            )  # Combine the paths
-        else:
-            module_parts = module_value.split(".")
-            potential_module = (
-                "/".join(module_parts[:-1]) if len(module_parts) > 1 else ""
-            )
-        potential_class_or_instance = module_parts[-1]
-
-        candidate_files = list(
-            find_py_files_with_substring(directory, potential_module)
-        )
-        for candidate_file in candidate_files:
-            candidate_path = os.path.join(directory, candidate_file)
-            if candidate_path in file_index:
-                # Check if it's a class definition
-                if (
-                    potential_class_or_instance
-                    in file_index[candidate_path]["class_definition"]
-                ):
-                    return (
-                        candidate_path,
-                        potential_class_or_instance + "." + function,
-                    )
-                # Check if it's a class instance
-                elif (
-                    potential_class_or_instance
-                    in file_index[candidate_path]["class_instances"].keys()
-                ):
-                    return (
-                        candidate_path,
-                        file_index[candidate_path]["class_instances"][
-                            potential_class_or_instance
-                        ]
-                        + "."
-                        + function,
-                    )
-                elif potential_class_or_instance in [
-                    key.split(":")[-1]
-                    for key in file_index[candidate_path]["functions"].keys()
-                ]:
-                    return candidate_path, potential_class_or_instance
-        # If no class or instance match, return with the function appended
-    return file_path, None
+    return symbol_index.resolve_function(name, file_path)
 
 
 def extract_called_function_name(call_node, class_context=None):
@@ -787,207 +606,528 @@ def print_tree(node, depth=0):
         print_tree(child, depth + 1)
 
 
-# todo: optimise for single run
-async def analyze_directory(directory, user_id, project_id):
+def get_python_filepaths(directory, sources=None, file_filter=None):
+    # sources holds the contents of a repository streamed from its tarball,
+    # which is not on disk
+    if file_filter is None:
+        file_filter = FileFilter(directory, sources=sources)
+    return file_filter.list_python_files()
+
+
+def extract_file(file_path, source_code=None):
+    if source_code is None:
+        source_code = read_source(file_path)
+    tree = parser.parse(bytes(source_code, "utf8"))
+    file_captures = get_file_captures(tree.root_node)
+    file_result = map_user_defined_functions(source_code, tree, file_captures)
+    file_result["endpoints"] = extract_endpoint_metadata(
+        file_path,
+        source_code,
+        tree,
+        [
+            node for node, _ in iter_captures(
+                file_captures, tree.root_node, ("decorated_definition",)
+            )
+        ],
+    )
+    return file_path, file_result
+
+
+def get_extraction_cache_key(file_path, digest):
+    # Django urlpatterns are only extracted from urls.py, so the same
+    # contents extract differently under that name
+    if is_django_urls_file(file_path):
+        return f"{EXTRACTION_VERSION}:urls:{digest}"
+    return f"{EXTRACTION_VERSION}:{digest}"
+
+
+def get_parse_workers():
+    return int(os.getenv("PARSE_WORKERS", "0"))
+
+
+def extract_files(file_paths, extraction_cache=None, sources=None, counters=None):
+    # Yields (file_path, digest, file_result) in file order, as soon as each
+    # result is available. Files whose contents were already extracted, by
+    # any project on this host, come from the extraction cache; the rest are
+    # independent of each other, so with PARSE_WORKERS > 1 they are fanned out
+    # over a process pool. sources holds the contents of streamed
+    # repositories, which are not on disk. counters, a dict, is incremented
+    # with the cache_hits and cache_misses of these files.
+    digests = {
+        file_path: file_digest(file_path, sources) for file_path in file_paths
+    }
+    cached = {}
+    if extraction_cache is not None:
+        cached = extraction_cache.get_many(
+            get_extraction_cache_key(file_path, digest)
+            for file_path, digest in digests.items()
+        )
+    missing = [
+        file_path for file_path in file_paths
+        if get_extraction_cache_key(file_path, digests[file_path]) not in cached
+    ]
+    if extraction_cache is not None and counters is not None:
+        counters["cache_hits"] = (
+            counters.get("cache_hits", 0) + len(file_paths) - len(missing)
+        )
+        counters["cache_misses"] = counters.get("cache_misses", 0) + len(missing)
+    missing_sources = [
+        read_source(file_path, sources) if sources else None
+        for file_path in missing
+    ]
+    workers = get_parse_workers()
+    executor = None
+    if workers <= 1 or len(missing) <= 1:
+        extracted = map(extract_file, missing, missing_sources)
+    else:
+        chunksize = max(1, len(missing) // (workers * 4))
+        # Parses run on a thread of a multi-threaded server, and a child
+        # forked while another thread holds a lock can deadlock, so workers
+        # start from a clean forkserver process
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        extracted = executor.map(
+            extract_file, missing, missing_sources, chunksize=chunksize
+        )
+    new_results = {}
+    try:
+        for file_path in file_paths:
+            cache_key = get_extraction_cache_key(file_path, digests[file_path])
+            if cache_key in cached:
+                yield file_path, digests[file_path], cached[cache_key]
+            else:
+                # missing is in file order, so is the output of map
+                _, file_result = next(extracted)
+                new_results[cache_key] = file_result
+                yield file_path, digests[file_path], file_result
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    if extraction_cache is not None:
+        extraction_cache.put_many(new_results)
+
+
+def index_file(
+    directory, file_path, file_record, file_index, user_defined_functions,
+    graph_writer=None
+):
+    # graph_writer is None for files carried over unchanged from the previous
+    # parse, whose nodes are already in the graph
+    if graph_writer is not None:
+        relative_path = file_path.replace(directory, "")
+        for class_record in file_record.classes:
+            add_class_node_safe(
+                graph_writer,
+                directory,
+                file_path,
+                class_record.name,
+                class_record.start,
+                class_record.end,
+            )
+        for function_identifier, function in file_record.functions.items():
+            add_node_safe(
+                graph_writer,
+                directory,
+                file_path,
+                function_identifier[len(relative_path) + 1:],
+                function.parameters,
+                function.start,
+                function.end,
+                function.response,
+            )
+    user_defined_functions.update(file_record.functions)
+    file_index[file_path] = file_record
+
+
+def get_file_node_ids(relative_path, file_record):
+    node_ids = {
+        f"{relative_path}:{class_record.name}"
+        for class_record in file_record.classes
+    }
+    node_ids.update(file_record.functions)
+    return node_ids
+
+
+def resolve_router_metadata(
+    directory, file_path, file_index, symbol_index, user_defined_functions
+):
+    router_metadata_file_mapping = {}
+    for router_prefix in file_index[file_path].router_prefixes:
+        if not router_prefix == []:
+            router = router_prefix["router"]
+            prefix = router_prefix["prefix"]
+            depends = router_prefix["depends"]
+            router_name = resolve_called_function_name(
+                router, file_path, symbol_index
+            )
+            if router_name:
+                router_file = router_name[0].replace(directory, "")
+                router_dependencies = {}
+                if router_name[0] not in router_dependencies:
+                    router_dependencies[router_name[0]] = []
+                if not depends == []:
+                    for dependency in depends:
+                        called_function_identifier = (
+                            f"{file_path.replace(directory, '')}:{dependency}"
+                        )
+                        if called_function_identifier in user_defined_functions:
+                            router_dependencies[router_name[0]].append(
+                                called_function_identifier
+                            )
+                        else:
+                            path, name = resolve_called_function_name(
+                                dependency,
+                                file_path,
+                                symbol_index,
+                            )
+                            function_identifier = (
+                                f"{path.replace(directory, '')}:{name}"
+                            )
+                            if name:
+                                router_dependencies[router_name[0]].append(
+                                    function_identifier
+                                )
+                dep = (
+                    router_dependencies[router_name[0]]
+                    if router_name[0] in router_dependencies
+                    else []
+                )
+                router_metadata_file_mapping[router_file] = {
+                    "prefix": prefix,
+                    "depends": dep,
+                }
+    return router_metadata_file_mapping
+
+
+def analyze_directory(
+    directory, user_id, project_id, commit_diff=None, progress=None
+):
+    # Single pass over the repository: every file is read and parsed once,
+    # optionally in parallel, and the extracted per-file results are shared by
+    # every phase below. When a manifest of the previous parse exists only the
+    # files changed since then are extracted, and only the nodes and edges that
+    # differ from the previous parse are written. progress is called with
+    # (phase, files processed, files total) while the parse runs.
+    report = ParseReport(project_id, progress)
+    graph_writer = graph_db.bulk_writer(project_id)
     user_defined_functions = {}
     file_index = {}
-    all_class_definitions = []
-    pydantic_classes = {}
-    for subdir, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".py") and not file.startswith("test"):
-
-                file_path = os.path.join(subdir, file)
-                with open(file_path, "r") as source_file:
-                    try:
-                        source_code = source_file.read()
-                    except Exception as e:
-                        raise e
-                    (
-                        defined_functions,
-                        file_imports,
-                        class_instances,
-                        class_definition,
-                        class_nodes,
-                        router_prefixes,
-                    ) = map_user_defined_functions(
-                        directory, source_code, file_path, user_id, project_id
+    # Contents of a repository streamed from its tarball; None when it was
+    # checked out to disk
+    sources = get_sources(directory)
+    report.record("ingestion", "streamed" if sources is not None else "disk")
+
+    manifest = None
+    if is_incremental_parse_enabled():
+        manifest = ParseManifest.load(project_id, EXTRACTION_VERSION)
+    if manifest is not None and manifest.directory != directory:
+        # Node properties carry the absolute path, so nothing can be reused
+        manifest = None
+    if manifest is None and ParseManifest.exists(project_id):
+        # reparse_cleanup kept the graph expecting an incremental parse
+        graph_db.delete_nodes_by_project_id(project_id)
+    # A run that fails halfway must not leave a manifest or a snapshot that
+    # no longer matches the graph
+    ParseManifest.delete(project_id)
+    GraphSnapshot.invalidate(project_id)
+    report.record("mode", "incremental" if manifest else "full")
+    project = project_manager.get_project_from_db_by_id(project_id)
+    commit_id = project["commit_id"] if project else None
+
+    with report.phase("enumerate"):
+        file_filter = FileFilter(
+            directory,
+            project_manager.get_parse_ignore(project_id),
+            sources=sources,
+        )
+        file_paths = get_python_filepaths(directory, sources, file_filter)
+    report.increment("files", len(file_paths))
+    for reason, count in file_filter.skipped.items():
+        report.increment(f"skipped_{reason}", count)
+
+    with report.phase("diff"):
+        if manifest is not None:
+            changed_files, deleted_files = manifest.diff_files(
+                directory, file_paths, commit_diff, sources
+            )
+        else:
+            changed_files, deleted_files = set(file_paths), set()
+    report.increment("files_extracted", len(changed_files))
+    report.increment("files_deleted", len(deleted_files))
+
+    with report.phase("extract"):
+        extraction_cache = None
+        if is_extraction_cache_enabled():
+            extraction_cache = ExtractionCacheSingleton.get_instance()
+        # Counted for this parse only, the cache is shared with concurrent ones
+        cache_counters = {}
+        # Results are turned into compact records as they arrive, so the raw
+        # extraction output of the whole repository is never held at once
+        file_records = {}
+        file_digests = {}
+        for file_path, digest, file_result in extract_files(
+            [path for path in file_paths if path in changed_files],
+            extraction_cache,
+            sources,
+            cache_counters,
+        ):
+            file_records[file_path] = FileRecord.from_result(
+                file_path.replace(directory, ""), file_result
+            )
+            file_digests[file_path] = digest
+            report.progress(len(file_records), len(changed_files))
+        for name, count in cache_counters.items():
+            report.increment(name, count)
+        new_manifest = ParseManifest(
+            project_id, directory, extraction_version=EXTRACTION_VERSION
+        )
+        for file_path in file_paths:
+            relative_path = file_path.replace(directory, "")
+            if file_path in file_records:
+                new_manifest.files[relative_path] = {
+                    "digest": file_digests[file_path],
+                    "record": file_records[file_path],
+                }
+                index_file(
+                    directory,
+                    file_path,
+                    file_records[file_path],
+                    file_index,
+                    user_defined_functions,
+                    graph_writer,
+                )
+            else:
+                new_manifest.files[relative_path] = manifest.files[relative_path]
+                index_file(
+                    directory,
+                    file_path,
+                    manifest.files[relative_path]["record"],
+                    file_index,
+                    user_defined_functions,
+                )
+        if manifest is not None:
+            stale_node_ids = set()
+            for file_path in changed_files:
+                relative_path = file_path.replace(directory, "")
+                if relative_path in manifest.files:
+                    stale_node_ids.update(
+                        get_file_node_ids(
+                            relative_path, manifest.files[relative_path]["record"]
+                        )
+                        - get_file_node_ids(relative_path, file_records[file_path])
+                    )
+            for relative_path in deleted_files:
+                stale_node_ids.update(
+                    get_file_node_ids(
+                        relative_path, manifest.files[relative_path]["record"]
                     )
-                    user_defined_functions.update(defined_functions)
-                    file_index[file_path] = {
-                        "imports": file_imports,
-                        "class_instances": class_instances,
-                        "class_definition": class_definition,
-                        "functions": defined_functions,
-                        "router_prefixes": router_prefixes,
-                    }
-                    for class_def in class_nodes:
-                        all_class_definitions.append((file_path, class_def))
-
-    pydantic_class_list = {}
-    depth = 4
-    while depth >= 0:
-        for file_path, cl_def in all_class_definitions:
-            if cl_def.text.decode("utf8") not in pydantic_class_list:
-                pydantic_classes = find_pydantic_class(
-                    cl_def, pydantic_class_list, file_path
                 )
-        depth -= 1
+            for node_id in stale_node_ids:
+                graph_writer.delete_node(node_id)
+    report.increment("functions", len(user_defined_functions))
+
+    if is_snippet_store_enabled():
+        with report.phase("snippets"):
+            # Stored before endpoint detection, which reads code back, and
+            # while the files are still at hand; only contents not stored
+            # by an earlier parse, of any project, are read again
+            snippet_store = SnippetStoreSingleton.get_instance()
+            files = {
+                relative_path: entry["digest"]
+                for relative_path, entry in new_manifest.files.items()
+            }
+            missing = snippet_store.missing(files.values())
+            contents = {}
+            for file_path in file_paths:
+                digest = files[file_path.replace(directory, "")]
+                if digest in missing and digest not in contents:
+                    contents[digest] = read_source(file_path, sources)
+            repo_details = project_manager.get_repo_and_branch_name(project_id)
+            snippet_store.put_commit(
+                project_id,
+                repo_details[0] if repo_details else None,
+                commit_id,
+                files,
+                contents,
+            )
+        report.increment("snippets_stored", len(contents))
+
+    with report.phase("symbol_index"):
+        symbol_index = SymbolIndex(file_index)
 
-    for key, value in pydantic_classes.items():
-        append_parent_class(
-            key, pydantic_classes, pydantic_classes, project_id
+    # Calls and class hierarchies are resolved over the whole repository even
+    # on an incremental parse, since an unchanged caller can resolve to a
+    # different target once the files it imports from change
+    edge_recorder = EdgeRecorder()
+
+    with report.phase("pydantic"):
+        class_index = ClassIndex(file_index)
+        pydantic_classes = class_index.subclass_definitions("BaseModel")
+        add_pydantic_extends(pydantic_classes, edge_recorder)
+    report.increment("pydantic_classes", len(pydantic_classes))
+
+    with report.phase("call_edges"):
+        for file_path in file_paths:
+            process_function_calls(
+                directory,
+                user_defined_functions,
+                file_path,
+                file_index,
+                symbol_index,
+                edge_recorder,
+            )
+
+    with report.phase("node_flush"):
+        # Endpoint detection reads nodes back, so they have to be in the
+        # graph before it starts. Edges are written once it has added its own.
+        graph_writer.flush()
+
+    with report.phase("router_metadata"):
+        router_metadata_file_mapping = {}
+        for file_path in file_paths:
+            router_metadata_file_mapping.update(
+                resolve_router_metadata(
+                    directory,
+                    file_path,
+                    file_index,
+                    symbol_index,
+                    user_defined_functions,
+                )
+            )
+
+    with report.phase("endpoints"):
+        # Runs the endpoint detectors over the metadata captured during
+        # extraction; nothing is read or parsed again
+        endpoint_manager = EndpointManager(
+            directory,
+            router_metadata_file_mapping,
+            file_index,
+            symbol_index,
+            sources,
+            edge_recorder,
         )
-    router_metadata_file_mapping = {}
-    for subdir, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".py") and not file.startswith("test"):
-                file_path = os.path.join(subdir, file)
-                with open(file_path, "r") as source_file:
-                    source_code = source_file.read()
-                    process_function_calls(
-                        directory,
-                        user_defined_functions,
-                        source_code,
-                        file_path,
-                        file_index,
-                        project_id,
-                    )
-                for router_prefix in file_index[file_path]["router_prefixes"]:
-                    if not router_prefix == []:
-                        router = router_prefix["router"]
-                        prefix = router_prefix["prefix"]
-                        depends = router_prefix["depends"]
-                        router_name = resolve_called_function_name(
-                            router, file_path, file_index, directory
-                        )
-                        if router_name:
-                            router_file = router_name[0].replace(directory, "")
-                            router_dependencies = {}
-                            if router_name[0] not in router_dependencies:
-                                router_dependencies[router_name[0]] = []
-                            if not depends == []:
-                                for dependency in depends:
-                                    called_function_identifier = (
-                                        f"{file_path.replace(directory, '')}:{dependency}"
-                                    )
-                                    if (
-                                        called_function_identifier
-                                        in user_defined_functions
-                                    ):
-                                        router_dependencies[
-                                            router_name[0]
-                                        ].append(called_function_identifier)
-                                    else:
-                                        path, name = (
-                                            resolve_called_function_name(
-                                                dependency,
-                                                file_path,
-                                                file_index,
-                                                directory,
-                                            )
-                                        )
-                                        function_identifier = (
-                                            f"{path.replace(directory, '')}:{name}"
-                                        )
-                                        if name:
-                                            router_dependencies[
-                                                router_name[0]
-                                            ].append(function_identifier)
-                            dep = (
-                                router_dependencies[router_name[0]]
-                                if router_name[0] in router_dependencies
-                                else []
-                            )
-                            router_metadata_file_mapping[router_file] = {
-                                "prefix": prefix,
-                                "depends": dep,
-                            }
+        endpoint_ids = endpoint_manager.analyse_endpoints(project_id, user_id)
+
+    with report.phase("graph_flush"):
+        # The edges endpoint detection added are recorded with the call edges,
+        # so a parse drops them like any other edge once they go away
+        previous_edges = set(manifest.edges) if manifest else set()
+        previous_extends = set(manifest.extends) if manifest else set()
+        for edge in previous_edges - edge_recorder.edges.keys():
+            graph_writer.disconnect_nodes(*edge)
+        for edge in previous_extends - edge_recorder.extends.keys():
+            graph_writer.remove_extends_relationship(*edge)
+        for edge, relationship_properties in edge_recorder.edges.items():
+            if edge not in previous_edges:
+                graph_writer.connect_nodes(*edge, relationship_properties)
+        for edge in edge_recorder.extends:
+            if edge not in previous_extends:
+                graph_writer.add_extends_relationship(*edge)
+        new_manifest.edges = list(edge_recorder.edges)
+        new_manifest.extends = list(edge_recorder.extends)
+        graph_writer.flush()
+    report.record("graph_writes", graph_writer.stats())
+    endpoint_manager.infer_flows(project_id, user_id)
+
+    if is_incremental_parse_enabled():
+        new_manifest.commit_id = commit_id
+        new_manifest.save()
+
+    if is_graph_snapshot_enabled():
+        with report.phase("snapshot"):
+            nodes, edges = graph_db.export_call_graph(project_id)
+            try:
+                GraphSnapshot.build(
+                    project_id, commit_id, nodes, edges, endpoint_ids
+                ).save()
+            except OSError as e:
+                # Queries keep going to the graph backend
+                logging.warning(f"project_id: {project_id}, could not save graph snapshot: {e}")
+            else:
+                report.increment("snapshot_nodes", len(nodes))
 
-    (
-        await EndpointManager(
-             directory, router_metadata_file_mapping, file_index
-        ).analyse_endpoints(project_id, user_id)
-    )
-    delete_folder(directory)
+    report.log()
+    return report.as_dict()
 
 
 def get_code_flow_by_id(endpoint_id, project_id):
     dir = os.getcwd()
     code = ""
-    nodes_pro = neo4j_graph.find_outbound_neighbors(
-        endpoint_id, project_id, with_bodies=True
-    )
-    for node in nodes_pro:
-        if "file" in json.loads(node[2]):
-            code += (
-                    f"File: {json.loads(node[2])['file'].replace(dir, '')}\n"
-                )
-            code += GithubService.fetch_method_from_repo(node[2]) + "\n"
+    reachability = get_call_graph(project_id).find_reachable(endpoint_id, project_id)
+    if reachability is None:
+        return code
+    nodes = [node for node in reachability.ordered() if "file" in node]
+    for node, method in zip(nodes, GithubService.fetch_methods_from_repo(nodes)):
+        code += (
+                f"File: {node['file'].replace(dir, '')}\n"
+            )
+        code += method + "\n"
     return code
 
 
-def traverse_and_build_structure(
-    node_id, directory, structure, project_id, depth=1
-):
-    node_details = neo4j_graph.get_node_by_id(node_id, project_id)
-    if node_details:
-        parameters = node_details["parameters"] if "parameters" in node_details else []
-        response = node_details["response"] if "response" in node_details else []
-        structure.append({
-            "function": node_id,
-            "params": parameters,
-            "response_object": response,
-            "children": [],
-        })
-        if depth > 0:
-            first_order_neighbors = neo4j_graph.fetch_first_order_neighbors(
-                node_id, project_id
-            )
-            for neighbor in first_order_neighbors:
-                if neighbor not in [
-                    child["function"] for child in structure[-1]["children"]
-                ]:
-                    traverse_and_build_structure(
-                        neighbor["id"],
-                        directory,
-                        structure[-1]["children"],
-                        project_id,
-                        depth - 1,
-                    )
-    return structure
+def build_flow_structure(node_id, nodes, callees, depth, path, memo):
+    # Returns the flow entry of node_id with children down to depth, and
+    # whether it was cut short by a cycle. Entries are memoized by node and
+    # remaining depth unless they depend on the path taken to reach them.
+    if (node_id, depth) in memo:
+        return memo[(node_id, depth)], False
+    node_details = nodes[node_id]
+    entry = {
+        "function": node_id,
+        "params": node_details["parameters"] if "parameters" in node_details else [],
+        "response_object": node_details["response"] if "response" in node_details else [],
+        "children": [],
+    }
+    cyclic = False
+    if depth > 0:
+        path.add(node_id)
+        for child_id in dict.fromkeys(callees.get(node_id, [])):
+            if child_id not in nodes:
+                continue
+            if child_id in path:
+                # Recursive call, listed without expanding it again
+                child = build_flow_structure(child_id, nodes, callees, 0, path, memo)[0]
+                cyclic = True
+            else:
+                child, child_cyclic = build_flow_structure(
+                    child_id, nodes, callees, depth - 1, path, memo
+                )
+                cyclic = cyclic or child_cyclic
+            entry["children"].append(child)
+        path.discard(node_id)
+    if not cyclic:
+        memo[(node_id, depth)] = entry
+    return entry, cyclic
 
 
-def get_graphical_flow_structure(endpoint_id, directory, project_id):
-    flow_structure = traverse_and_build_structure(
-        endpoint_id, directory, [], project_id, depth=4
-    )  # Adjust depth as needed to fetch further connections
-    return flow_structure
+def get_graphical_flow_structure(endpoint_id, directory, project_id, depth=4):
+    nodes, callees = graph_db.get_subgraph(endpoint_id, project_id, depth)
+    if endpoint_id not in nodes:
+        return []
+    entry, _ = build_flow_structure(endpoint_id, nodes, callees, depth, set(), {})
+    return [entry]
 
 
 def get_flow(endpoint_id, project_id):
-    flow = ()
-    nodes_pro = neo4j_graph.find_outbound_neighbors(
-        endpoint_id=endpoint_id, project_id=project_id, with_bodies=True
-    )
-    for node in nodes_pro:
-        if "id" in node:
-            flow += (node["id"],)
-        elif "neighbor" in node:
-            flow += (node["neighbor"]["id"],)
-    return flow
+    # The endpoint followed by every function it reaches, nearest first
+    reachability = get_call_graph(project_id).find_reachable(endpoint_id, project_id)
+    if reachability is None:
+        return ()
+    return tuple(node["id"] for node in reachability.ordered())
 
 
 def get_code_for_function(function_identifier):
-    node = neo4j_graph.get_node_by_id(function_identifier, project_id="")
+    node = graph_db.get_node_by_id(function_identifier, project_id="")
     return GithubService.fetch_method_from_repo(node)
 
 
 def get_node(function_identifier, project_details):
-    return neo4j_graph.get_node_by_id(function_identifier, project_details["id"])
+    return graph_db.get_node_by_id(function_identifier, project_details["id"])
 
 def get_node_by_id(node_id, project_id):
-    return neo4j_graph.get_node_by_id(node_id, project_id)
+    return graph_db.get_node_by_id(node_id, project_id)
 
 
 def get_values(repo_details, project_manager, user_id):
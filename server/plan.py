@@ -173,10 +173,8 @@ To help integration test the flow above:
         else:
             return plan
         
-    async def _get_explanation_for_function_in_local_code(self, function_identifier, node, project_id):
+    async def _get_explanation_for_function_in_local_code(self, function_identifier, code, project_id):
         with SessionManager() as db:
-            if "project_id" in node:
-                code = LocalGitService.fetch_method_from_repo(node)
             code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
             explanation = crud_utils.get_explanation_by_identifier(db, function_identifier, code_hash)
 
@@ -190,7 +188,6 @@ To help integration test the flow above:
                     )
                     crud_utils.create_explanation(db, new_explanation)
             else:
-                code = LocalGitService.fetch_method_from_repo(node)
                 explanation_text = await self.explanation_from_function(code)
                 new_explanation = Explanation(
                     identifier=function_identifier,
@@ -203,10 +200,8 @@ To help integration test the flow above:
                 explanation = new_explanation
             return explanation.explanation if explanation else None
 
-    async def _get_explanation_for_function(self, function_identifier, node, project_id):
+    async def _get_explanation_for_function(self, function_identifier, code, project_id):
         with SessionManager() as db:
-            if "project_id" in node:
-                code = GithubService.fetch_method_from_repo(node)
             code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
 
             explanation = crud_utils.get_explanation_by_identifier(db, function_identifier, code_hash)
@@ -221,7 +216,6 @@ To help integration test the flow above:
                     )
                     crud_utils.create_explanation(db, new_explanation)
             else:
-                code = GithubService.fetch_method_from_repo(node)
                 explanation_text = await self.explanation_from_function(code)
                 new_explanation = Explanation(
                     identifier=function_identifier,
@@ -235,13 +229,6 @@ To help integration test the flow above:
 
             return explanation.explanation if explanation else None
 
-    def _get_code_for_node(self, node):
-        return GithubService.fetch_method_from_repo(node)
-    
-    def _get_code_for_node_for_local_repo(self, node):
-        code=  LocalGitService.fetch_method_from_repo(node)
-        return code
-
     def _extract_json(self, text):
         json_data = None
         pattern = (  # Regular expression pattern to match JSON objects
@@ -373,18 +360,23 @@ To help integration test the flow above:
                 status_code=404, detail="Identifier not found, run code"
             )
         context = ""
-        for function in flow:
-            node = get_node(function, project_details)
-            is_local_repo = os.getenv("isDevelopmentMode") == "enabled" and self.user_id == os.getenv("defaultUsername")
+        nodes = [get_node(function, project_details) for function in flow]
+        is_local_repo = os.getenv("isDevelopmentMode") == "enabled" and self.user_id == os.getenv("defaultUsername")
+        # Every file of the flow is read once, not once per function
+        if is_local_repo:
+            codes = LocalGitService.fetch_methods_from_repo(nodes)
+        else:
+            codes = GithubService.fetch_methods_from_repo(nodes)
+        for index, function in enumerate(flow):
             if(is_local_repo):
                 context += (
                     "\n"
                     + function
                     + "\n code: \n"
-                    + self._get_code_for_node_for_local_repo(node)
+                    + codes[index]
                     + "\n explanation: \n"
                     + await self._get_explanation_for_function_in_local_code(
-                        function, node, project_details["id"]
+                        function, codes[index], project_details["id"]
                     )
                 )
             else:
@@ -392,10 +384,10 @@ To help integration test the flow above:
                     "\n"
                     + function
                     + "\n code: \n"
-                    + self._get_code_for_node(node)
+                    + codes[index]
                     + "\n explanation: \n"
                     + await self._get_explanation_for_function(
-                        function, node, project_details["id"]
+                        function, codes[index], project_details["id"]
                     )
                 )
         context = (
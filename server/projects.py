@@ -3,6 +3,7 @@ from server.crud import crud_utils
 from server.models.repo_details import ProjectStatusEnum
 from server.utils.model_helper import model_to_dict
 from server.schemas import Project
+import json
 import logging
 from fastapi import HTTPException
 from datetime import datetime
@@ -25,6 +26,30 @@ class ProjectManager:
             logging.info(message)
         return project_id
 
+    def get_parse_ignore(self, project_id: int):
+        # .gitignore style patterns excluded from parsing, kept in the project
+        # properties next to the repository metadata
+        with SessionManager() as db:
+            project = crud_utils.get_project_by_id(db, project_id)
+            if project is None or not project.properties:
+                return []
+            try:
+                properties = json.loads(project.properties)
+            except ValueError:
+                return []
+            return properties.get("parse_ignore") or []
+
+    def update_parse_ignore(self, project_id: int, patterns: list):
+        with SessionManager() as db:
+            project = crud_utils.get_project_by_id(db, project_id)
+            if project is None:
+                return None
+            properties = json.loads(project.properties) if project.properties else {}
+            properties["parse_ignore"] = patterns
+            return crud_utils.update_project(
+                db, project_id, properties=json.dumps(properties).encode("utf-8")
+            )
+
     def list_projects(self, user_id: str):
         with SessionManager() as db:
             projects = crud_utils.get_projects_by_user_id(db, user_id)
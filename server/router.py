@@ -16,7 +16,6 @@ from server.endpoint_detection import EndpointManager
 from fastapi import Depends, HTTPException
 from server.utils.APIRouter import APIRouter
 from fastapi.requests import Request
-from github import Github
 from server.models.repo_details import (
     PreferenceDetails,
     ProjectStatusEnum,
@@ -24,7 +23,6 @@ from server.models.repo_details import (
     TestPlanDetails,
 )
 from server.parse import (
-    analyze_directory,
     get_flow,
     get_graphical_flow_structure,
     get_node,
@@ -35,9 +33,11 @@ from server.projects import ProjectManager
 from pydantic import BaseModel
 
 from server.blast_radius_detection import get_paths_from_identifiers
+from server.utils.github_client import GithubAppClientsSingleton
 from server.utils.github_helper import GithubService
-from server.utils.graph_db_helper import Neo4jGraph
-from server.utils.parse_helper import setup_project_directory, reparse_cleanup
+from server.utils.graph_db_helper import GraphSingleton
+from server.utils.parse_helper import get_head_commit, get_parse_repo_name
+from server.utils.parse_jobs import ParseJobManagerSingleton, parse_project_job
 from server.dependencies import Dependencies
 from server.auth import check_auth
 from server.test_agent.crew import GenerateTest
@@ -49,7 +49,8 @@ project_manager = ProjectManager()
 
 api_router = APIRouter()
 auth_service = AuthService()
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
+parse_job_manager = ParseJobManagerSingleton.get_instance()
 
 repo_not_found_message = "Repository not found"
 
@@ -83,20 +84,17 @@ async def parse_directory(
             repo = Repo(local_repo_path)
             if repo_details.branch_name not in repo.heads:
                 raise HTTPException(status_code=400, detail="Branch not found in local repository")
-            current_dir = os.getcwd()
-            os.chdir(local_repo_path)
-            try:
-                repo.git.checkout(repo_details.branch_name)
-            finally:
-                os.chdir(current_dir)
+            # git runs in the working tree of the repo, the process working
+            # directory is left alone for the parse jobs running meanwhile
+            repo.git.checkout(repo_details.branch_name)
         except GitCommandError as e:
             raise HTTPException(status_code=400, detail="Failed to access or switch branch in local repository")
     else:
-        response, auth, owner = GithubService.get_github_repo_details(repo_details.repo_name)
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get installation ID")
-        app_auth = auth.get_installation_auth(response.json()["id"])
-        github = Github(auth=app_auth)
+        owner = repo_details.repo_name.split("/")[0]
+        clients = GithubAppClientsSingleton.get_instance()
+        installation_id = clients.get_installation_id(repo_details.repo_name)
+        app_auth = clients.get_installation_auth(installation_id)
+        github = clients.get_client(installation_id)
         try:
             repo = github.get_repo(repo_details.repo_name)
         except Exception as e:
@@ -107,53 +105,43 @@ async def parse_directory(
     branch_name = repo_details.branch_name
     project_details = project_manager.get_project_from_db(f"{repo_name}-{branch_name}", user_id)
     project_deleted = project_details.is_deleted if project_details else None
+    job_id = None
 
     try:
         new_project = True
         if project_details is None:
-            dir_details, project_id, should_parse_repo = setup_project_directory(
-                owner, repo_name, branch_name, app_auth, repo, user_id, project_id
+            job = parse_project_job(
+                owner, repo_name, branch_name, app_auth, repo, user_id
+            )
+            job_id = parse_job_manager.submit(
+                job, user_id, get_parse_repo_name(repo), branch_name,
+                head_sha=get_head_commit(repo, branch_name)
             )
-            if should_parse_repo:
-                await analyze_directory(dir_details, user_id, project_id)
-                message = "The project has been parsed successfully"
-                project_manager.update_project_status(project_id, ProjectStatusEnum.READY)
-            else:
-                project_manager.update_project_status(project_id, ProjectStatusEnum.ERROR)
-                message = "Repository doesn't consist of a language currently supported."
+            message = "The project is being parsed"
         else:
-            dir_details = project_details.directory
             project_id = project_details.id
             if project_deleted:
                 message = project_manager.restore_project(project_id, user_id)
             else:  #offline repo logic
                 if repo_details.repo_path:
-                    reparse_cleanup(project_details, user_id)
-                    dir_details, project_id, should_parse_repo = setup_project_directory(
-                        owner, repo_name, branch_name, app_auth, repo, user_id, project_id
+                    job = parse_project_job(owner, repo_name, branch_name, app_auth, repo, user_id)
+                    job_id = parse_job_manager.submit(
+                        job, user_id, get_parse_repo_name(repo), branch_name, project_id,
+                        get_head_commit(repo, branch_name)
                     )
-                    if should_parse_repo:
-                        await analyze_directory(dir_details, user_id, project_id)
-                        new_project = False
-                        message = "The project has been re-parsed successfully"
-                        project_manager.update_project_status(project_id, ProjectStatusEnum.READY)
-                    else:
-                        project_manager.update_project_status(project_id, ProjectStatusEnum.ERROR)
-                        message = "Repository doesn't consist of a language currently supported."
+                    new_project = False
+                    message = "The project is being re-parsed"
                 else: #github repo logic
                     if GithubService.check_is_commit_added(repo, project_details, branch_name):
-                        reparse_cleanup(project_details, user_id)
-                        dir_details, project_id, should_parse_repo = setup_project_directory(
-                            owner, repo_name, branch_name, app_auth, repo, user_id, project_id
+                        job = parse_project_job(
+                            owner, repo_name, branch_name, app_auth, repo, user_id
+                        )
+                        job_id = parse_job_manager.submit(
+                            job, user_id, get_parse_repo_name(repo), branch_name, project_id,
+                            get_head_commit(repo, branch_name)
                         )
-                        if should_parse_repo:
-                            await analyze_directory(dir_details, user_id, project_id)
-                            new_project = False
-                            message = "The project has been re-parsed successfully"
-                            project_manager.update_project_status(project_id, ProjectStatusEnum.READY)
-                        else:
-                            project_manager.update_project_status(project_id, ProjectStatusEnum.ERROR)
-                            message = "Repository doesn't consist of a language currently supported."
+                        new_project = False
+                        message = "The project is being re-parsed"
                     else:
                         return {
                             "message": "No new commits have been added to the branch since the last parsing. The database is up to date.",
@@ -173,15 +161,21 @@ async def parse_directory(
         "new_project": new_project
     }
     
-    if repo_details.repo_name:
-        github.close()
-    
     return {
         "message": message,
-        "id": project_id
+        "id": project_id,
+        "job_id": job_id
     }
 
 
+@api_router.get("/parse/status/{job_id}")
+def get_parse_status(job_id: str, user=Depends(check_auth)):
+    job = parse_job_manager.get_job(job_id, user["user_id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Parse job not found")
+    return job
+
+
 @api_router.get("/endpoints/list")
 def get_endpoints(request: Request, project_id: int, user=Depends(check_auth)):
     user_id = user["user_id"]
@@ -225,7 +219,8 @@ def get_blast_radius_details(
             repo = Repo(repo_path)
             if branch_name not in repo.heads:
                 raise HTTPException(status_code=400, detail="Branch not found in local repository")
-            repo.git.checkout(branch_name)
+            # The branch is read through its commits, the working tree is
+            # shared and left alone
             repo_details = {
                 "name": repo_name,
                 "path": repo_path
@@ -233,9 +228,7 @@ def get_blast_radius_details(
         except GitCommandError:
             raise HTTPException(status_code=400, detail="Failed to access or switch branch in local repository")
     else:
-        response, auth, owner = GithubService.get_github_repo_details(repo_name)
-        app_auth = auth.get_installation_auth(response.json()['id'])
-        github = Github(auth=app_auth)
+        github = GithubAppClientsSingleton.get_instance().get_repo_client(repo_name)
         try:
             repo = github.get_repo(repo_name)
             repo_details = repo
@@ -304,12 +297,8 @@ def get_blast_radius_details(
                     base_branch = "main"
                     identifiers = get_updated_function_list(patches_dict, directory, repo_details, branch_name)
             if len(identifiers) == 0:
-                if github:
-                    github.close()
                 return []
             paths = get_paths_from_identifiers(identifiers, directory, project_details["id"])
-            if github:
-                github.close()
             return paths
 
     
@@ -5,3 +5,4 @@ from .projects import Project
 from .users import User
 from .pydantic import Pydantic
 from .inference import Inference
+from .parse_jobs import ParseJob
@@ -0,0 +1,35 @@
+from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, Text
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from server.schemas.base import Base
+
+
+class ParseJob(Base):
+    __tablename__ = "parse_jobs"
+    id = Column(String(36), primary_key=True)
+    # Unknown until a new project is registered by the job itself
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=True)
+    user_id = Column(String(255), nullable=False)
+    repo_name = Column(Text)
+    branch_name = Column(Text)
+    # Commit the job was requested for, when known
+    head_sha = Column(String(255))
+    status = Column(String(255), default='queued')
+    phase = Column(String(255))
+    files_processed = Column(Integer)
+    files_total = Column(Integer)
+    message = Column(Text)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP, default=func.current_timestamp())
+    started_at = Column(TIMESTAMP)
+    phase_started_at = Column(TIMESTAMP)
+    updated_at = Column(
+        TIMESTAMP,
+        default=func.current_timestamp(),
+        onupdate=func.current_timestamp(),
+    )
+    finished_at = Column(TIMESTAMP)
+    # Job that took over when this one was superseded
+    superseded_by = Column(String(36))
+
+    project = relationship("Project", back_populates="parse_jobs")
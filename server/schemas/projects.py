@@ -30,7 +30,7 @@ class Project(Base):
     status = Column(String(255), default='created')
     __table_args__ = (
         ForeignKeyConstraint(["user_id"], ["users.uid"], ondelete="CASCADE"),
-        CheckConstraint("status IN ('created', 'ready', 'error')", name='check_status'),
+        CheckConstraint("status IN ('created', 'parsing', 'ready', 'error')", name='check_status'),
     )
 
     # Relationships
@@ -41,3 +41,4 @@ class Project(Base):
     explanation = relationship("Explanation", back_populates="project")
     pydantic = relationship("Pydantic", back_populates="project")
     inferences = relationship("Inference", back_populates="project")
+    parse_jobs = relationship("ParseJob", back_populates="project")
@@ -8,9 +8,9 @@ from server.parse import (
     get_flow,
     get_node_by_id,
 )
-from server.utils.graph_db_helper import Neo4jGraph
+from server.utils.graph_db_helper import GraphSingleton
 import requests
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
 
 class CodeTools:
     """
@@ -29,14 +29,13 @@ class CodeTools:
       - The code for the specified endpoint identifier.
       """
       code = ""
-      nodes = get_flow(identifier, project_id)
-      for node in nodes:
-        node = get_node_by_id(node, project_id)
+      nodes = [get_node_by_id(node, project_id) for node in get_flow(identifier, project_id)]
+      for node, method in zip(nodes, GithubService.fetch_methods_from_repo(nodes)):
         code += (
             "\n"
             + node["id"]
             + "\n code: \n"
-            + GithubService.fetch_method_from_repo(node)
+            + method
         )
       return code
 
@@ -51,10 +50,9 @@ class CodeTools:
       Returns:
       - The pydantic class definition for the specified class name.
       """
-      inheritance_tree = neo4j_graph.get_class_hierarchy(classname, project_id)
+      inheritance_tree = graph_db.get_class_hierarchy(classname, project_id)
       class_definition_added = ""
-      for class_node in inheritance_tree:
-          class_content = GithubService.fetch_method_from_repo(class_node)
+      for class_content in GithubService.fetch_methods_from_repo(inheritance_tree):
           class_definition_added = f"{class_definition_added}{class_content}\n\n"
       return class_definition_added
 
@@ -70,9 +68,8 @@ class CodeTools:
         """
         definitions = ""
         try:
-            inheritance_nodes = neo4j_graph.get_multiple_class_hierarchies(classnames, project_id)
-            for class_node in inheritance_nodes:
-                class_content = GithubService.fetch_method_from_repo(class_node)
+            inheritance_nodes = graph_db.get_multiple_class_hierarchies(classnames, project_id)
+            for class_content in GithubService.fetch_methods_from_repo(inheritance_nodes):
                 definitions = f"{definitions}{class_content}\n\n"
         except Exception as e:
             logging.exception(f"project_id : {project_id} something went wrong during fetching definition for {classnames}", e)
@@ -0,0 +1,51 @@
+class ClassIndex:
+    """
+    Class inheritance tables built once per parse from the file index, so
+    class hierarchies are resolved in a single pass over the definitions
+    instead of repeated sweeps over every class in the repository.
+    """
+
+    def __init__(self, file_index):
+        # name -> (file_path, bases) for every definition with that name,
+        # nested classes included, in parse order
+        self.definitions = {}
+        # base name -> names of the classes listing it as a base
+        self.subclasses = {}
+        for file_path, entry in file_index.items():
+            for class_record in entry.classes:
+                for class_def in (class_record,) + class_record.inner_classes:
+                    self.definitions.setdefault(class_def.name, []).append(
+                        (file_path, class_def.bases)
+                    )
+                    for base in class_def.bases:
+                        self.subclasses.setdefault(base, {})[class_def.name] = None
+
+    def descendants(self, base):
+        # Worklist over the subclass table: every class name is expanded at
+        # most once, whatever the depth of the hierarchy
+        found = set()
+        worklist = [base]
+        while worklist:
+            name = worklist.pop()
+            for subclass in self.subclasses.get(name, ()):
+                if subclass not in found:
+                    found.add(subclass)
+                    worklist.append(subclass)
+        return found
+
+    def subclass_definitions(self, base):
+        """
+        Returns name -> (file_path, bases) for every class deriving from base
+        directly or indirectly. When a name is defined more than once, the
+        last definition in parse order that derives from base is used.
+        """
+        descendants = self.descendants(base) - {base}
+        ancestors = descendants | {base}
+        subclasses = {}
+        for name, definitions in self.definitions.items():
+            if name not in descendants:
+                continue
+            for file_path, bases in definitions:
+                if any(class_base in ancestors for class_base in bases):
+                    subclasses[name] = (file_path, list(bases))
+        return subclasses
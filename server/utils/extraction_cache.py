@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def is_extraction_cache_enabled():
+    return os.getenv("EXTRACTION_CACHE", "enabled") != "disabled"
+
+
+class ExtractionCache:
+    """
+    Persistent, size-bounded cache of per-file extraction results keyed by
+    the digest of the file contents and the extraction version. Results do
+    not depend on where a file lives, so every branch, user and re-parse of
+    the same repository on this host shares the entries. Least recently used
+    entries are evicted once the cache grows past max_bytes.
+    """
+
+    # SQLite limits the number of bound parameters per statement
+    _chunk_size = 500
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.getenv("EXTRACTION_CACHE_PATH") or os.path.join(
+            os.getenv("PROJECT_PATH", "projects"), ".cache", "extraction.db"
+        )
+        self.max_bytes = max_bytes or int(
+            os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS extraction_cache_last_used "
+                "ON extraction_cache (last_used)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        results = {}
+        with self._lock:
+            connection = self._connect()
+            for offset in range(0, len(keys), self._chunk_size):
+                chunk = keys[offset:offset + self._chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT key, value FROM extraction_cache WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, value in rows:
+                    results[key] = json.loads(zlib.decompress(value))
+            if results:
+                now = time.time()
+                connection.executemany(
+                    "UPDATE extraction_cache SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in results],
+                )
+                connection.commit()
+            self.hits += len(results)
+            self.misses += len(keys) - len(results)
+        return results
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, result in items.items():
+            value = zlib.compress(json.dumps(result).encode("utf-8"))
+            rows.append((key, value, len(value), now))
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            connection.commit()
+            self._evict(connection)
+
+    def _evict(self, connection):
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM extraction_cache"
+        ).fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        # Trim to 90% so every insert past the limit does not evict again
+        excess = total_size - int(self.max_bytes * 0.9)
+        evicted = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM extraction_cache ORDER BY last_used"
+        ):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM extraction_cache WHERE key = ?", evicted)
+        connection.commit()
+        self.evictions += len(evicted)
+        logging.info(f"Evicted {len(evicted)} entries from the extraction cache")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class ExtractionCacheSingleton:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ExtractionCache()
+        return cls._instance
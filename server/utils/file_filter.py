@@ -0,0 +1,228 @@
+import logging
+import os
+import re
+
+# Vendored, generated and build output that is never worth parsing, in
+# .gitignore syntax. A project's parse_ignore list is applied after these and
+# can re-include any of them with "!pattern".
+DEFAULT_PARSE_IGNORE = [
+    ".git/",
+    "venv/",
+    ".venv/",
+    "virtualenv/",
+    "site-packages/",
+    "dist-packages/",
+    "node_modules/",
+    "__pycache__/",
+    ".tox/",
+    ".nox/",
+    ".eggs/",
+    "*.egg-info/",
+    "build/",
+    "dist/",
+    "**/alembic/versions/",
+    "**/migrations/versions/",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+]
+
+
+def get_max_file_bytes():
+    return int(os.getenv("PARSE_MAX_FILE_BYTES", str(1024 * 1024)))
+
+
+class IgnoreRule:
+    __slots__ = ("regex", "negate", "dir_only")
+
+    def __init__(self, regex, negate, dir_only):
+        self.regex = regex
+        self.negate = negate
+        self.dir_only = dir_only
+
+    @classmethod
+    def parse(cls, line):
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # A slash anywhere but at the end anchors the pattern to the
+        # directory of the ignore file, otherwise it matches at any depth
+        anchored = "/" in line
+        line = line.lstrip("/")
+        body = cls.translate(line)
+        prefix = "^" if anchored else "^(?:.*/)?"
+        return cls(re.compile(prefix + body + "$"), negate, dir_only)
+
+    @staticmethod
+    def translate(pattern):
+        regex = []
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if pattern.startswith("**/", index):
+                regex.append("(?:.*/)?")
+                index += 3
+                continue
+            if pattern.startswith("**", index):
+                regex.append(".*")
+                index += 2
+                continue
+            if char == "*":
+                regex.append("[^/]*")
+            elif char == "?":
+                regex.append("[^/]")
+            elif char == "[":
+                end = pattern.find("]", index + 1)
+                if end == -1:
+                    regex.append(re.escape(char))
+                else:
+                    char_class = pattern[index + 1:end]
+                    if char_class.startswith("!"):
+                        char_class = "^" + char_class[1:]
+                    regex.append(f"[{char_class}]")
+                    index = end
+            else:
+                regex.append(re.escape(char))
+            index += 1
+        return "".join(regex)
+
+    def matches(self, relative_path, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.match(relative_path) is not None
+
+
+def parse_rules(lines):
+    rules = []
+    for line in lines:
+        rule = IgnoreRule.parse(line)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+class FileFilter:
+    """
+    Decides which files of a repository are parsed. Paths are matched, in
+    order, against the default deny-list, the repository's .gitignore files
+    (the root one first, nested ones relative to their own directory) and the
+    project's parse_ignore list, with the last matching pattern winning as in
+    git. Files larger than max_file_bytes are skipped as well. Skipped files
+    and pruned directories are counted per reason in skipped.
+    """
+
+    def __init__(self, directory, patterns=None, max_file_bytes=None, sources=None):
+        self.directory = directory.rstrip("/")
+        self.sources = sources
+        self.max_file_bytes = max_file_bytes or get_max_file_bytes()
+        self.default_rules = parse_rules(DEFAULT_PARSE_IGNORE)
+        self.project_rules = parse_rules(patterns or [])
+        self.skipped = {}
+        self._gitignores = {}
+        self._directories = {}
+
+    def count(self, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def get_gitignore_rules(self, relative_dir):
+        if relative_dir not in self._gitignores:
+            gitignore_path = os.path.join(self.directory, relative_dir, ".gitignore")
+            lines = []
+            try:
+                if self.sources is not None:
+                    if gitignore_path in self.sources:
+                        lines = self.sources[gitignore_path].decode("utf-8").splitlines()
+                elif os.path.isfile(gitignore_path):
+                    with open(gitignore_path, "r", encoding="utf-8") as gitignore_file:
+                        lines = gitignore_file.read().splitlines()
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"Could not read {gitignore_path}: {e}")
+            self._gitignores[relative_dir] = parse_rules(lines)
+        return self._gitignores[relative_dir]
+
+    def match(self, relative_path, is_dir):
+        # Returns the reason the path is excluded, or None
+        reason = None
+        for rule in self.default_rules:
+            if rule.matches(relative_path, is_dir):
+                reason = None if rule.negate else "default"
+        parts = relative_path.split("/")
+        for depth in range(len(parts)):
+            relative_dir = "/".join(parts[:depth])
+            path_in_dir = "/".join(parts[depth:])
+            for rule in self.get_gitignore_rules(relative_dir):
+                if rule.matches(path_in_dir, is_dir):
+                    reason = None if rule.negate else "gitignore"
+        for rule in self.project_rules:
+            if rule.matches(relative_path, is_dir):
+                reason = None if rule.negate else "project"
+        return reason
+
+    def excluded_dir(self, relative_dir):
+        # Excluded directory (itself or one of its parents) and the reason
+        if not relative_dir:
+            return None
+        if relative_dir not in self._directories:
+            parent = relative_dir.rsplit("/", 1)[0] if "/" in relative_dir else ""
+            self._directories[relative_dir] = (
+                self.excluded_dir(parent) or self.match(relative_dir, True)
+            )
+        return self._directories[relative_dir]
+
+    def excluded_file(self, relative_path, size):
+        if size > self.max_file_bytes:
+            return "size"
+        return self.match(relative_path, False)
+
+    def list_python_files(self):
+        if self.sources is not None:
+            return self._list_streamed_files()
+        python_filepaths = []
+        for subdir, dirs, files in os.walk(self.directory):
+            relative_subdir = os.path.relpath(subdir, self.directory)
+            relative_subdir = "" if relative_subdir == "." else relative_subdir
+            # Excluded directories are pruned, not walked
+            for name in list(dirs):
+                relative_dir = f"{relative_subdir}/{name}".lstrip("/")
+                reason = self.match(relative_dir, True)
+                if reason:
+                    dirs.remove(name)
+                    self.count(f"dirs_{reason}")
+            for file in files:
+                if not file.endswith(".py") or file.startswith("test"):
+                    continue
+                file_path = os.path.join(subdir, file)
+                reason = self.excluded_file(
+                    f"{relative_subdir}/{file}".lstrip("/"),
+                    os.path.getsize(file_path),
+                )
+                if reason:
+                    self.count(f"files_{reason}")
+                    continue
+                python_filepaths.append(file_path)
+        return python_filepaths
+
+    def _list_streamed_files(self):
+        python_filepaths = []
+        for file_path, content in self.sources.items():
+            file = os.path.basename(file_path)
+            if not file.endswith(".py") or file.startswith("test"):
+                continue
+            relative_path = file_path[len(self.directory):].lstrip("/")
+            relative_dir = os.path.dirname(relative_path)
+            reason = self.excluded_dir(relative_dir) or self.excluded_file(
+                relative_path, len(content)
+            )
+            if reason:
+                self.count(f"files_{reason}")
+                continue
+            python_filepaths.append(file_path)
+        return python_filepaths
@@ -0,0 +1,146 @@
+from sys import intern
+
+
+def intern_optional(value):
+    return intern(value) if isinstance(value, str) else value
+
+
+class FunctionRecord:
+    __slots__ = ("parameters", "start", "end", "response", "calls")
+
+    def __init__(self, parameters, start, end, response, calls):
+        self.parameters = parameters
+        self.start = start
+        self.end = end
+        self.response = response
+        self.calls = calls
+
+    @classmethod
+    def from_result(cls, function):
+        return cls(
+            function["parameters"],
+            function["start"],
+            function["end"],
+            function["response"],
+            tuple(intern(call) for call in function["calls"]),
+        )
+
+    def to_result(self):
+        return {
+            "parameters": self.parameters,
+            "start": self.start,
+            "end": self.end,
+            "response": self.response,
+            "calls": list(self.calls),
+        }
+
+
+class ClassRecord:
+    __slots__ = ("name", "start", "end", "bases", "inner_classes")
+
+    def __init__(self, name, start, end, bases, inner_classes):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.bases = bases
+        self.inner_classes = inner_classes
+
+    @classmethod
+    def from_result(cls, class_result):
+        # Nested classes are only recorded with their name and bases
+        return cls(
+            intern(class_result["name"]),
+            class_result.get("start"),
+            class_result.get("end"),
+            tuple(intern(base) for base in class_result["bases"]),
+            tuple(
+                cls.from_result(inner_class)
+                for inner_class in class_result.get("inner_classes", ())
+            ),
+        )
+
+    def to_result(self):
+        if self.start is None:
+            return {"name": self.name, "bases": list(self.bases)}
+        return {
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "bases": list(self.bases),
+            "inner_classes": [
+                inner_class.to_result() for inner_class in self.inner_classes
+            ],
+        }
+
+
+class FileRecord:
+    """
+    Compact, per-file entry of the file index. Extraction results are
+    converted into slotted records with interned identifiers, since the index
+    for the whole repository is held in memory for the rest of the parse.
+    """
+
+    __slots__ = (
+        "imports",
+        "class_instances",
+        "class_definition",
+        "classes",
+        "functions",
+        "router_prefixes",
+        "endpoints",
+    )
+
+    def __init__(
+        self, imports, class_instances, class_definition, classes, functions,
+        router_prefixes, endpoints
+    ):
+        # (module, alias) pairs in source order
+        self.imports = imports
+        self.class_instances = class_instances
+        self.class_definition = class_definition
+        self.classes = classes
+        # "relative_path:name" -> FunctionRecord
+        self.functions = functions
+        self.router_prefixes = router_prefixes
+        # endpoint detector name -> metadata captured during extraction
+        self.endpoints = endpoints
+
+    @classmethod
+    def from_result(cls, relative_path, file_result):
+        return cls(
+            tuple(
+                (intern(import_entry["module"]), intern_optional(import_entry["alias"]))
+                for import_entry in file_result["imports"]
+            ),
+            {
+                intern(instance): intern_optional(class_name)
+                for instance, class_name in file_result["class_instances"].items()
+            },
+            tuple(intern(name) for name in file_result["class_definition"]),
+            tuple(
+                ClassRecord.from_result(class_result)
+                for class_result in file_result["classes"]
+            ),
+            {
+                intern(f"{relative_path}:{function_name}"): FunctionRecord.from_result(function)
+                for function_name, function in file_result["functions"].items()
+            },
+            file_result["router_prefixes"],
+            file_result["endpoints"],
+        )
+
+    def to_result(self, relative_path):
+        return {
+            "imports": [
+                {"module": module, "alias": alias} for module, alias in self.imports
+            ],
+            "class_instances": dict(self.class_instances),
+            "class_definition": list(self.class_definition),
+            "classes": [class_record.to_result() for class_record in self.classes],
+            "functions": {
+                function_identifier[len(relative_path) + 1:]: function.to_result()
+                for function_identifier, function in self.functions.items()
+            },
+            "router_prefixes": self.router_prefixes,
+            "endpoints": self.endpoints,
+        }
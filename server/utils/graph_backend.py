@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+import time
+
+
+def serialize_properties(properties):
+    # Serialize complex properties to strings if needed
+    return {
+        key: (json.dumps(value) if isinstance(value, (dict, list)) else value)
+        for key, value in properties.items()
+    }
+
+
+class GraphBulkWriter:
+    """
+    Buffers node and edge writes for one project and flushes them to the
+    graph backend in batches instead of one round trip per node or edge.
+    """
+
+    def __init__(self, graph, project_id, batch_size=None):
+        self.graph = graph
+        self.project_id = project_id
+        self.batch_size = batch_size or int(os.getenv("NEO4J_BATCH_SIZE", "1000"))
+        self.nodes = []
+        self.updated_nodes = []
+        self.edges = []
+        self.extends = []
+        self.deleted_nodes = []
+        self.removed_edges = []
+        self.removed_extends = []
+        self.written = {
+            "nodes": 0,
+            "updated_nodes": 0,
+            "edges": 0,
+            "extends": 0,
+            "deleted_nodes": 0,
+            "removed_edges": 0,
+            "removed_extends": 0,
+        }
+        self.batches = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def upsert_node(self, function_identifier, properties):
+        properties = dict(properties)
+        properties["project_id"] = self.project_id
+        self.nodes.append({
+            "id": function_identifier,
+            "properties": serialize_properties(properties),
+        })
+        if len(self.nodes) >= self.batch_size:
+            self.flush_nodes()
+
+    def set_node_properties(self, function_identifier, properties):
+        # Unlike upsert_node, never creates the node
+        self.updated_nodes.append({
+            "id": function_identifier,
+            "properties": serialize_properties(properties),
+        })
+        if len(self.updated_nodes) >= self.batch_size:
+            self.flush_nodes()
+
+    def connect_nodes(self, parent_function, called_function_identifier, relationship_properties):
+        self.edges.append({
+            "source": parent_function,
+            "target": called_function_identifier,
+            "properties": relationship_properties,
+        })
+        if len(self.edges) >= self.batch_size:
+            self.flush_edges()
+
+    def add_extends_relationship(self, base_class_id, derived_class_id):
+        self.extends.append({"base": base_class_id, "derived": derived_class_id})
+        if len(self.extends) >= self.batch_size:
+            self.flush_edges()
+
+    def delete_node(self, function_identifier):
+        self.deleted_nodes.append({"id": function_identifier})
+
+    def disconnect_nodes(self, parent_function, called_function_identifier):
+        self.removed_edges.append({
+            "source": parent_function,
+            "target": called_function_identifier,
+        })
+
+    def remove_extends_relationship(self, base_class_id, derived_class_id):
+        self.removed_extends.append({"base": base_class_id, "derived": derived_class_id})
+
+    def _write(self, kind, rows):
+        start = time.perf_counter()
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            self.graph.write_batch(kind, batch, self.project_id)
+            self.batches += 1
+        self.elapsed += time.perf_counter() - start
+        self.written[kind] += len(rows)
+
+    def flush_removals(self):
+        if self.removed_edges:
+            rows, self.removed_edges = self.removed_edges, []
+            self._write("removed_edges", rows)
+        if self.removed_extends:
+            rows, self.removed_extends = self.removed_extends, []
+            self._write("removed_extends", rows)
+        if self.deleted_nodes:
+            rows, self.deleted_nodes = self.deleted_nodes, []
+            self._write("deleted_nodes", rows)
+
+    def flush_nodes(self):
+        if self.nodes:
+            rows, self.nodes = self.nodes, []
+            self._write("nodes", rows)
+        if self.updated_nodes:
+            rows, self.updated_nodes = self.updated_nodes, []
+            self._write("updated_nodes", rows)
+
+    def flush_edges(self):
+        # Edges MATCH their endpoints, so pending nodes always go first
+        self.flush_nodes()
+        if self.edges:
+            rows, self.edges = self.edges, []
+            self._write("edges", rows)
+        if self.extends:
+            rows, self.extends = self.extends, []
+            self._write("extends", rows)
+
+    def flush(self):
+        self.flush_removals()
+        self.flush_edges()
+
+    def stats(self):
+        rows = sum(self.written.values())
+        return {
+            **self.written,
+            "batches": self.batches,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(rows / self.elapsed) if self.elapsed else 0,
+        }
+
+
+def get_reachability_limits():
+    return (
+        int(os.getenv("REACHABILITY_MAX_DEPTH", "25")),
+        int(os.getenv("REACHABILITY_MAX_NODES", "5000")),
+    )
+
+
+class Reachability:
+    """
+    Distinct nodes reachable from a start node over CALLS edges, each at the
+    minimum depth it was found at (the start node at 0). truncated is set
+    when max_depth or max_nodes cut the walk short.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.nodes = {start["id"]: start}
+        self.depths = {start["id"]: 0}
+        self.truncated = False
+
+    def add(self, node, depth):
+        self.nodes[node["id"]] = node
+        self.depths[node["id"]] = depth
+
+    def ordered(self):
+        # Start node first, then by depth
+        return sorted(
+            self.nodes.values(),
+            key=lambda node: (self.depths[node["id"]], node["id"] != self.start["id"], node["id"]),
+        )
+
+    def neighbors(self):
+        return self.ordered()[1:]
+
+
+class GraphBackend:
+    """
+    Storage for the code graph: Function nodes keyed by (project_id, id),
+    CALLS edges from a function to the functions it calls and EXTENDS edges
+    from a class to its base classes. Nodes are returned as dicts of their
+    properties, which include id and project_id.
+    """
+
+    def bulk_writer(self, project_id, batch_size=None):
+        return GraphBulkWriter(self, project_id, batch_size)
+
+    def write_batch(self, kind, rows, project_id):
+        # Writes one batch of GraphBulkWriter rows; kind is one of the keys
+        # of GraphBulkWriter.written
+        raise NotImplementedError
+
+    def upsert_node(self, function_identifier, properties, project_id):
+        raise NotImplementedError
+
+    def connect_nodes(self, parent_function, called_function_identifier, project_id, relationship_properties):
+        raise NotImplementedError
+
+    def add_extends_relationship(self, base_class_id, derived_class_id, project_id):
+        raise NotImplementedError
+
+    def get_node_by_id(self, node_id, project_id):
+        raise NotImplementedError
+
+    def get_node_file_property(self, identifier, project_id):
+        raise NotImplementedError
+
+    def fetch_first_order_neighbors(self, node_id, project_id):
+        raise NotImplementedError
+
+    def expand_calls(self, node_ids, project_id, direction):
+        # (node id, neighbor node) for every CALLS edge of the given nodes;
+        # direction is "outbound" (callees), "inbound" (callers) or "both"
+        raise NotImplementedError
+
+    def find_reachable(self, start_id, project_id, direction="outbound", max_depth=None, max_nodes=None):
+        # Breadth first, one query per level, so every node is visited once
+        # however many paths lead to it and cycles end the walk. Returns None
+        # when the start node does not exist.
+        default_depth, default_nodes = get_reachability_limits()
+        max_depth = default_depth if max_depth is None else max_depth
+        max_nodes = default_nodes if max_nodes is None else max_nodes
+        start = self.get_node_by_id(start_id, project_id)
+        if start is None:
+            return None
+        reachability = Reachability(start)
+        frontier = [start_id]
+        depth = 0
+        while frontier:
+            if depth >= max_depth:
+                reachability.truncated = True
+                break
+            next_frontier = []
+            for node_id, neighbor in self.expand_calls(frontier, project_id, direction):
+                if neighbor["id"] in reachability.depths:
+                    continue
+                if len(reachability.nodes) >= max_nodes:
+                    reachability.truncated = True
+                    break
+                reachability.add(neighbor, depth + 1)
+                next_frontier.append(neighbor["id"])
+            if reachability.truncated:
+                break
+            frontier = next_frontier
+            depth += 1
+        if reachability.truncated:
+            logging.warning(
+                f"project_id: {project_id}, reachability from {start_id} stopped at "
+                f"{len(reachability.nodes)} nodes, depth {depth}"
+            )
+        return reachability
+
+    def find_outbound_neighbors(self, endpoint_id, project_id, with_bodies=False, outbound=True, inbound=False):
+        # The start node followed by the distinct nodes reachable over CALLS
+        # edges, as {"neighbor": node, "body": body} with_bodies
+        direction = "both" if outbound and inbound else "inbound" if inbound else "outbound"
+        reachability = self.find_reachable(endpoint_id, project_id, direction)
+        if reachability is None:
+            return []
+        neighbors = reachability.neighbors()
+        if with_bodies:
+            neighbors = [{"neighbor": node, "body": node.get("body")} for node in neighbors]
+        return [reachability.start] + neighbors
+
+    def find_reaching_endpoints(self, identifiers, endpoint_ids, project_id, max_depth=None):
+        # Ids among endpoint_ids of the nodes, identifiers included, that
+        # reach any of identifiers over CALLS edges within max_depth hops, in
+        # one query
+        raise NotImplementedError
+
+    def get_subgraph(self, node_id, project_id, max_depth):
+        # Nodes within max_depth CALLS hops of node_id and their callees, in
+        # one query: ({id: node}, {id: [callee ids]}). Callees past max_depth
+        # are listed but not in the nodes. Empty when node_id does not exist.
+        raise NotImplementedError
+
+    def export_call_graph(self, project_id):
+        # The project's nodes, as dicts of their id, file, start, end and
+        # type, and its CALLS edges as (source id, target id) pairs
+        raise NotImplementedError
+
+    def find_inbound_neighbors(self, with_bodies=False):
+        # Backend query for the direct callers of a node, passed to traverse
+        raise NotImplementedError
+
+    def traverse(self, identifier, project_id, neighbors_fn):
+        # The start node followed by the nodes of neighbors_fn's query
+        raise NotImplementedError
+
+    def get_class_hierarchy(self, class_name, project_id):
+        raise NotImplementedError
+
+    def get_multiple_class_hierarchies(self, classnames, project_id):
+        raise NotImplementedError
+
+    def delete_nodes_by_project_id(self, project_id):
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -1,9 +1,16 @@
-import json
 import logging
+import os
 from neo4j import GraphDatabase
 from neo4j.exceptions import Neo4jError
 
 from server.utils.config import neo4j_config
+from server.utils.graph_backend import (
+    GraphBackend,
+    GraphBulkWriter,
+    get_reachability_limits,
+    serialize_properties,
+)
+from server.utils.sqlite_graph import SqliteGraph
 
 class Neo4jDriverSingleton:
     _instance = None
@@ -24,7 +31,8 @@ class Neo4jDriverSingleton:
             cls._instance.close()
             cls._instance = None
     
-class Neo4jGraph:
+class Neo4jGraph(GraphBackend):
+    _indexes_created = False
 
     def __init__(self):
         self.driver = Neo4jDriverSingleton.get_instance()
@@ -32,6 +40,33 @@ class Neo4jGraph:
     def close(self):
         Neo4jDriverSingleton.close_instance()
 
+    def bulk_writer(self, project_id, batch_size=None):
+        self.ensure_indexes()
+        return GraphBulkWriter(self, project_id, batch_size)
+
+    def write_batch(self, kind, rows, project_id):
+        transaction_function = {
+            "nodes": self._upsert_nodes,
+            "updated_nodes": self._set_node_properties,
+            "edges": self._connect_nodes_batch,
+            "extends": self._add_extends_relationships,
+            "deleted_nodes": self._delete_nodes,
+            "removed_edges": self._disconnect_nodes_batch,
+            "removed_extends": self._remove_extends_relationships,
+        }[kind]
+        with self.driver.session() as session:
+            session.write_transaction(transaction_function, rows, project_id)
+
+    def ensure_indexes(self):
+        if Neo4jGraph._indexes_created:
+            return
+        with self.driver.session() as session:
+            session.run(
+                "CREATE INDEX function_id_project_id IF NOT EXISTS "
+                "FOR (n:Function) ON (n.id, n.project_id)"
+            )
+        Neo4jGraph._indexes_created = True
+
     def upsert_node(self, function_identifier, properties, project_id):
         properties['project_id'] = project_id
         with self.driver.session() as session:
@@ -46,9 +81,29 @@ class Neo4jGraph:
             session.write_transaction(self._connect_nodes, parent_function, called_function_identifier,
                                       project_id, relationship_properties)
 
-    def find_outbound_neighbors(self, endpoint_id, project_id, with_bodies=False, outbound=True, inbound=False):
+    def expand_calls(self, node_ids, project_id, direction):
         with self.driver.session() as session:
-            return session.read_transaction(self._find_outbound_neighbors, endpoint_id, project_id, with_bodies, outbound, inbound)
+            return session.read_transaction(self._expand_calls, node_ids, project_id, direction)
+
+    def find_reaching_endpoints(self, identifiers, endpoint_ids, project_id, max_depth=None):
+        if max_depth is None:
+            max_depth = get_reachability_limits()[0]
+        with self.driver.session() as session:
+            return session.read_transaction(
+                self._find_reaching_endpoints,
+                list(identifiers),
+                list(endpoint_ids),
+                project_id,
+                max_depth,
+            )
+
+    def get_subgraph(self, node_id, project_id, max_depth):
+        with self.driver.session() as session:
+            return session.read_transaction(self._get_subgraph, node_id, project_id, max_depth)
+
+    def export_call_graph(self, project_id):
+        with self.driver.session() as session:
+            return session.read_transaction(self._export_call_graph, project_id)
 
     def get_node_by_id(self, node_id, project_id):
         with self.driver.session() as session:
@@ -193,11 +248,7 @@ class Neo4jGraph:
             
     @staticmethod
     def _upsert_node(tx, function_identifier,  project_id, properties):
-        # Serialize complex properties to strings if needed
-        serialized_properties = {
-            key: (json.dumps(value) if isinstance(value, (dict, list)) else value)
-            for key, value in properties.items()
-        }
+        serialized_properties = serialize_properties(properties)
 
         query = (
             "MERGE (n:Function {id: $function_identifier, project_id: $project_id}) "
@@ -218,6 +269,74 @@ class Neo4jGraph:
         tx.run(query, parent_function=parent_function, called_function_identifier=called_function_identifier,
                relationship_properties=relationship_properties, project_id= project_id)
 
+    @staticmethod
+    def _upsert_nodes(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MERGE (n:Function {id: row.id, project_id: $project_id}) "
+            "SET n += row.properties"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
+    @staticmethod
+    def _set_node_properties(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (n:Function {id: row.id, project_id: $project_id}) "
+            "SET n += row.properties"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
+    @staticmethod
+    def _connect_nodes_batch(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (a:Function {id: row.source, project_id: $project_id}) "
+            "MATCH (b:Function {id: row.target, project_id: $project_id}) "
+            "MERGE (a)-[r:CALLS]->(b) "
+            "SET r += row.properties"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
+    @staticmethod
+    def _add_extends_relationships(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (base:Function {id: row.base, project_id: $project_id}) "
+            "MATCH (derived:Function {id: row.derived, project_id: $project_id}) "
+            "MERGE (derived)-[r:EXTENDS]->(base)"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
+    @staticmethod
+    def _delete_nodes(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (n:Function {id: row.id, project_id: $project_id}) "
+            "DETACH DELETE n"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
+    @staticmethod
+    def _disconnect_nodes_batch(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (a:Function {id: row.source, project_id: $project_id})"
+            "-[r:CALLS]->(b:Function {id: row.target, project_id: $project_id}) "
+            "DELETE r"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
+    @staticmethod
+    def _remove_extends_relationships(tx, rows, project_id):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (derived:Function {id: row.derived, project_id: $project_id})"
+            "-[r:EXTENDS]->(base:Function {id: row.base, project_id: $project_id}) "
+            "DELETE r"
+        )
+        tx.run(query, rows=rows, project_id=project_id)
+
     @staticmethod
     def _add_edge(tx, node1_id, node2_id, relationship_type):
         query = (
@@ -228,49 +347,80 @@ class Neo4jGraph:
         tx.run(query, node1_id=node1_id, node2_id=node2_id)
 
     @staticmethod
-    def _find_outbound_neighbors(tx, endpoint_id, project_id, with_bodies, outbound, inbound):
-        match_clause = "MATCH (start:Function {id: $endpoint_id, project_id: $project_id})"
-        recursive_match = ""
-
-        if outbound and inbound:
-            recursive_match = "MATCH (start)-[:CALLS*]-(neighbor:Function {project_id: $project_id})"
-        elif outbound:
-            recursive_match = "MATCH (start)-[:CALLS*]->(neighbor:Function {project_id: $project_id})"
-        elif inbound:
-            recursive_match = "MATCH (start)<-[:CALLS*]-(neighbor:Function {project_id: $project_id})"
+    def _expand_calls(tx, node_ids, project_id, direction):
+        pattern = {
+            "outbound": "(a)-[:CALLS]->(b:Function)",
+            "inbound": "(a)<-[:CALLS]-(b:Function)",
+            "both": "(a)-[:CALLS]-(b:Function)",
+        }[direction]
+        query = (
+            "UNWIND $node_ids AS node_id "
+            "MATCH (a:Function {id: node_id, project_id: $project_id}) "
+            f"MATCH {pattern} "
+            "RETURN DISTINCT a.id AS node_id, b AS neighbor"
+        )
+        result = tx.run(query, node_ids=node_ids, project_id=project_id)
+        return [(record["node_id"], dict(record["neighbor"])) for record in result]
 
-        if with_bodies:
-            return_clause = "RETURN start, collect({neighbor: neighbor, body: neighbor.body}) AS neighbors"
-            query = f"""
-                {match_clause}
-                CALL {{
-                    WITH start
-                    {recursive_match}
-                    RETURN neighbor, neighbor.body AS body
-                }}
-                {return_clause}
-                """
-        else:
-            return_clause = "RETURN start, collect(neighbor) AS neighbors"
-            query = f"""
-                {match_clause}
-                CALL {{
-                    WITH start
-                    {recursive_match}
-                    RETURN neighbor
-                }}
-                {return_clause}
-                """
+    @staticmethod
+    def _find_reaching_endpoints(tx, identifiers, endpoint_ids, project_id, max_depth):
+        # All changed functions are expanded together and DISTINCT prunes the
+        # expansion to one visit per caller
+        query = (
+            "UNWIND $identifiers AS identifier "
+            "MATCH (changed:Function {id: identifier, project_id: $project_id}) "
+            f"MATCH (changed)<-[:CALLS*0..{int(max_depth)}]-(caller:Function) "
+            "WITH DISTINCT caller "
+            "WHERE caller.id IN $endpoint_ids "
+            "RETURN caller.id AS id"
+        )
+        result = tx.run(
+            query,
+            identifiers=identifiers,
+            endpoint_ids=endpoint_ids,
+            project_id=project_id,
+        )
+        return {record["id"] for record in result}
 
-        result = tx.run(query, endpoint_id=endpoint_id, project_id=project_id)
-        record = result.single()
-        if not record:
-            return []
+    @staticmethod
+    def _get_subgraph(tx, node_id, project_id, max_depth):
+        # Variable length bounds cannot be parameters. DISTINCT right after
+        # the expansion lets the planner prune it to one visit per node.
+        query = (
+            "MATCH (start:Function {id: $node_id, project_id: $project_id}) "
+            f"MATCH (start)-[:CALLS*0..{int(max_depth)}]->(n:Function) "
+            "WITH DISTINCT n "
+            "OPTIONAL MATCH (n)-[:CALLS]->(callee:Function) "
+            "RETURN n, collect(DISTINCT callee.id) AS callees"
+        )
+        result = tx.run(query, node_id=node_id, project_id=project_id)
+        nodes = {}
+        callees = {}
+        for record in result:
+            node = dict(record["n"])
+            nodes[node["id"]] = node
+            callees[node["id"]] = record["callees"]
+        return nodes, callees
 
-        start_node = dict(record["start"])
-        neighbors = record["neighbors"]
-        combined = [start_node] + neighbors if neighbors else [start_node]
-        return combined
+    @staticmethod
+    def _export_call_graph(tx, project_id):
+        nodes = [
+            record.data()
+            for record in tx.run(
+                "MATCH (n:Function {project_id: $project_id}) "
+                "RETURN n.id AS id, n.file AS file, n.start AS start, n.end AS end, n.type AS type",
+                project_id=project_id,
+            )
+        ]
+        edges = [
+            (record["source"], record["target"])
+            for record in tx.run(
+                "MATCH (a:Function {project_id: $project_id})-[:CALLS]->(b:Function) "
+                "RETURN a.id AS source, b.id AS target",
+                project_id=project_id,
+            )
+        ]
+        return nodes, edges
 
     @staticmethod
     def _get_node_by_id(tx, node_id, project_id):
@@ -281,27 +431,6 @@ class Neo4jGraph:
             return dict(record["n"])
         return None
 
-    @staticmethod
-    def _find_inbound_neighbors(tx, endpoint_id, project_id, with_bodies):
-        query = f"""
-        MATCH (start:Function {{id: $endpoint_id, project_id: $project_id}})
-        CALL {{
-            WITH start
-            MATCH (neighbor:Function {{project_id: $project_id}})-[:CALLS*]->(start)
-            RETURN neighbor{', neighbor.body AS body' if with_bodies else ''}
-        }}
-        RETURN start, collect({{neighbor: neighbor{', body: neighbor.body' if with_bodies else ''}}}) AS neighbors
-        """
-        result = tx.run(query, endpoint_id=endpoint_id, project_id=project_id)
-        record = result.single()
-        if not record:
-            return []
-
-        start_node = dict(record["start"])
-        neighbors = record["neighbors"]
-        combined = [start_node] + neighbors if neighbors else [start_node]
-        return combined
-
     @staticmethod
     def _fetch_first_order_neighbors(tx, node_id, project_id):
         query = """
@@ -341,38 +470,6 @@ class Neo4jGraph:
         return combined
  
 
-    @staticmethod
-    def _find_neighbors(tx, identifier, project_id, with_bodies, outbound, inbound):
-        match_clause = f"MATCH (start:Function {{id: $identifier, project_id: $project_id}})"
-        recursive_match = ""
-
-        if outbound and inbound:
-            recursive_match = "MATCH (start)-[:CALLS*]-(neighbor:Function {project_id: $project_id})"
-        elif outbound:
-            recursive_match = "MATCH (start)-[:CALLS*]->(neighbor:Function {project_id: $project_id})"
-        elif inbound:
-            recursive_match = "MATCH (start)<-[:CALLS*]-(neighbor:Function {project_id: $project_id})"
-
-        if with_bodies:
-            return_clause = "RETURN start, collect({neighbor: neighbor, body: neighbor.body}) AS neighbors"
-        else:
-            return_clause = "RETURN start, collect(neighbor) AS neighbors"
-
-        query = f"""
-            {match_clause}
-            {recursive_match}
-            {return_clause}
-        """
-        result = tx.run(query, identifier=identifier, project_id=project_id)
-        record = result.single()
-        if not record:
-            return []
-
-        start_node = dict(record["start"])
-        neighbors = [dict(neighbor) for neighbor in record["neighbors"]]
-        combined = [start_node] + neighbors if neighbors else [start_node]
-        return combined
-
     @staticmethod
     def _add_extends_relationship(tx, base_class_id, derived_class_id, project_id):
         try:
@@ -398,3 +495,18 @@ class Neo4jGraph:
                 except Exception as e:
                     tx.rollback()
                     raise e
+
+
+class GraphSingleton:
+    # The graph backend named by GRAPH_BACKEND: neo4j, or sqlite for an
+    # embedded database that needs no graph server
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            if os.getenv("GRAPH_BACKEND", "neo4j") == "sqlite":
+                cls._instance = SqliteGraph()
+            else:
+                cls._instance = Neo4jGraph()
+        return cls._instance
@@ -0,0 +1,356 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+from server.utils.graph_backend import Reachability, get_reachability_limits
+from server.utils.graph_db_helper import GraphSingleton
+
+# Arrays of a snapshot, one .npy file each, memory-mapped on load
+SNAPSHOT_ARRAYS = (
+    "id_bytes",
+    "id_offsets",
+    "out_offsets",
+    "out_targets",
+    "in_offsets",
+    "in_targets",
+    "start",
+    "end",
+    "file_index",
+    "type_index",
+    "endpoint_nodes",
+    "reach_offsets",
+    "reach_endpoints",
+)
+
+
+def is_graph_snapshot_enabled():
+    return os.getenv("GRAPH_SNAPSHOT", "enabled") != "disabled"
+
+
+def get_snapshot_dir():
+    return os.getenv("GRAPH_SNAPSHOT_PATH") or os.path.join(
+        os.getenv("PROJECT_PATH", "projects"), ".snapshots"
+    )
+
+
+def intern_strings(values):
+    # (table of distinct values, int32 index of every value into it)
+    table = {}
+    index = np.fromiter(
+        (table.setdefault(value, len(table)) for value in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return list(table), index
+
+
+def compressed_adjacency(edges, node_count):
+    # CSR arrays: the neighbors of node i are targets[offsets[i]:offsets[i + 1]]
+    if not len(edges):
+        return np.zeros(node_count + 1, dtype=np.int64), np.empty(0, dtype=np.int32)
+    order = np.lexsort((edges[:, 1], edges[:, 0]))
+    sources = edges[order, 0]
+    targets = edges[order, 1].astype(np.int32)
+    offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=offsets[1:])
+    return offsets, targets
+
+
+def expand(offsets, targets, frontier):
+    # Neighbors of every node of frontier, without a Python level loop
+    starts = offsets[frontier]
+    lengths = offsets[frontier + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=targets.dtype)
+    positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+    return targets[positions]
+
+
+class GraphSnapshot:
+    """
+    Read-only copy of a project's call graph at one commit, written at the
+    end of a parse so flow and blast radius queries run in-process instead
+    of going to the graph backend. Node ids are interned into integer
+    indexes, CALLS edges are kept as outbound and inbound CSR arrays, and
+    only the node attributes those queries need (file, start, end, type)
+    are kept. The graph backend stays the source of truth; a missing
+    snapshot only means queries go to it.
+
+    It also holds an inverted reachability index for blast radius: for
+    every node, the endpoints that reach it over CALLS edges, as CSR arrays
+    of ordinals into endpoint_nodes.
+    """
+
+    def __init__(self, project_id, commit_id, arrays, files, types):
+        self.project_id = project_id
+        self.commit_id = commit_id
+        self.files = files
+        self.types = types
+        for name in SNAPSHOT_ARRAYS:
+            setattr(self, name, arrays[name])
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def node_count(self):
+        return len(self.id_offsets) - 1
+
+    @classmethod
+    def build(cls, project_id, commit_id, nodes, edges, endpoint_ids=()):
+        # nodes: dicts with id, file, start, end and type; edges: (source id,
+        # target id) pairs, those with an unknown end are dropped;
+        # endpoint_ids: identifiers of the project's endpoints
+        ids = [node["id"] for node in nodes]
+        index = {node_id: position for position, node_id in enumerate(ids)}
+        encoded = [node_id.encode("utf-8") for node_id in ids]
+        id_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([len(node_id) for node_id in encoded], out=id_offsets[1:])
+        edge_array = np.array(
+            [
+                (index[source], index[target])
+                for source, target in edges
+                if source in index and target in index
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        out_offsets, out_targets = compressed_adjacency(edge_array, len(ids))
+        in_offsets, in_targets = compressed_adjacency(edge_array[:, ::-1], len(ids))
+        files, file_index = intern_strings([node.get("file") for node in nodes])
+        types, type_index = intern_strings([node.get("type") for node in nodes])
+        arrays = {
+            "id_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "id_offsets": id_offsets,
+            "out_offsets": out_offsets,
+            "out_targets": out_targets,
+            "in_offsets": in_offsets,
+            "in_targets": in_targets,
+            "start": np.array([node.get("start") or 0 for node in nodes], dtype=np.int32),
+            "end": np.array([node.get("end") or 0 for node in nodes], dtype=np.int32),
+            "file_index": file_index,
+            "type_index": type_index,
+            "endpoint_nodes": np.array(
+                [index[node_id] for node_id in endpoint_ids if node_id in index],
+                dtype=np.int32,
+            ),
+            # Computed over the snapshot itself, below
+            "reach_offsets": None,
+            "reach_endpoints": None,
+        }
+        snapshot = cls(project_id, commit_id, arrays, files, types)
+        snapshot._index = index
+        snapshot.reach_offsets, snapshot.reach_endpoints = snapshot.reachability_index()
+        return snapshot
+
+    def reachability_index(self, max_depth=None):
+        # One traversal per endpoint, at parse time, so blast radius queries
+        # need none
+        if max_depth is None:
+            max_depth = get_reachability_limits()[0]
+        postings = [
+            np.flatnonzero(self._visit(np.array([position]), "outbound", max_depth))
+            for position in self.endpoint_nodes
+        ]
+        pairs = np.empty((sum(len(nodes) for nodes in postings), 2), dtype=np.int64)
+        offset = 0
+        for ordinal, nodes in enumerate(postings):
+            pairs[offset:offset + len(nodes), 0] = nodes
+            pairs[offset:offset + len(nodes), 1] = ordinal
+            offset += len(nodes)
+        return compressed_adjacency(pairs, self.node_count)
+
+    def save(self, root=None):
+        # Written to a new directory that the project's CURRENT file is then
+        # pointed at, so readers never see a half written snapshot
+        project_dir = os.path.join(root or get_snapshot_dir(), str(self.project_id))
+        name = f"{self.commit_id or 'unknown'}-{uuid.uuid4().hex[:8]}"
+        snapshot_dir = os.path.join(project_dir, name)
+        os.makedirs(snapshot_dir)
+        for array_name in SNAPSHOT_ARRAYS:
+            np.save(os.path.join(snapshot_dir, f"{array_name}.npy"), getattr(self, array_name))
+        with open(os.path.join(snapshot_dir, "meta.json"), "w") as meta_file:
+            json.dump({
+                "project_id": self.project_id,
+                "commit_id": self.commit_id,
+                "files": self.files,
+                "types": self.types,
+            }, meta_file)
+        current_path = os.path.join(project_dir, "CURRENT")
+        with open(current_path + ".tmp", "w") as current_file:
+            current_file.write(name)
+        os.replace(current_path + ".tmp", current_path)
+        for entry in os.listdir(project_dir):
+            if entry not in (name, "CURRENT"):
+                shutil.rmtree(os.path.join(project_dir, entry), ignore_errors=True)
+        return snapshot_dir
+
+    @classmethod
+    def load(cls, snapshot_dir):
+        with open(os.path.join(snapshot_dir, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        arrays = {
+            name: np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode="r")
+            for name in SNAPSHOT_ARRAYS
+        }
+        return cls(meta["project_id"], meta["commit_id"], arrays, meta["files"], meta["types"])
+
+    @staticmethod
+    def invalidate(project_id, root=None):
+        # Sends queries back to the graph backend until the next save
+        try:
+            os.remove(os.path.join(root or get_snapshot_dir(), str(project_id), "CURRENT"))
+        except FileNotFoundError:
+            pass
+
+    def node_id(self, position):
+        start, end = self.id_offsets[position], self.id_offsets[position + 1]
+        return self.id_bytes[start:end].tobytes().decode("utf-8")
+
+    def node_index(self, node_id):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = {
+                        self.node_id(position): position
+                        for position in range(self.node_count)
+                    }
+        return self._index.get(node_id)
+
+    def node(self, position):
+        return {
+            "id": self.node_id(position),
+            "project_id": self.project_id,
+            "file": self.files[self.file_index[position]],
+            "start": int(self.start[position]),
+            "end": int(self.end[position]),
+            "type": self.types[self.type_index[position]],
+        }
+
+    def _neighbors(self, frontier, direction):
+        parts = []
+        if direction in ("outbound", "both"):
+            parts.append(expand(self.out_offsets, self.out_targets, frontier))
+        if direction in ("inbound", "both"):
+            parts.append(expand(self.in_offsets, self.in_targets, frontier))
+        return np.unique(np.concatenate(parts))
+
+    def find_reachable(self, start_id, project_id=None, direction="outbound", max_depth=None, max_nodes=None):
+        # Same result as GraphBackend.find_reachable, with the compact node
+        # attributes only
+        default_depth, default_nodes = get_reachability_limits()
+        max_depth = default_depth if max_depth is None else max_depth
+        max_nodes = default_nodes if max_nodes is None else max_nodes
+        start = self.node_index(start_id)
+        if start is None:
+            return None
+        depths = np.full(self.node_count, -1, dtype=np.int32)
+        depths[start] = 0
+        frontier = np.array([start], dtype=np.int32)
+        reached = 1
+        depth = 0
+        truncated = False
+        while frontier.size:
+            if depth >= max_depth:
+                truncated = True
+                break
+            neighbors = self._neighbors(frontier, direction)
+            neighbors = neighbors[depths[neighbors] < 0]
+            if reached + neighbors.size > max_nodes:
+                neighbors = neighbors[:max_nodes - reached]
+                truncated = True
+            depths[neighbors] = depth + 1
+            reached += neighbors.size
+            frontier = neighbors
+            depth += 1
+            if truncated:
+                break
+        reachability = Reachability(self.node(start))
+        reachability.truncated = truncated
+        for position in np.flatnonzero(depths > 0):
+            reachability.add(self.node(position), int(depths[position]))
+        return reachability
+
+    def _positions(self, identifiers):
+        positions = [self.node_index(identifier) for identifier in identifiers]
+        return np.unique(np.array(
+            [position for position in positions if position is not None], dtype=np.int32
+        ))
+
+    def _visit(self, frontier, direction, max_depth):
+        # Mask of the nodes within max_depth hops of frontier, frontier included
+        visited = np.zeros(self.node_count, dtype=bool)
+        visited[frontier] = True
+        depth = 0
+        while frontier.size and depth < max_depth:
+            neighbors = self._neighbors(frontier, direction)
+            frontier = neighbors[~visited[neighbors]]
+            visited[frontier] = True
+            depth += 1
+        return visited
+
+    def find_reaching_endpoints(self, identifiers):
+        # Same result as GraphBackend.find_reaching_endpoints for the
+        # endpoints of the parse: the union of the posting lists of
+        # identifiers, without a traversal
+        ordinals = np.unique(
+            expand(self.reach_offsets, self.reach_endpoints, self._positions(identifiers))
+        )
+        return {self.node_id(position) for position in self.endpoint_nodes[ordinals]}
+
+
+class GraphSnapshotStore:
+    """
+    Snapshots loaded by this process, one per project, reloaded when the
+    project's CURRENT file points at a newer one.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, project_id):
+        if not is_graph_snapshot_enabled():
+            return None
+        project_dir = os.path.join(self.root or get_snapshot_dir(), str(project_id))
+        try:
+            with open(os.path.join(project_dir, "CURRENT")) as current_file:
+                name = current_file.read().strip()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._snapshots.get(project_id)
+            if cached is not None and cached[0] == name:
+                return cached[1]
+        try:
+            snapshot = GraphSnapshot.load(os.path.join(project_dir, name))
+        except (OSError, ValueError) as e:
+            logging.warning(f"project_id: {project_id}, could not load graph snapshot {name}: {e}")
+            return None
+        with self._lock:
+            self._snapshots[project_id] = (name, snapshot)
+        return snapshot
+
+
+class GraphSnapshotStoreSingleton:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = GraphSnapshotStore()
+        return cls._instance
+
+
+def get_call_graph(project_id):
+    # The project's snapshot when there is one, else the graph backend; both
+    # answer find_reachable
+    snapshot = GraphSnapshotStoreSingleton.get_instance().get(project_id)
+    if snapshot is not None:
+        return snapshot
+    return GraphSingleton.get_instance()
@@ -1,4 +1,5 @@
 import base64
+import io
 import logging
 import os
 
@@ -9,10 +10,13 @@ from github.Auth import AppAuth
 
 from server.models.repo_details import ProjectStatusEnum
 from server.projects import ProjectManager
+from server.utils.github_helper import FileContentCache, get_node_file_key
 from server.utils.user_service import get_user_id_by_username
 
 project_manager = ProjectManager()
 logger = logging.getLogger(__name__)
+# Blob contents never change, so entries only leave when the cache is full
+blob_cache = FileContentCache(ttl=float("inf"))
 
 from git import Repo, GitCommandError
 
@@ -44,31 +48,67 @@ class LocalGitService:
 
     @staticmethod
     def fetch_method_from_repo(node):
-        method_content = None
-        try:
-            project_id = node["project_id"]
-            project_manager = ProjectManager()
-            repo_details = project_manager.get_repo_and_branch_name(project_id=project_id)
-            repo_path = repo_details[0]
-            branch_name = repo_details[1]
-            repo_path_local = repo_details[2]
-            defaultUsername = os.getenv("defaultUsername")
-            if repo_path_local and repo_path_local.endswith(f'-{defaultUsername}'):
-                repo_path = repo_path_local
-
-            file_path = os.path.join(repo_path, node["id"].split(':')[0].lstrip('/'))
-            start_line = node["start"]
-            end_line = node["end"]
+        return LocalGitService.fetch_methods_from_repo([node])[0]
 
-            repo = Repo(repo_path)
-            repo.git.checkout(branch_name)
+    @staticmethod
+    def fetch_methods_from_repo(nodes):
+        # Code of every node, in order, None where it could not be read. Each
+        # project's branch is resolved once and every file read once.
+        keys = [get_node_file_key(node) for node in nodes]
+        sources = {}
+        paths_by_project = {}
+        for key in dict.fromkeys(keys):
+            if key is None:
+                continue
+            project_id, path = key
+            paths_by_project.setdefault(project_id, []).append(path)
+        for project_id, paths in paths_by_project.items():
+            try:
+                repo_details = project_manager.get_repo_and_branch_name(project_id=project_id)
+                repo_path = repo_details[0]
+                branch_name = repo_details[1]
+                repo_path_local = repo_details[2]
+                defaultUsername = os.getenv("defaultUsername")
+                if repo_path_local and repo_path_local.endswith(f'-{defaultUsername}'):
+                    repo_path = repo_path_local
+                files = LocalGitService.read_files(repo_path, branch_name, paths)
+            except Exception as e:
+                logger.error(f"An error occurred: {e}", exc_info=True)
+                files = {}
+            for path in paths:
+                sources[(project_id, path)] = files.get(path)
+        method_contents = []
+        for key, node in zip(keys, nodes):
+            if sources.get(key) is None:
+                method_contents.append(None)
+                continue
+            lines = io.StringIO(sources[key]).readlines()
+            method_contents.append(''.join(lines[node["start"] - 1:node["end"]]))
+        return method_contents
 
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-                method_lines = lines[start_line - 1:end_line]
-                method_content = ''.join(method_lines)
-                
-        except Exception as e:
-            logger.error(f"An error occurred: {e}", exc_info=True)
-        
-        return method_content
+    @staticmethod
+    def read_files(repo_path, branch_name, paths):
+        # {path: source} of the files at the head of branch_name, None for
+        # those it does not have. Blobs are read straight from the object
+        # store, so the working tree is never checked out or read, and
+        # decoded blobs are cached by their sha.
+        repo = Repo(repo_path)
+        try:
+            tree = repo.commit(branch_name).tree
+            files = {}
+            for path in paths:
+                try:
+                    blob = tree / path.lstrip('/').replace("\\", "/")
+                except KeyError:
+                    files[path] = None
+                    continue
+                source = blob_cache.get(blob.hexsha)
+                if source is None:
+                    # Same newline translation as reading the file in text mode
+                    source = blob.data_stream.read().decode('utf-8')
+                    source = source.replace("\r\n", "\n").replace("\r", "\n")
+                    blob_cache.put(blob.hexsha, source)
+                files[path] = source
+            return files
+        finally:
+            repo.close()
@@ -7,16 +7,23 @@ import requests
 from fastapi import HTTPException
 from git import Repo, GitCommandError
 from server.models.repo_details import ProjectStatusEnum
-from server.utils.graph_db_helper import Neo4jGraph
+from server.utils.graph_db_helper import GraphSingleton
 from server.endpoint_detection import EndpointManager
 from server.projects import ProjectManager
+from server.utils.parse_manifest import ParseManifest, is_incremental_parse_enabled
+from server.utils.streamed_sources import (
+    is_streaming_ingestion_enabled,
+    register_sources,
+    release_sources,
+)
 
 project_manager = ProjectManager()
-neo4j_graph = Neo4jGraph()
+graph_db = GraphSingleton.get_instance()
 
-def download_and_extract_tarball(owner, repo, branch, target_dir, auth, repo_details, user_id):
+def download_and_extract_tarball(owner, repo, branch, target_dir, auth, repo_details, user_id, ref=None):
+    # ref pins the download to a commit of the branch
     try:
-        tarball_url = repo_details.get_archive_link("tarball", branch)
+        tarball_url = repo_details.get_archive_link("tarball", ref or branch)
         response = requests.get(
             tarball_url,
             stream=True,
@@ -27,6 +34,10 @@ def download_and_extract_tarball(owner, repo, branch, target_dir, auth, repo_det
         logging.error(f"Error fetching tarball: {e}")
         return e
 
+    final_dir = os.path.join(target_dir, f'{repo}-{branch}-{user_id}')
+    if is_streaming_ingestion_enabled():
+        return stream_tarball_sources(response, final_dir)
+
     tarball_path = os.path.join(target_dir, f"{repo}-{branch}.tar.gz")
     try:
         with open(tarball_path, "wb") as f:
@@ -36,7 +47,6 @@ def download_and_extract_tarball(owner, repo, branch, target_dir, auth, repo_det
         logging.error(f"Error writing tarball to file: {e}")
         return e
 
-    final_dir = os.path.join(target_dir, f'{repo}-{branch}-{user_id}')
     try:
         with tarfile.open(tarball_path, "r:gz") as tar:
             for member in tar.getmembers():
@@ -65,6 +75,35 @@ def download_and_extract_tarball(owner, repo, branch, target_dir, auth, repo_det
 
     return final_dir
 
+def stream_tarball_sources(response, final_dir):
+    # Reads the tarball as it downloads and keeps only the Python sources (and
+    # the .gitignore files deciding which of them are parsed), in memory.
+    # Nothing but the empty project directory is written to disk; the parse
+    # reads the sources through get_sources(final_dir).
+    sources = {}
+    response.raw.decode_content = True
+    try:
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile() or not (
+                    member.name.endswith(".py")
+                    or os.path.basename(member.name) == ".gitignore"
+                ):
+                    continue
+                member_path = os.path.join(
+                    final_dir,
+                    os.path.relpath(member.name, start=member.name.split("/")[0]),
+                )
+                sources[member_path] = tar.extractfile(member).read()
+    except (tarfile.TarError, IOError, requests.exceptions.RequestException) as e:
+        logging.error(f"Error streaming tarball: {e}")
+        return e
+
+    os.makedirs(final_dir, exist_ok=True)
+    register_sources(final_dir, sources)
+    logging.info(f"Streamed {len(sources)} source files into {final_dir}")
+    return final_dir
+
 def setup_project_directory(owner, repo, branch, auth, repo_details, user_id, project_id=None):
     should_parse_repo = True
     default = False
@@ -72,64 +111,121 @@ def setup_project_directory(owner, repo, branch, auth, repo_details, user_id, pr
     if isinstance(repo_details, Repo):
         extracted_dir = repo_details.working_tree_dir
         try:
-            current_dir = os.getcwd()
-            os.chdir(extracted_dir)  # Change to the cloned repo directory
+            # git runs in the working tree of the repo; the process working
+            # directory is shared with concurrent jobs and requests
             repo_details.git.checkout(branch)
         except GitCommandError as e:
             logging.error(f"Error checking out branch: {e}")
             raise HTTPException(status_code=400, detail=f"Failed to checkout branch {branch}")
-        finally:
-            os.chdir(current_dir)  # Restore the original working directory
         branch_details = repo_details.head.commit
         latest_commit_sha = branch_details.hexsha
     else:
         if branch == repo_details.default_branch:
             default = True
-        extracted_dir = download_and_extract_tarball(
-            owner, repo, branch, os.getenv("PROJECT_PATH"), auth, repo_details, user_id
-        )
+        # Resolved first and downloaded at that sha, so the recorded commit is
+        # the one that was parsed even when the branch moves meanwhile
         branch_details = repo_details.get_branch(branch)
         latest_commit_sha = branch_details.commit.sha
+        extracted_dir = download_and_extract_tarball(
+            owner, repo, branch, os.getenv("PROJECT_PATH"), auth, repo_details, user_id,
+            latest_commit_sha,
+        )
 
-    momentum_dir = os.path.join(extracted_dir, ".momentum")
-    os.makedirs(momentum_dir, exist_ok=True)
-    with open(os.path.join(momentum_dir, "momentum.db"), "w") as fp:
-        pass
+    try:
+        momentum_dir = os.path.join(extracted_dir, ".momentum")
+        os.makedirs(momentum_dir, exist_ok=True)
+        with open(os.path.join(momentum_dir, "momentum.db"), "w") as fp:
+            pass
 
-    repo_metadata = extract_repository_metadata(repo_details)
-    repo_metadata['error_message'] = None
+        repo_metadata = extract_repository_metadata(repo_details)
+        repo_metadata['error_message'] = None
     
-    if(os.getenv("isDevelopmentMode") == "disabled"):
-        python_percentage = (repo_metadata["languages"]["breakdown"]["Python"] /
-                            repo_metadata["languages"]["total_bytes"] * 100) \
-            if "Python" in repo_metadata["languages"]["breakdown"] else 0
-        if python_percentage < 50:
-            repo_metadata['error_message'] = "Repository doesn't consist of a language currently supported."
-            should_parse_repo = False
-        else:
-            repo_metadata['error_message'] = None
-
-    project_id = project_manager.register_project(
-        extracted_dir,
-        f"{repo}-{branch}",
-        f"{owner}/{repo}",
-        branch,
-        user_id,
-        latest_commit_sha,
-        default,
-        json.dumps(repo_metadata).encode('utf-8'),
-        project_id
-    )
-    project_manager.update_project_status(project_id, ProjectStatusEnum.CREATED)
-    return extracted_dir, project_id, should_parse_repo
+        if(os.getenv("isDevelopmentMode") == "disabled"):
+            python_percentage = (repo_metadata["languages"]["breakdown"]["Python"] /
+                                repo_metadata["languages"]["total_bytes"] * 100) \
+                if "Python" in repo_metadata["languages"]["breakdown"] else 0
+            if python_percentage < 50:
+                repo_metadata['error_message'] = "Repository doesn't consist of a language currently supported."
+                should_parse_repo = False
+            else:
+                repo_metadata['error_message'] = None
+
+        project_id = project_manager.register_project(
+            extracted_dir,
+            f"{repo}-{branch}",
+            f"{owner}/{repo}",
+            branch,
+            user_id,
+            latest_commit_sha,
+            default,
+            json.dumps(repo_metadata).encode('utf-8'),
+            project_id
+        )
+        project_manager.update_project_status(project_id, ProjectStatusEnum.CREATED)
+    except Exception:
+        # The parse job that would release them never gets the directory
+        release_sources(extracted_dir)
+        raise
+    return extracted_dir, project_id, should_parse_repo, latest_commit_sha
 
 def reparse_cleanup(project_details, user_id):
     directory = project_details.directory
     project_id = project_details.id
-    EndpointManager(directory).delete_endpoints(project_id, user_id)
-    neo4j_graph.delete_nodes_by_project_id(project_id)
+    # With a manifest of the previous parse the graph and endpoints are kept
+    # and analyze_directory only replaces what changed
+    if not (is_incremental_parse_enabled() and ParseManifest.exists(project_id)):
+        EndpointManager(directory).delete_endpoints(project_id, user_id)
+        graph_db.delete_nodes_by_project_id(project_id)
     delete_folder(directory)
 
+def get_parse_repo_name(repo_details):
+    # The one name parse jobs of a repository are coordinated under: owner/repo
+    # as GitHub spells it, or the working tree of a local repository
+    if isinstance(repo_details, Repo):
+        return repo_details.working_tree_dir
+    return repo_details.full_name
+
+def get_head_commit(repo_details, branch):
+    # Sha at the head of the branch, or None when it cannot be resolved
+    try:
+        if isinstance(repo_details, Repo):
+            return repo_details.heads[branch].commit.hexsha
+        return repo_details.get_branch(branch).commit.sha
+    except Exception as e:
+        logging.warning(f"Could not resolve the head of {branch}: {e}")
+        return None
+
+def get_commit_diff(repo_details, base_commit, head_commit):
+    # Paths touched between the last parsed commit and the commit being
+    # parsed, or None when they cannot be listed and file contents have to be
+    # compared
+    if not base_commit or not head_commit:
+        return None
+    try:
+        if isinstance(repo_details, Repo):
+            output = repo_details.git.diff(
+                "--name-only", "--no-renames", base_commit, head_commit
+            )
+            files = output.splitlines()
+        else:
+            comparison = repo_details.compare(base_commit, head_commit)
+            changed = comparison.files
+            # The compare API stops listing files at 300
+            if len(changed) >= 300:
+                return None
+            files = []
+            for changed_file in changed:
+                files.append(changed_file.filename)
+                if changed_file.previous_filename:
+                    files.append(changed_file.previous_filename)
+    except Exception as e:
+        logging.warning(f"Could not diff {base_commit}..{head_commit}: {e}")
+        return None
+    return {
+        "base_commit": base_commit,
+        "files": ["/" + file_path for file_path in files if file_path],
+    }
+
 def extract_repository_metadata(repo):
     if isinstance(repo, Repo):
         metadata = extract_local_repo_metadata(repo)
@@ -234,6 +330,7 @@ def get_directory_size(path):
     return total_size
 
 def delete_folder(folder_path):
+    release_sources(folder_path)
     if(os.getenv("isDevelopmentMode") == "enabled"):
         logging.info("Not deleting local git repo to support knowledge graph")
         return
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from server.db.session import SessionManager
+from server.models.repo_details import ParseJobStatusEnum, ProjectStatusEnum
+from server.parse import analyze_directory
+from server.projects import ProjectManager
+from server.schemas import ParseJob
+from server.utils.parse_helper import (
+    delete_folder,
+    get_commit_diff,
+    reparse_cleanup,
+    setup_project_directory,
+)
+
+project_manager = ProjectManager()
+
+
+class UnsupportedRepositoryError(Exception):
+    pass
+
+
+def parse_project_job(owner, repo_name, branch_name, auth, repo, user_id):
+    # Returns the job that (re)parses a project, the steps /parse and the
+    # webhooks used to run inline. The project is looked up when the job
+    # starts, so a job queued behind another parse of the same branch reparses
+    # the project that one registered.
+    def run(tracker):
+        project_details = project_manager.get_project_from_db(
+            f"{repo_name}-{branch_name}", user_id
+        )
+        project_id = None
+        if project_details is not None:
+            project_id = project_details.id
+            tracker.set_project(project_id)
+            reparse_cleanup(project_details, user_id)
+        directory, project_id, should_parse_repo, commit_id = setup_project_directory(
+            owner, repo_name, branch_name, auth, repo, user_id, project_id
+        )
+        try:
+            tracker.set_project(project_id)
+            if not should_parse_repo:
+                raise UnsupportedRepositoryError(
+                    "Repository doesn't consist of a language currently supported."
+                )
+            commit_diff = None
+            if project_details is not None:
+                # Against the commit that was ingested, not the branch, which
+                # may have moved since
+                commit_diff = get_commit_diff(repo, project_details.commit_id, commit_id)
+            analyze_directory(
+                directory, user_id, project_id, commit_diff, tracker.progress
+            )
+        finally:
+            # Whatever the outcome; this also drops the sources of a streamed
+            # repository, which are held in memory
+            delete_folder(directory)
+        if project_details is None:
+            return "The project has been parsed successfully"
+        return "The project has been re-parsed successfully"
+
+    return run
+
+
+class ParseJobTracker:
+    """
+    Handed to a running job: records which project it parses and its
+    progress, and keeps the project status in step with the job.
+    """
+
+    # Progress within a phase is written at most this often
+    progress_interval = 1.0
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.project_id = None
+        self.phase = None
+        self._last_write = 0.0
+
+    def update(self, **kwargs):
+        with SessionManager() as db:
+            db.query(ParseJob).filter(ParseJob.id == self.job_id).update(kwargs)
+            db.commit()
+
+    def set_project(self, project_id):
+        self.project_id = project_id
+        self.update(project_id=project_id)
+        project_manager.update_project_status(project_id, ProjectStatusEnum.PARSING)
+
+    def progress(self, phase, processed=None, total=None):
+        now = time.monotonic()
+        if phase == self.phase and now - self._last_write < self.progress_interval:
+            return
+        values = {"files_processed": processed, "files_total": total}
+        if phase != self.phase:
+            self.phase = phase
+            values.update(phase=phase, phase_started_at=datetime.utcnow())
+        self._last_write = now
+        self.update(**values)
+
+
+class ParseFlight:
+    # A submitted job on its way through the coordinator. done resolves to the
+    # id of the job that did the work: its own, or the one that superseded it.
+    def __init__(self, job_id, key, head_sha, run, project_id):
+        self.job_id = job_id
+        self.key = key
+        self.head_sha = head_sha
+        self.run = run
+        self.project_id = project_id
+        self.future = None
+        self.done = Future()
+
+
+class ParseJobManager:
+    """
+    Runs parses as background jobs on a local thread pool, so requests and
+    webhooks return right away instead of holding the event loop for the
+    whole parse. Job state is kept in the parse_jobs table, so any worker
+    can answer status requests.
+
+    Parses of the same repository branch for the same user are single-flight:
+    at most one runs at a time and at most one waits behind it. The user is
+    part of the key because every user has a project, directory and graph of
+    their own for a branch, so parses for different users do not overlap.
+    Callers name the repository with get_parse_repo_name. A request for
+    the commit that is already running or waiting attaches to that job, and a
+    request for a newer commit replaces the job still waiting, which is
+    marked superseded.
+    """
+
+    def __init__(self, max_workers=None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("PARSE_JOB_WORKERS", "2")),
+            thread_name_prefix="parse-job",
+        )
+        # Re-entrant, cancelling a flight runs its done callback in place
+        self._lock = threading.RLock()
+        self._flights = {}
+        self._running = {}
+        self._pending = {}
+
+    def submit(self, run, user_id, repo_name, branch_name, project_id=None, head_sha=None):
+        # run is a function taking the job's ParseJobTracker; it
+        # returns a message for the finished job, or raises
+        # UnsupportedRepositoryError when the repository cannot be parsed.
+        # Returns the id of the job that will parse head_sha, which is an
+        # existing one when that commit is already being parsed.
+        key = (user_id, repo_name, branch_name)
+        with self._lock:
+            for flight in (self._pending.get(key), self._running.get(key)):
+                if flight is not None and head_sha and flight.head_sha == head_sha:
+                    logging.info(
+                        f"Attached parse of {repo_name}@{branch_name} ({head_sha}) "
+                        f"to job {flight.job_id}"
+                    )
+                    return flight.job_id
+
+            job_id = str(uuid.uuid4())
+            with SessionManager() as db:
+                db.add(ParseJob(
+                    id=job_id,
+                    project_id=project_id,
+                    user_id=user_id,
+                    repo_name=repo_name,
+                    branch_name=branch_name,
+                    head_sha=head_sha,
+                    status=ParseJobStatusEnum.QUEUED.value,
+                ))
+                db.commit()
+            flight = ParseFlight(job_id, key, head_sha, run, project_id)
+            self._flights[job_id] = flight
+            flight.done.add_done_callback(lambda _: self._forget(job_id))
+
+            waiting = self._pending.pop(key, None)
+            if waiting is not None:
+                self._supersede(waiting, flight)
+            running = self._running.get(key)
+            if running is not None and running.future.cancel():
+                # Still queued behind other branches' jobs, never started
+                self._supersede(running, flight)
+
+            if key in self._running:
+                self._pending[key] = flight
+            else:
+                self._start(flight)
+        logging.info(f"Queued parse job {job_id} for {repo_name}@{branch_name}")
+        return job_id
+
+    def _start(self, flight):
+        self._running[flight.key] = flight
+        flight.future = self.executor.submit(self._run, flight)
+        flight.future.add_done_callback(lambda future: self._flight_done(flight, future))
+
+    def _flight_done(self, flight, future):
+        with self._lock:
+            if self._running.get(flight.key) is flight:
+                del self._running[flight.key]
+                waiting = self._pending.pop(flight.key, None)
+                if waiting is not None:
+                    self._start(waiting)
+        if not future.cancelled():
+            flight.done.set_result(flight.job_id)
+
+    def _supersede(self, flight, successor):
+        ParseJobTracker(flight.job_id).update(
+            status=ParseJobStatusEnum.SUPERSEDED.value,
+            message=f"Superseded by parse job {successor.job_id}",
+            superseded_by=successor.job_id,
+            finished_at=datetime.utcnow(),
+        )
+        successor.done.add_done_callback(
+            lambda done: flight.done.set_result(done.result())
+        )
+        logging.info(f"Parse job {flight.job_id} superseded by {successor.job_id}")
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._flights.pop(job_id, None)
+
+    async def wait(self, job_id):
+        # Waits for a job submitted by this process without blocking the
+        # event loop. Returns the job that did the work, which is the
+        # superseding one for a superseded job.
+        while True:
+            with self._lock:
+                flight = self._flights.get(job_id)
+            if flight is not None:
+                job_id = await asyncio.wrap_future(flight.done)
+            job = self.get_job(job_id)
+            if job is None or job["status"] != ParseJobStatusEnum.SUPERSEDED.value:
+                return job
+            job_id = job["superseded_by"]
+
+    def _run(self, flight):
+        tracker = ParseJobTracker(flight.job_id)
+        tracker.update(
+            status=ParseJobStatusEnum.RUNNING.value, started_at=datetime.utcnow()
+        )
+        if flight.project_id is not None:
+            tracker.set_project(flight.project_id)
+        try:
+            message = flight.run(tracker)
+        except UnsupportedRepositoryError as e:
+            self._finish(tracker, ParseJobStatusEnum.FAILED, error=str(e))
+        except Exception as e:
+            logging.error(f"Parse job {flight.job_id} failed: {traceback.format_exc()}")
+            self._finish(tracker, ParseJobStatusEnum.FAILED, error=str(e))
+        else:
+            self._finish(tracker, ParseJobStatusEnum.SUCCEEDED, message=message)
+
+    def _finish(self, tracker, status, message=None, error=None):
+        tracker.update(
+            status=status.value,
+            message=message,
+            error=error,
+            finished_at=datetime.utcnow(),
+        )
+        if tracker.project_id is not None:
+            project_manager.update_project_status(
+                tracker.project_id,
+                ProjectStatusEnum.READY
+                if status == ParseJobStatusEnum.SUCCEEDED
+                else ProjectStatusEnum.ERROR,
+            )
+
+    def get_job(self, job_id, user_id=None):
+        with SessionManager() as db:
+            query = db.query(ParseJob).filter(ParseJob.id == job_id)
+            if user_id is not None:
+                query = query.filter(ParseJob.user_id == user_id)
+            job = query.first()
+            return job_to_dict(job) if job else None
+
+
+def job_to_dict(job):
+    eta = None
+    if (
+        job.status == ParseJobStatusEnum.RUNNING.value
+        and job.files_processed
+        and job.files_total
+        and job.phase_started_at
+    ):
+        # Linear estimate for the remaining files of the current phase
+        elapsed = (datetime.utcnow() - job.phase_started_at).total_seconds()
+        remaining = job.files_total - job.files_processed
+        eta = round(elapsed / job.files_processed * remaining, 1)
+    return {
+        "job_id": job.id,
+        "project_id": job.project_id,
+        "repo_name": job.repo_name,
+        "branch_name": job.branch_name,
+        "head_sha": job.head_sha,
+        "status": job.status,
+        "superseded_by": job.superseded_by,
+        "phase": job.phase,
+        "files_processed": job.files_processed,
+        "files_total": job.files_total,
+        "eta_seconds": eta,
+        "message": job.message,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class ParseJobManagerSingleton:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ParseJobManager()
+        return cls._instance
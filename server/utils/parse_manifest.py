@@ -0,0 +1,159 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+from server.utils.file_records import FileRecord
+
+
+def is_incremental_parse_enabled():
+    return os.getenv("INCREMENTAL_PARSE", "enabled") != "disabled"
+
+
+def get_manifest_dir():
+    return os.getenv("PARSE_MANIFEST_PATH") or os.path.join(
+        os.getenv("PROJECT_PATH", "projects"), ".manifests"
+    )
+
+
+def file_digest(file_path, sources=None):
+    if sources is not None and file_path in sources:
+        return hashlib.sha256(sources[file_path]).hexdigest()
+    with open(file_path, "rb") as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+
+class ParseManifest:
+    """
+    Record of the last successful parse of a project: the commit, the
+    extraction result and content digest of every file, and the CALLS and
+    EXTENDS edges that were written, so the next parse only redoes what
+    changed.
+    """
+
+    def __init__(
+        self, project_id, directory, commit_id=None, files=None, edges=None,
+        extends=None, extraction_version=None
+    ):
+        self.project_id = project_id
+        self.directory = directory
+        self.commit_id = commit_id
+        self.extraction_version = extraction_version
+        # relative path -> {"digest": ..., "record": FileRecord}
+        self.files = files or {}
+        self.edges = edges or []
+        self.extends = extends or []
+
+    @staticmethod
+    def get_path(project_id):
+        return os.path.join(get_manifest_dir(), f"{project_id}.json.gz")
+
+    @staticmethod
+    def exists(project_id):
+        return os.path.exists(ParseManifest.get_path(project_id))
+
+    @staticmethod
+    def delete(project_id):
+        try:
+            os.remove(ParseManifest.get_path(project_id))
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def load(cls, project_id, extraction_version=None):
+        path = cls.get_path(project_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError) as e:
+            logging.error(f"project_id: {project_id}, unreadable parse manifest: {e}")
+            return None
+        if data.get("extraction_version") != extraction_version:
+            # File results of another extraction version cannot be reused
+            logging.info(f"project_id: {project_id}, parse manifest is outdated")
+            return None
+        files = {
+            relative_path: {
+                "digest": entry["digest"],
+                "record": FileRecord.from_result(relative_path, entry["result"]),
+            }
+            for relative_path, entry in data["files"].items()
+        }
+        return cls(
+            project_id,
+            data["directory"],
+            data.get("commit_id"),
+            files,
+            [tuple(edge) for edge in data["edges"]],
+            [tuple(edge) for edge in data["extends"]],
+            extraction_version,
+        )
+
+    def save(self):
+        path = self.get_path(self.project_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            "directory": self.directory,
+            "commit_id": self.commit_id,
+            "extraction_version": self.extraction_version,
+            "files": {
+                relative_path: {
+                    "digest": entry["digest"],
+                    "result": entry["record"].to_result(relative_path),
+                }
+                for relative_path, entry in self.files.items()
+            },
+            "edges": [list(edge) for edge in self.edges],
+            "extends": [list(edge) for edge in self.extends],
+        }
+        # Written next to the target and renamed so a crash never leaves a
+        # half-written manifest behind
+        temp_path = f"{path}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as manifest_file:
+            json.dump(data, manifest_file)
+        os.replace(temp_path, path)
+
+    def diff_files(self, directory, file_paths, commit_diff=None, sources=None):
+        """
+        Returns the files that have to be extracted again and the relative
+        paths of files that no longer exist. When commit_diff lists the paths
+        touched since the commit this manifest was taken at, only those are
+        considered modified; otherwise file contents are compared.
+        """
+        present = {file_path.replace(directory, ""): file_path for file_path in file_paths}
+        deleted = set(self.files) - set(present)
+        touched = None
+        if commit_diff and commit_diff.get("base_commit") == self.commit_id:
+            touched = set(commit_diff["files"])
+        changed = set()
+        for relative_path, file_path in present.items():
+            entry = self.files.get(relative_path)
+            if entry is None:
+                changed.add(file_path)
+            elif touched is not None:
+                if relative_path in touched:
+                    changed.add(file_path)
+            elif entry["digest"] != file_digest(file_path, sources):
+                changed.add(file_path)
+        return changed, deleted
+
+
+class EdgeRecorder:
+    """
+    Stands in for the graph writer while calls and class hierarchies are
+    resolved, so the resulting edges can be compared with the previous parse
+    before anything is written.
+    """
+
+    def __init__(self):
+        self.edges = {}
+        self.extends = {}
+
+    def connect_nodes(self, parent_function, called_function_identifier, relationship_properties):
+        self.edges[(parent_function, called_function_identifier)] = relationship_properties
+
+    def add_extends_relationship(self, base_class_id, derived_class_id):
+        self.extends[(base_class_id, derived_class_id)] = None
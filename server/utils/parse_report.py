@@ -0,0 +1,56 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+
+class ParseReport:
+    """
+    Collects per-phase timings and counters for a single parse run.
+    on_progress, when given, is called with (phase, processed, total) as
+    phases start and files are processed.
+    """
+
+    def __init__(self, project_id, on_progress=None):
+        self.project_id = project_id
+        self.timings = {}
+        self.counters = {}
+        self.metrics = {}
+        self.on_progress = on_progress
+        self.current_phase = None
+
+    @contextmanager
+    def phase(self, name):
+        self.current_phase = name
+        self.progress()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def progress(self, processed=None, total=None):
+        if self.on_progress is not None:
+            self.on_progress(self.current_phase, processed, total)
+
+    def increment(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def record(self, name, value):
+        self.metrics[name] = value
+
+    def as_dict(self):
+        return {
+            "timings": {
+                name: round(elapsed, 3) for name, elapsed in self.timings.items()
+            },
+            "total": round(sum(self.timings.values()), 3),
+            "counters": dict(self.counters),
+            "metrics": dict(self.metrics),
+        }
+
+    def log(self):
+        logging.info(
+            f"project_id: {self.project_id}, parse report: {json.dumps(self.as_dict())}"
+        )
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import threading
+import zlib
+
+
+def is_snippet_store_enabled():
+    return os.getenv("SNIPPET_STORE", "enabled") != "disabled"
+
+
+class SnippetStore:
+    """
+    Local copy of the source files of parsed commits, so code retrieval is
+    a read and a line slice instead of a GitHub download. Contents are
+    addressed by the digest of the file, stored once and shared by every
+    repository, branch and commit that contains them. Each (repository,
+    commit) maps its file paths to digests, and the commit last parsed for
+    every project is recorded, so a node, which only carries its project
+    id, resolves without a Postgres lookup. Commits that no project points
+    at any more are dropped along with contents nothing refers to.
+    """
+
+    # SQLite limits the number of bound parameters per statement
+    _chunk_size = 500
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SNIPPET_STORE_PATH") or os.path.join(
+            os.getenv("PROJECT_PATH", "projects"), ".cache", "snippets.db"
+        )
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS contents ("
+                "digest TEXT PRIMARY KEY, content BLOB NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "repo_name TEXT NOT NULL, commit_id TEXT NOT NULL, "
+                "path TEXT NOT NULL, digest TEXT NOT NULL, "
+                "PRIMARY KEY (repo_name, commit_id, path))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS files_digest ON files (digest)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS projects ("
+                "project_id INTEGER PRIMARY KEY, repo_name TEXT NOT NULL, "
+                "commit_id TEXT NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def missing(self, digests):
+        # The digests whose contents are not stored yet
+        digests = list(dict.fromkeys(digests))
+        stored = set()
+        with self._lock:
+            connection = self._connect()
+            for offset in range(0, len(digests), self._chunk_size):
+                chunk = digests[offset:offset + self._chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                stored.update(
+                    digest for digest, in connection.execute(
+                        f"SELECT digest FROM contents WHERE digest IN ({placeholders})",
+                        chunk,
+                    )
+                )
+        return set(digests) - stored
+
+    def put_commit(self, project_id, repo_name, commit_id, files, contents):
+        # files: {path: digest} of every file of the commit; contents:
+        # {digest: source} for the digests that were missing. Points the
+        # project at the commit.
+        repo_name = repo_name or ""
+        commit_id = commit_id or ""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO contents (digest, content) VALUES (?, ?)",
+                    [
+                        (digest, zlib.compress(source.encode("utf-8")))
+                        for digest, source in contents.items()
+                    ],
+                )
+                connection.execute(
+                    "DELETE FROM files WHERE repo_name = ? AND commit_id = ?",
+                    (repo_name, commit_id),
+                )
+                connection.executemany(
+                    "INSERT INTO files (repo_name, commit_id, path, digest) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (repo_name, commit_id, path, digest)
+                        for path, digest in files.items()
+                    ],
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO projects (project_id, repo_name, commit_id) "
+                    "VALUES (?, ?, ?)",
+                    (project_id, repo_name, commit_id),
+                )
+                connection.execute(
+                    "DELETE FROM files WHERE NOT EXISTS ("
+                    "SELECT 1 FROM projects p WHERE p.repo_name = files.repo_name "
+                    "AND p.commit_id = files.commit_id)"
+                )
+                connection.execute(
+                    "DELETE FROM contents WHERE NOT EXISTS ("
+                    "SELECT 1 FROM files f WHERE f.digest = contents.digest)"
+                )
+
+    def read_file(self, project_id, path):
+        # Source of path at the project's last parsed commit, or None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT c.content FROM projects p "
+                "JOIN files f ON f.repo_name = p.repo_name AND f.commit_id = p.commit_id "
+                "JOIN contents c ON c.digest = f.digest "
+                "WHERE p.project_id = ? AND f.path = ?",
+                (project_id, path),
+            ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+
+class SnippetStoreSingleton:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = SnippetStore()
+        return cls._instance
@@ -0,0 +1,384 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from server.utils.graph_backend import (
+    GraphBackend,
+    get_reachability_limits,
+    serialize_properties,
+)
+
+# Direct callers of :identifier, the neighbors query traverse runs
+INBOUND_NEIGHBORS_QUERY = (
+    "SELECT n.body FROM edges e "
+    "JOIN nodes n ON n.project_id = e.project_id AND n.id = e.source "
+    "WHERE e.project_id = :project_id AND e.type = 'CALLS' AND e.target = :identifier"
+)
+
+
+class SqliteGraph(GraphBackend):
+    """
+    Graph backend on an embedded SQLite database, for local and development
+    setups and benchmarks that should not depend on a graph server. Nodes
+    keep their properties as a JSON body, merged on every upsert like SET +=
+    in Cypher; CALLS and EXTENDS edges share one table. All projects live in
+    one database file, since projects are looked up by id alone and their
+    directories are deleted on every re-parse.
+    """
+
+    # SQLite limits the number of bound parameters per statement
+    _chunk_size = 500
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("GRAPH_SQLITE_PATH") or os.path.join(
+            os.getenv("PROJECT_PATH", "projects"), ".graph", "graph.db"
+        )
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS nodes ("
+                "project_id INTEGER NOT NULL, id TEXT NOT NULL, body TEXT NOT NULL, "
+                "PRIMARY KEY (project_id, id))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS nodes_class_name "
+                "ON nodes (project_id, json_extract(body, '$.class_name'))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS edges ("
+                "project_id INTEGER NOT NULL, type TEXT NOT NULL, "
+                "source TEXT NOT NULL, target TEXT NOT NULL, properties TEXT, "
+                "PRIMARY KEY (project_id, type, source, target))"
+            )
+            # The primary key serves outbound lookups, this one inbound ones
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS edges_target "
+                "ON edges (project_id, type, target, source)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _execute_write(self, statements):
+        # statements: (sql, parameter rows) run in one transaction
+        with self._lock:
+            connection = self._connect()
+            try:
+                for sql, rows in statements:
+                    connection.executemany(sql, rows)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def _node_body(function_identifier, project_id, properties):
+        properties = serialize_properties(properties)
+        properties["id"] = function_identifier
+        properties["project_id"] = project_id
+        return json.dumps(properties)
+
+    @staticmethod
+    def _upsert_node_sql():
+        # json_patch merges the new properties in and drops those set to None
+        return (
+            "INSERT INTO nodes (project_id, id, body) VALUES (?, ?, json_patch('{}', ?)) "
+            "ON CONFLICT (project_id, id) DO UPDATE SET body = json_patch(body, excluded.body)"
+        )
+
+    @staticmethod
+    def _connect_nodes_sql():
+        # Like MATCH in Cypher, edges are only created between existing nodes
+        return (
+            "INSERT INTO edges (project_id, type, source, target, properties) "
+            "SELECT ?1, ?2, ?3, ?4, ?5 WHERE "
+            "EXISTS (SELECT 1 FROM nodes WHERE project_id = ?1 AND id = ?3) AND "
+            "EXISTS (SELECT 1 FROM nodes WHERE project_id = ?1 AND id = ?4) "
+            "ON CONFLICT (project_id, type, source, target) DO UPDATE SET "
+            "properties = json_patch(COALESCE(properties, '{}'), excluded.properties)"
+        )
+
+    def write_batch(self, kind, rows, project_id):
+        if kind == "nodes":
+            statements = [(self._upsert_node_sql(), [
+                (project_id, row["id"], self._node_body(row["id"], project_id, row["properties"]))
+                for row in rows
+            ])]
+        elif kind == "updated_nodes":
+            statements = [(
+                "UPDATE nodes SET body = json_patch(body, ?) WHERE project_id = ? AND id = ?",
+                [
+                    (json.dumps(serialize_properties(row["properties"])), project_id, row["id"])
+                    for row in rows
+                ],
+            )]
+        elif kind == "edges":
+            statements = [(self._connect_nodes_sql(), [
+                (project_id, "CALLS", row["source"], row["target"], json.dumps(row["properties"] or {}))
+                for row in rows
+            ])]
+        elif kind == "extends":
+            statements = [(self._connect_nodes_sql(), [
+                (project_id, "EXTENDS", row["derived"], row["base"], "{}") for row in rows
+            ])]
+        elif kind == "deleted_nodes":
+            ids = [(project_id, row["id"]) for row in rows]
+            # One delete per end, so each is served by its index instead of
+            # scanning the edges table
+            statements = [
+                (
+                    "DELETE FROM edges WHERE project_id = ? "
+                    "AND type IN ('CALLS', 'EXTENDS') AND source = ?",
+                    ids,
+                ),
+                (
+                    "DELETE FROM edges WHERE project_id = ? "
+                    "AND type IN ('CALLS', 'EXTENDS') AND target = ?",
+                    ids,
+                ),
+                (
+                    "DELETE FROM nodes WHERE project_id = ? AND id = ?",
+                    ids,
+                ),
+            ]
+        elif kind == "removed_edges":
+            statements = [(
+                "DELETE FROM edges WHERE project_id = ? AND type = 'CALLS' AND source = ? AND target = ?",
+                [(project_id, row["source"], row["target"]) for row in rows],
+            )]
+        elif kind == "removed_extends":
+            statements = [(
+                "DELETE FROM edges WHERE project_id = ? AND type = 'EXTENDS' AND source = ? AND target = ?",
+                [(project_id, row["derived"], row["base"]) for row in rows],
+            )]
+        else:
+            raise ValueError(f"Unknown graph write: {kind}")
+        self._execute_write(statements)
+
+    def upsert_node(self, function_identifier, properties, project_id):
+        properties['project_id'] = project_id
+        self._execute_write([(self._upsert_node_sql(), [
+            (project_id, function_identifier, self._node_body(function_identifier, project_id, properties))
+        ])])
+
+    def connect_nodes(self, parent_function, called_function_identifier, project_id, relationship_properties):
+        self._execute_write([(self._connect_nodes_sql(), [(
+            project_id, "CALLS", parent_function, called_function_identifier,
+            json.dumps(relationship_properties or {}),
+        )])])
+
+    def add_extends_relationship(self, base_class_id, derived_class_id, project_id):
+        self._execute_write([(self._connect_nodes_sql(), [
+            (project_id, "EXTENDS", derived_class_id, base_class_id, "{}")
+        ])])
+
+    def get_node_by_id(self, node_id, project_id):
+        rows = self._query(
+            "SELECT body FROM nodes WHERE project_id = ? AND id = ?", (project_id, node_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_node_file_property(self, identifier, project_id):
+        node = self.get_node_by_id(identifier, project_id)
+        return node.get("file") if node else None
+
+    def fetch_first_order_neighbors(self, node_id, project_id):
+        rows = self._query(
+            "SELECT n.body FROM edges e "
+            "JOIN nodes n ON n.project_id = e.project_id AND n.id = e.target "
+            "WHERE e.project_id = ? AND e.type = 'CALLS' AND e.source = ?",
+            (project_id, node_id),
+        )
+        return [json.loads(body) for body, in rows]
+
+    def expand_calls(self, node_ids, project_id, direction):
+        queries = []
+        if direction in ("outbound", "both"):
+            queries.append(("source", "target"))
+        if direction in ("inbound", "both"):
+            queries.append(("target", "source"))
+        expanded = []
+        for offset in range(0, len(node_ids), self._chunk_size):
+            chunk = node_ids[offset:offset + self._chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            for near, far in queries:
+                rows = self._query(
+                    f"SELECT e.{near}, n.body FROM edges e "
+                    f"JOIN nodes n ON n.project_id = e.project_id AND n.id = e.{far} "
+                    f"WHERE e.project_id = ? AND e.type = 'CALLS' AND e.{near} IN ({placeholders})",
+                    [project_id, *chunk],
+                )
+                expanded.extend((node_id, json.loads(body)) for node_id, body in rows)
+        return expanded
+
+    def find_reaching_endpoints(self, identifiers, endpoint_ids, project_id, max_depth=None):
+        if max_depth is None:
+            max_depth = get_reachability_limits()[0]
+        # The identifiers go in as one JSON array, past the parameter limit
+        rows = self._query(
+            "WITH RECURSIVE callers(id, depth) AS ("
+            "SELECT id, 0 FROM nodes WHERE project_id = :project_id "
+            "AND id IN (SELECT value FROM json_each(:identifiers)) "
+            "UNION "
+            "SELECT e.source, c.depth + 1 FROM edges e JOIN callers c ON e.target = c.id "
+            "WHERE e.project_id = :project_id AND e.type = 'CALLS' AND c.depth < :max_depth) "
+            "SELECT DISTINCT id FROM callers "
+            "WHERE id IN (SELECT value FROM json_each(:endpoint_ids))",
+            {
+                "identifiers": json.dumps(list(identifiers)),
+                "endpoint_ids": json.dumps(list(endpoint_ids)),
+                "project_id": project_id,
+                "max_depth": max_depth,
+            },
+        )
+        return {node_id for node_id, in rows}
+
+    def get_subgraph(self, node_id, project_id, max_depth):
+        # UNION drops repeated (id, depth) pairs and the depth bound ends
+        # cycles
+        rows = self._query(
+            "WITH RECURSIVE reachable(id, depth) AS ("
+            "SELECT id, 0 FROM nodes WHERE project_id = :project_id AND id = :node_id "
+            "UNION "
+            "SELECT e.target, r.depth + 1 FROM edges e JOIN reachable r ON e.source = r.id "
+            "WHERE e.project_id = :project_id AND e.type = 'CALLS' AND r.depth < :max_depth) "
+            "SELECT n.id, n.body, ("
+            "SELECT json_group_array(e.target) FROM edges e "
+            "WHERE e.project_id = n.project_id AND e.type = 'CALLS' AND e.source = n.id) "
+            "FROM nodes n WHERE n.project_id = :project_id "
+            "AND n.id IN (SELECT id FROM reachable)",
+            {"node_id": node_id, "project_id": project_id, "max_depth": max_depth},
+        )
+        nodes = {}
+        callees = {}
+        for subgraph_node_id, body, targets in rows:
+            nodes[subgraph_node_id] = json.loads(body)
+            callees[subgraph_node_id] = json.loads(targets)
+        return nodes, callees
+
+    def export_call_graph(self, project_id):
+        rows = self._query(
+            "SELECT id, json_extract(body, '$.file'), json_extract(body, '$.start'), "
+            "json_extract(body, '$.end'), json_extract(body, '$.type') "
+            "FROM nodes WHERE project_id = ?",
+            (project_id,),
+        )
+        nodes = [
+            {"id": node_id, "file": file, "start": start, "end": end, "type": node_type}
+            for node_id, file, start, end, node_type in rows
+        ]
+        edges = self._query(
+            "SELECT source, target FROM edges WHERE project_id = ? AND type = 'CALLS'",
+            (project_id,),
+        )
+        return nodes, edges
+
+    def find_inbound_neighbors(self, with_bodies=False):
+        return INBOUND_NEIGHBORS_QUERY
+
+    def traverse(self, identifier, project_id, neighbors_fn):
+        start = self.get_node_by_id(identifier, project_id)
+        if start is None:
+            return []
+        rows = self._query(
+            neighbors_fn(with_bodies=False),
+            {"identifier": identifier, "project_id": project_id},
+        )
+        return [start] + [json.loads(body) for body, in rows]
+
+    def _get_hierarchy_nodes(self, class_name, project_id):
+        # Classes named class_name and their bases, breadth first
+        rows = self._query(
+            "SELECT id FROM nodes WHERE project_id = ? "
+            "AND json_extract(body, '$.class_name') = ?",
+            (project_id, class_name),
+        )
+        level = [node_id for node_id, in rows]
+        seen = set(level)
+        ordered = list(level)
+        while level:
+            next_level = []
+            for offset in range(0, len(level), self._chunk_size):
+                chunk = level[offset:offset + self._chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                for base_id, in self._query(
+                    "SELECT target FROM edges WHERE project_id = ? AND type = 'EXTENDS' "
+                    f"AND source IN ({placeholders})",
+                    [project_id, *chunk],
+                ):
+                    if base_id not in seen:
+                        seen.add(base_id)
+                        next_level.append(base_id)
+            ordered.extend(next_level)
+            level = next_level
+        nodes = []
+        for node_id in ordered:
+            node = self.get_node_by_id(node_id, project_id)
+            if node is not None:
+                nodes.append(node)
+        return nodes
+
+    def get_class_hierarchy(self, class_name, project_id):
+        try:
+            return [
+                {
+                    "filepath": node.get("file"),
+                    "class_name": node.get("class_name"),
+                    "start": node.get("start"),
+                    "end": node.get("end"),
+                    "id": node.get("id"),
+                    "project_id": node.get("project_id"),
+                }
+                for node in self._get_hierarchy_nodes(class_name, project_id)
+            ]
+        except sqlite3.Error as e:
+            logging.error(f"SQLite error in fetching class hierarchy for extends relation: {e}")
+            return []
+
+    def get_multiple_class_hierarchies(self, classnames, project_id):
+        try:
+            class_hierarchies = []
+            seen_nodes = set()
+            for root_classname in sorted(set(classnames)):
+                for node in self._get_hierarchy_nodes(root_classname, project_id):
+                    if node["id"] in seen_nodes:
+                        continue
+                    seen_nodes.add(node["id"])
+                    class_hierarchies.append({
+                        "filepath": node.get("file"),
+                        "classname": node.get("class_name"),
+                        "start": node.get("start"),
+                        "end": node.get("end"),
+                        "id": node.get("id"),
+                        "root_classname": root_classname,
+                        "project_id": node.get("project_id"),
+                    })
+            return class_hierarchies
+        except sqlite3.Error as e:
+            logging.error(f"SQLite error in fetching class hierarchy for extends relation: {e}")
+            return []
+
+    def delete_nodes_by_project_id(self, project_id):
+        self._execute_write([
+            ("DELETE FROM edges WHERE project_id = ?", [(project_id,)]),
+            ("DELETE FROM nodes WHERE project_id = ?", [(project_id,)]),
+        ])
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,44 @@
+import os
+import threading
+
+# project directory -> {absolute file path: file contents (bytes)} for
+# repositories ingested straight from the GitHub tarball stream, whose
+# sources never touch the disk
+_sources = {}
+_lock = threading.Lock()
+
+
+def is_streaming_ingestion_enabled():
+    # Development mode keeps the working copy on disk for the knowledge graph
+    return (
+        os.getenv("STREAMING_INGESTION", "enabled") != "disabled"
+        and os.getenv("isDevelopmentMode") != "enabled"
+    )
+
+
+def register_sources(directory, sources):
+    with _lock:
+        _sources[directory] = sources
+
+
+def get_sources(directory):
+    with _lock:
+        return _sources.get(directory)
+
+
+def release_sources(directory):
+    with _lock:
+        _sources.pop(directory, None)
+
+
+def read_source(file_path, sources=None):
+    if sources is not None and file_path in sources:
+        # Same newline translation as reading the file in text mode
+        return (
+            sources[file_path]
+            .decode("utf-8")
+            .replace("\r\n", "\n")
+            .replace("\r", "\n")
+        )
+    with open(file_path, "r") as source_file:
+        return source_file.read()
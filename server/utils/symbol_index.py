@@ -0,0 +1,156 @@
+class SymbolIndex:
+    """
+    Lookup tables built once per parse from the file index, used to resolve
+    call sites without walking the repository for every unresolved name.
+    """
+
+    def __init__(self, file_index):
+        self.file_index = file_index
+        # name -> files (in parse order) defining a class, instance or
+        # top-level function with that name
+        self.definitions = {}
+        self._imports = {}
+        self._resolved = {}
+        for file_path, entry in file_index.items():
+            names = set(entry.class_definition)
+            names.update(entry.class_instances.keys())
+            names.update(key.split(":")[-1] for key in entry.functions)
+            for name in names:
+                self.definitions.setdefault(name, []).append(file_path)
+
+    def find_import(self, file_path, name):
+        key = (file_path, name)
+        if key not in self._imports:
+            module_value = None
+            for module, alias in self.file_index[file_path].imports:
+                if alias == name or name in module:
+                    module_value = module
+                    break
+            self._imports[key] = module_value
+        return self._imports[key]
+
+    @staticmethod
+    def split_module(module_value, file_path):
+        if module_value.startswith("."):
+            # Count the number of leading dots to determine relative depth
+            num_up_dirs = len(module_value) - len(module_value.lstrip("."))
+            file_path_parts = file_path.split("/")[:-1]
+            base_path_parts = (
+                file_path_parts[-num_up_dirs:]
+                if num_up_dirs <= len(file_path_parts)
+                else []
+            )
+            module_parts = module_value.lstrip(".").split(".")
+            potential_module = "/".join(base_path_parts + module_parts[:-1])
+        else:
+            module_parts = module_value.split(".")
+            potential_module = (
+                "/".join(module_parts[:-1]) if len(module_parts) > 1 else ""
+            )
+        return potential_module, module_parts
+
+    def candidates(self, potential_module, name):
+        for candidate_path in self.definitions.get(name, []):
+            if potential_module in candidate_path:
+                yield candidate_path
+
+    def resolve_function(self, name, file_path):
+        return self._memoized("function", name, file_path)
+
+    def resolve_class(self, name, file_path):
+        return self._memoized("class", name, file_path)
+
+    def _memoized(self, kind, name, file_path):
+        key = (kind, file_path, name)
+        if key not in self._resolved:
+            if kind == "function":
+                self._resolved[key] = self._resolve_function(name, file_path)
+            else:
+                self._resolved[key] = self._resolve_class(name, file_path)
+        return self._resolved[key]
+
+    @staticmethod
+    def _split_name(name):
+        if len(name.split(".")) >= 2:
+            return name.split(".")[0], ".".join(name.split(".")[1:])
+        elif "." not in name:
+            return name, name
+        return None, None
+
+    def _resolve_function(self, name, file_path):
+        instance, function = self._split_name(name)
+        if instance is None:
+            return file_path, None
+        entry = self.file_index[file_path]
+        if instance in entry.class_instances:
+            class_context = entry.class_instances[instance]
+            if class_context in entry.class_definition:
+                return file_path, class_context + "." + function
+            module_value = self.find_import(file_path, class_context)
+            if module_value:
+                potential_module, module_parts = self.split_module(
+                    module_value, file_path
+                )
+                target = module_parts[-1]
+                for candidate_path in self.candidates(potential_module, target):
+                    candidate = self.file_index[candidate_path]
+                    if target in candidate.class_definition:
+                        return candidate_path, target + "." + function
+                    elif target in candidate.class_instances:
+                        return (
+                            candidate_path,
+                            candidate.class_instances[target] + "." + function,
+                        )
+        module_value = self.find_import(file_path, instance)
+        if module_value:
+            potential_module, module_parts = self.split_module(
+                module_value, file_path
+            )
+            target = module_parts[-1]
+            for candidate_path in self.candidates(potential_module, target):
+                candidate = self.file_index[candidate_path]
+                if target in candidate.class_definition:
+                    return candidate_path, target + "." + function
+                elif target in candidate.class_instances:
+                    return (
+                        candidate_path,
+                        candidate.class_instances[target] + "." + function,
+                    )
+                else:
+                    # only top-level function names remain in the index
+                    return candidate_path, target
+        return file_path, None
+
+    def _resolve_class(self, name, file_path):
+        base, function = self._split_name(name)
+        if base is None:
+            return file_path, None
+        entry = self.file_index[file_path]
+        if base in entry.class_instances:
+            class_context = entry.class_instances[base]
+            if class_context in entry.class_definition:
+                return file_path, class_context
+            module_value = self.find_import(file_path, class_context)
+            if module_value:
+                potential_module, module_parts = self.split_module(
+                    module_value, file_path
+                )
+                target = module_parts[-1]
+                for candidate_path in self.candidates(potential_module, target):
+                    candidate = self.file_index[candidate_path]
+                    if target in candidate.class_definition:
+                        return candidate_path, target
+                    elif target in candidate.class_instances:
+                        return candidate_path, candidate.class_instances[target]
+        module_value = self.find_import(file_path, base)
+        if module_value:
+            potential_module, _ = self.split_module(module_value, file_path)
+            for candidate_path in self.candidates(potential_module, function):
+                candidate = self.file_index[candidate_path]
+                if function in candidate.class_definition:
+                    return candidate_path, function
+                elif function in candidate.class_instances:
+                    return candidate_path, candidate.class_instances[function]
+                else:
+                    return candidate_path, function
+        return file_path, None
@@ -0,0 +1,77 @@
+"""
+Times call site and nested class collection with FILE_QUERY captures against
+the recursive walk it replaced, over every Python file under a directory
+(this repository's server package by default):
+
+    python tests/bench_call_extraction.py [directory] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import conftest  # noqa: E402,F401  configures server before it is imported
+import server.parse as parse  # noqa: E402
+from test_call_extraction import (  # noqa: E402
+    traverse_function_calls,
+    traverse_inner_classes,
+)
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument(
+        "directory",
+        nargs="?",
+        default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server"),
+    )
+    argument_parser.add_argument("--repeat", type=int, default=5)
+    arguments = argument_parser.parse_args()
+
+    sources = []
+    for file_path in sorted(glob.glob(os.path.join(arguments.directory, "**", "*.py"), recursive=True)):
+        with open(file_path, encoding="utf-8", errors="replace") as source_file:
+            source_code = source_file.read()
+        sources.append((source_code, parse.parser.parse(bytes(source_code, "utf8"))))
+
+    def captured():
+        for source_code, tree in sources:
+            parse.map_user_defined_functions(source_code, tree)
+
+    def traversed():
+        collect_function_calls = parse.collect_function_calls
+        collect_inner_classes = parse.collect_inner_classes
+        parse.collect_function_calls = traverse_function_calls
+        parse.collect_inner_classes = traverse_inner_classes
+        try:
+            for source_code, tree in sources:
+                parse.map_user_defined_functions(source_code, tree)
+        finally:
+            parse.collect_function_calls = collect_function_calls
+            parse.collect_inner_classes = collect_inner_classes
+
+    functions = sum(
+        len(parse.map_user_defined_functions(source_code, tree)["functions"])
+        for source_code, tree in sources
+    )
+    print(f"{len(sources)} files, {functions} functions, best of {arguments.repeat}")
+    traversed_time = best_of(arguments.repeat, traversed)
+    captured_time = best_of(arguments.repeat, captured)
+    print(f"recursive traverse_node: {traversed_time * 1000:.1f} ms")
+    print(f"FILE_QUERY captures:     {captured_time * 1000:.1f} ms ({traversed_time / captured_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
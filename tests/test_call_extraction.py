@@ -0,0 +1,227 @@
+import os
+
+import pytest
+
+import server.parse as parse
+from conftest import write_files
+from server.utils.file_records import FileRecord
+from server.utils.parse_manifest import EdgeRecorder
+from server.utils.symbol_index import SymbolIndex
+
+FILES = {
+    "app/main.py": '''\
+from fastapi import APIRouter, Depends
+from app.auth import get_current_user, get_db
+from app.services import UserService, helpers
+import app.services as services
+
+router = APIRouter()
+service = UserService()
+
+
+@router.get("/users/{user_id}")
+async def read_user(user_id: int, user=Depends(get_current_user), db=Depends(get_db)):
+    record = service.fetch(user_id)
+    helpers.audit(record, log=helpers.format_entry(user))
+    return services.serialize(record)
+
+
+@router.post("/users")
+def create_user(payload: dict, settings=Depends(Depends(get_db))):
+    def inner(value):
+        return helpers.normalize(value)
+
+    return UserService().create(inner(payload), callback=lambda: helpers.audit(payload))
+
+
+def plain():
+    return read_user(1)
+''',
+    "app/auth.py": '''\
+def get_db():
+    return connect()
+
+
+def connect():
+    return None
+
+
+def get_current_user(token=None):
+    return decode(token).get("sub")
+
+
+def decode(token):
+    return {}
+''',
+    "app/services.py": '''\
+from pydantic import BaseModel
+
+import app.helpers as helpers
+from app.auth import get_db
+
+
+class UserService:
+    class Meta(BaseModel):
+        class Options:
+            ordering = ["id"]
+
+    def fetch(self, user_id):
+        return self.load(user_id).first()
+
+    @staticmethod
+    def load(user_id):
+        return get_db().query(user_id)
+
+    @property
+    def name(self):
+        return self.__class__.__name__.lower()
+
+    def create(self, payload):
+        return self.fetch(payload["id"]) or helpers.normalize(payload)
+
+
+class Admin(UserService):
+    def fetch(self, user_id):
+        return super().fetch(user_id)
+
+
+class Request(BaseModel):
+    class Config:
+        extra = "forbid"
+
+    name: str
+
+
+def serialize(record):
+    return dict(record)
+''',
+    "app/helpers.py": '''\
+def audit(record, log=None):
+    return format_entry(record)
+
+
+def format_entry(entry):
+    return str(entry)
+
+
+def normalize(value):
+    return audit(value)
+''',
+}
+
+
+# The recursive walk call sites and nested classes were collected with
+# before they came from FILE_QUERY captures
+def traverse_node(node, calls, class_context=None):
+    depends_call = node.type == "default_parameter" and "Depends" in node.text.decode("utf8")
+    if depends_call:
+        depends_text = node.text.decode("utf8")
+        start_index = 0
+        while True:
+            start_index = depends_text.find("Depends(", start_index)
+            if start_index == -1:
+                break
+            start_index += len("Depends(")
+            end_index = depends_text.find(")", start_index)
+            calls[depends_text[start_index:end_index]] = None
+            start_index = end_index
+    if node.type == "call":
+        called_function = parse.extract_called_function_name(node, class_context)
+        if called_function:
+            calls[called_function] = None
+    for child in node.children:
+        traverse_node(child, calls, class_context)
+
+
+def traverse_function_calls(node, class_context=None, file_captures=None):
+    calls = {}
+    traverse_node(node, calls, class_context)
+    return list(calls)
+
+
+def traverse_inner_classes(node, file_captures=None, inner_classes=None):
+    if inner_classes is None:
+        inner_classes = []
+    for child in node.children:
+        if child.type == "class_definition":
+            inner_classes.append({
+                "name": child.children[1].text.decode("utf8"),
+                "bases": parse.get_class_bases(child),
+            })
+        traverse_inner_classes(child, inner_classes=inner_classes)
+    return inner_classes
+
+
+def build_graph(directory):
+    file_index = {}
+    user_defined_functions = {}
+    results = {}
+    for relative_path in sorted(FILES):
+        file_path = os.path.join(directory, relative_path)
+        _, results[file_path] = parse.extract_file(file_path)
+        parse.index_file(
+            directory,
+            file_path,
+            FileRecord.from_result(file_path.replace(directory, ""), results[file_path]),
+            file_index,
+            user_defined_functions,
+        )
+    symbol_index = SymbolIndex(file_index)
+    edge_recorder = EdgeRecorder()
+    for file_path in file_index:
+        parse.process_function_calls(
+            directory,
+            user_defined_functions,
+            file_path,
+            file_index,
+            symbol_index,
+            edge_recorder,
+        )
+    return results, edge_recorder
+
+
+@pytest.fixture
+def graphs(repo_dir, monkeypatch):
+    write_files(repo_dir, FILES)
+    captured = build_graph(repo_dir)
+    monkeypatch.setattr(parse, "collect_function_calls", traverse_function_calls)
+    monkeypatch.setattr(parse, "collect_inner_classes", traverse_inner_classes)
+    traversed = build_graph(repo_dir)
+    return captured, traversed
+
+
+def test_extraction_matches_traversal(graphs):
+    (captured, _), (traversed, _) = graphs
+    assert captured == traversed
+    services = next(
+        result for file_path, result in captured.items()
+        if file_path.endswith("services.py")
+    )
+    assert services["classes"][0]["inner_classes"] == [
+        {"name": "Meta", "bases": ["BaseModel"]},
+        {"name": "Options", "bases": []},
+    ]
+    main = next(
+        result for file_path, result in captured.items()
+        if file_path.endswith("main.py")
+    )
+    assert main["functions"]["read_user"]["calls"] == [
+        "router.get",
+        "get_current_user",
+        "Depends",
+        "get_db",
+        "service.fetch",
+        "helpers.audit",
+        "helpers.format_entry",
+        "services.serialize",
+    ]
+
+
+def test_call_edges_match_traversal(graphs):
+    (_, captured), (_, traversed) = graphs
+    assert captured.edges == traversed.edges
+    assert ("/app/main.py:read_user", "/app/auth.py:get_current_user") in captured.edges
+    assert ("/app/main.py:plain", "/app/main.py:read_user") in captured.edges
+    assert (
+        "/app/services.py:UserService.fetch", "/app/services.py:UserService.load"
+    ) in captured.edges
@@ -0,0 +1,83 @@
+import itertools
+import os
+
+import pytest
+
+import server.parse as parse
+import server.utils.extraction_cache as extraction_cache
+from conftest import write_files
+from server.utils.extraction_cache import ExtractionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(str(tmp_path / "cache" / "extraction.db"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Every put and get is a tick later than the one before
+    ticks = itertools.count(1)
+    monkeypatch.setattr(extraction_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_round_trip(cache):
+    result = {"functions": {"main": {"calls": ["run"]}}, "classes": []}
+    cache.put_many({"v:a": result})
+    assert cache.get_many(["v:a", "v:b"]) == {"v:a": result}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    path = str(tmp_path / "extraction.db")
+    probe = ExtractionCache(path)
+    probe.put_many({"a": {"n": 0}})
+    entry_size = probe.stats()["size_bytes"]
+    # Room for two entries; a third trims the cache to 90% of that, which
+    # takes one eviction
+    cache = ExtractionCache(path, max_bytes=entry_size * 2 + entry_size // 2)
+    cache.put_many({"b": {"n": 1}})
+    assert cache.get_many(["a"]) == {"a": {"n": 0}}
+    cache.put_many({"c": {"n": 2}})
+    assert cache.evictions == 1
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_keys_carry_version_and_digest(monkeypatch):
+    key = parse.get_extraction_cache_key("/repo/app/views.py", "d1")
+    assert key == f"{parse.EXTRACTION_VERSION}:d1"
+    # Same contents share an entry wherever they live
+    assert parse.get_extraction_cache_key("/other/views.py", "d1") == key
+    assert parse.get_extraction_cache_key("/repo/app/views.py", "d2") != key
+    # urlpatterns are only extracted from urls.py
+    assert parse.get_extraction_cache_key("/repo/app/urls.py", "d1") != key
+    monkeypatch.setattr(parse, "EXTRACTION_VERSION", "next")
+    assert parse.get_extraction_cache_key("/repo/app/views.py", "d1") != key
+
+
+def test_extract_files_reuses_results(repo_dir, cache, monkeypatch):
+    source = "def main():\n    return run()\n"
+    write_files(repo_dir, {"a/views.py": source, "b/views.py": source, "b/urls.py": source})
+    file_paths = [
+        os.path.join(repo_dir, relative_path)
+        for relative_path in ("a/views.py", "b/views.py", "b/urls.py")
+    ]
+
+    def extract(paths):
+        counters = {}
+        results = {
+            file_path: file_result
+            for file_path, _, file_result in parse.extract_files(paths, cache, counters=counters)
+        }
+        return results, counters
+
+    results, counters = extract(file_paths[:1])
+    assert counters == {"cache_hits": 0, "cache_misses": 1}
+    cached_results, counters = extract(file_paths)
+    # urls.py has the same contents but a key of its own
+    assert counters == {"cache_hits": 2, "cache_misses": 1}
+    assert cached_results[file_paths[1]] == results[file_paths[0]]
+    monkeypatch.setattr(parse, "EXTRACTION_VERSION", "next")
+    _, counters = extract(file_paths)
+    assert counters == {"cache_hits": 0, "cache_misses": 3}
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from conftest import write_files
+from server.utils.file_filter import FileFilter
+
+FILES = {
+    ".gitignore": "generated/\n*.local.py\n!keep.local.py\n/rootonly.py\n",
+    "app/.gitignore": "secret.py\n/anchored.py\n",
+    "app/main.py": "",
+    "app/anchored.py": "",
+    "app/sub/anchored.py": "",
+    "app/sub/secret.py": "",
+    "other/secret.py": "",
+    "generated/client.py": "",
+    # Negated, but git does not look inside an excluded directory
+    "generated/keep.local.py": "",
+    "lib/settings.local.py": "",
+    "lib/keep.local.py": "",
+    "rootonly.py": "",
+    "pkg/rootonly.py": "",
+    "venv/lib/site.py": "",
+    "build/setup_helpers.py": "",
+    "scripts/deploy.py": "",
+    "app/migrations/versions/0001_initial.py": "",
+    "app/api_pb2.py": "",
+    "app/test_main.py": "",
+    "app/README.md": "",
+    "app/big.py": "x = 1\n" * 100,
+}
+
+PARSED = {
+    "app/main.py",
+    "app/sub/anchored.py",
+    "other/secret.py",
+    "lib/keep.local.py",
+    "pkg/rootonly.py",
+    "build/setup_helpers.py",
+}
+
+# The project re-includes build/, which the default deny-list excludes
+PATTERNS = ["!build/", "scripts/"]
+
+
+@pytest.fixture
+def sources(repo_dir):
+    write_files(repo_dir, FILES)
+    return {
+        os.path.join(repo_dir, relative_path): contents.encode("utf-8")
+        for relative_path, contents in FILES.items()
+    }
+
+
+def list_relative(repo_dir, file_filter):
+    return {
+        os.path.relpath(file_path, repo_dir)
+        for file_path in file_filter.list_python_files()
+    }
+
+
+def test_lists_files_on_disk(repo_dir, sources):
+    file_filter = FileFilter(repo_dir, PATTERNS, max_file_bytes=300)
+    assert list_relative(repo_dir, file_filter) == PARSED
+    # Excluded directories are pruned and counted once
+    assert file_filter.skipped == {
+        "dirs_gitignore": 1,
+        "dirs_default": 2,
+        "dirs_project": 1,
+        "files_gitignore": 4,
+        "files_default": 1,
+        "files_size": 1,
+    }
+
+
+def test_streamed_listing_matches_disk(repo_dir, sources):
+    file_filter = FileFilter(repo_dir, PATTERNS, max_file_bytes=300, sources=sources)
+    assert list_relative(repo_dir, file_filter) == PARSED
+    # Nothing is walked, so every file is counted
+    assert file_filter.skipped == {
+        "files_gitignore": 6,
+        "files_default": 3,
+        "files_project": 1,
+        "files_size": 1,
+    }
+
+
+@pytest.mark.parametrize(
+    "relative_path, is_dir, reason",
+    [
+        ("app/anchored.py", False, "gitignore"),
+        ("app/sub/anchored.py", False, None),
+        ("app/sub/secret.py", False, "gitignore"),
+        ("other/secret.py", False, None),
+        ("lib/settings.local.py", False, "gitignore"),
+        ("lib/keep.local.py", False, None),
+        ("pkg/rootonly.py", False, None),
+        ("deep/tree/node_modules", True, "default"),
+        ("app/migrations/versions", True, "default"),
+        ("build", True, None),
+        ("build", False, None),
+        ("scripts", True, "project"),
+    ],
+)
+def test_match(repo_dir, sources, relative_path, is_dir, reason):
+    assert FileFilter(repo_dir, PATTERNS).match(relative_path, is_dir) == reason
+
+
+def test_excluded_dir_is_memoized(repo_dir, sources, monkeypatch):
+    file_filter = FileFilter(repo_dir, PATTERNS)
+    matched = []
+    match = file_filter.match
+    monkeypatch.setattr(
+        file_filter, "match", lambda *args: matched.append(args) or match(*args)
+    )
+    assert file_filter.excluded_dir("generated/nested/deeper") == "gitignore"
+    assert file_filter.excluded_dir("app/sub") is None
+    calls = len(matched)
+    # Parents are resolved once and exclusion carries over to children
+    assert file_filter._directories["generated"] == "gitignore"
+    assert file_filter._directories["generated/nested"] == "gitignore"
+    assert file_filter.excluded_dir("generated/nested") == "gitignore"
+    assert file_filter.excluded_dir("app") is None
+    assert len(matched) == calls
+    assert file_filter.excluded_dir("") is None
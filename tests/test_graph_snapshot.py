@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+import pytest
+
+from server.utils.graph_snapshot import GraphSnapshot, GraphSnapshotStore
+from server.utils.sqlite_graph import SqliteGraph
+
+PROJECT_ID = 7
+
+# f -> a -> b -> d -> e -> b is a cycle through b, c joins at d, h calls
+# into the cycle and g is on its own
+EDGES = [
+    ("/app.py:a", "/app.py:b"),
+    ("/app.py:a", "/app.py:c"),
+    ("/app.py:b", "/lib.py:d"),
+    ("/app.py:c", "/lib.py:d"),
+    ("/lib.py:d", "/lib.py:e"),
+    ("/lib.py:e", "/app.py:b"),
+    ("/app.py:f", "/app.py:a"),
+    ("/lib.py:h", "/lib.py:e"),
+]
+NODE_IDS = sorted({node_id for edge in EDGES for node_id in edge} | {"/lib.py:g"})
+ENDPOINT_IDS = ["/app.py:a", "/app.py:f", "/lib.py:h"]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    graph = SqliteGraph(str(tmp_path / "graph" / "graph.db"))
+    for position, node_id in enumerate(NODE_IDS):
+        graph.upsert_node(node_id, {
+            "file": f"/repo{node_id.split(':')[0]}",
+            "start": position * 10,
+            "end": position * 10 + 5,
+            "type": "FUNCTION",
+        }, PROJECT_ID)
+    for source, target in EDGES:
+        graph.connect_nodes(source, target, PROJECT_ID, {"action": "calls"})
+    return graph
+
+
+@pytest.fixture
+def snapshot(backend):
+    nodes, edges = backend.export_call_graph(PROJECT_ID)
+    return GraphSnapshot.build(PROJECT_ID, "c1", nodes, edges, ENDPOINT_IDS)
+
+
+def test_build_compressed_adjacency():
+    nodes = [
+        {"id": node_id, "file": "/repo/app.py", "start": 1, "end": 2, "type": "FUNCTION"}
+        for node_id in ("n0", "n1", "n2", "n3")
+    ]
+    edges = [("n0", "n2"), ("n0", "n1"), ("n2", "n1"), ("n3", "n0"), ("n1", "unknown")]
+    snapshot = GraphSnapshot.build(1, "c1", nodes, edges)
+    assert snapshot.out_offsets.tolist() == [0, 2, 2, 3, 4]
+    assert snapshot.out_targets.tolist() == [1, 2, 1, 0]
+    assert snapshot.in_offsets.tolist() == [0, 1, 3, 4, 4]
+    assert snapshot.in_targets.tolist() == [3, 0, 2, 0]
+    assert [snapshot.node_id(position) for position in range(4)] == ["n0", "n1", "n2", "n3"]
+    assert snapshot.node(2)["file"] == "/repo/app.py"
+
+
+def test_save_and_load(snapshot, tmp_path):
+    snapshot_dir = snapshot.save(str(tmp_path / "snapshots"))
+    loaded = GraphSnapshot.load(snapshot_dir)
+    assert isinstance(loaded.out_targets, np.memmap)
+    assert (loaded.project_id, loaded.commit_id) == (PROJECT_ID, "c1")
+    for name in ("id_offsets", "out_offsets", "out_targets", "in_offsets", "in_targets", "reach_endpoints"):
+        assert np.array_equal(getattr(loaded, name), getattr(snapshot, name))
+    reachability = loaded.find_reachable("/app.py:f")
+    assert reachability.depths == snapshot.find_reachable("/app.py:f").depths
+    assert reachability.start == snapshot.node(snapshot.node_index("/app.py:f"))
+
+
+def test_store_follows_current(snapshot, tmp_path, monkeypatch):
+    root = str(tmp_path / "snapshots")
+    project_dir = os.path.join(root, str(PROJECT_ID))
+    store = GraphSnapshotStore(root)
+    assert store.get(PROJECT_ID) is None
+    first_dir = snapshot.save(root)
+    first = store.get(PROJECT_ID)
+    assert first.commit_id == "c1"
+    assert store.get(PROJECT_ID) is first
+
+    snapshot.commit_id = "c2"
+    second_dir = snapshot.save(root)
+    # CURRENT is swapped in place and the previous snapshot is pruned
+    assert sorted(os.listdir(project_dir)) == sorted(["CURRENT", os.path.basename(second_dir)])
+    assert not os.path.exists(first_dir)
+    assert store.get(PROJECT_ID).commit_id == "c2"
+
+    monkeypatch.setenv("GRAPH_SNAPSHOT", "disabled")
+    assert store.get(PROJECT_ID) is None
+    monkeypatch.delenv("GRAPH_SNAPSHOT")
+    GraphSnapshot.invalidate(PROJECT_ID, root)
+    assert store.get(PROJECT_ID) is None
+    assert os.path.isdir(second_dir)
+
+
+@pytest.mark.parametrize("direction", ["outbound", "inbound", "both"])
+@pytest.mark.parametrize("start_id", NODE_IDS)
+def test_find_reachable_matches_backend(backend, snapshot, start_id, direction):
+    expected = backend.find_reachable(start_id, PROJECT_ID, direction)
+    reachability = snapshot.find_reachable(start_id, PROJECT_ID, direction)
+    assert reachability.depths == expected.depths
+    assert reachability.truncated is expected.truncated is False
+    assert [node["id"] for node in reachability.ordered()] == [
+        node["id"] for node in expected.ordered()
+    ]
+    for node in reachability.nodes.values():
+        assert {key: expected.nodes[node["id"]][key] for key in node} == node
+    assert snapshot.find_reachable("/app.py:missing") is None
+
+
+@pytest.mark.parametrize("direction", ["outbound", "inbound", "both"])
+@pytest.mark.parametrize("max_depth", [0, 1, 2])
+def test_depth_cap_matches_backend(backend, snapshot, direction, max_depth):
+    expected = backend.find_reachable("/app.py:a", PROJECT_ID, direction, max_depth=max_depth)
+    reachability = snapshot.find_reachable("/app.py:a", PROJECT_ID, direction, max_depth=max_depth)
+    assert reachability.depths == expected.depths
+    assert reachability.truncated is expected.truncated
+
+
+@pytest.mark.parametrize("direction", ["outbound", "both"])
+@pytest.mark.parametrize("max_nodes", [1, 2, 3, 4, 6, 20])
+def test_node_cap_matches_backend(backend, snapshot, direction, max_nodes):
+    # Which nodes of the last level make the cut depends on traversal order,
+    # how many do and at what depth does not
+    expected = backend.find_reachable("/app.py:f", PROJECT_ID, direction, max_nodes=max_nodes)
+    reachability = snapshot.find_reachable("/app.py:f", PROJECT_ID, direction, max_nodes=max_nodes)
+    assert len(reachability.nodes) == len(expected.nodes) <= max_nodes
+    assert sorted(reachability.depths.values()) == sorted(expected.depths.values())
+    assert reachability.truncated is expected.truncated
+
+
+@pytest.mark.parametrize("max_depth", ["1", "2", "25"])
+def test_find_reaching_endpoints_matches_backend(backend, monkeypatch, max_depth):
+    monkeypatch.setenv("REACHABILITY_MAX_DEPTH", max_depth)
+    nodes, edges = backend.export_call_graph(PROJECT_ID)
+    snapshot = GraphSnapshot.build(PROJECT_ID, "c1", nodes, edges, ENDPOINT_IDS)
+    for identifiers in [[node_id] for node_id in NODE_IDS] + [["/lib.py:d", "/lib.py:g"], []]:
+        assert snapshot.find_reaching_endpoints(identifiers) == backend.find_reaching_endpoints(
+            identifiers, ENDPOINT_IDS, PROJECT_ID
+        )
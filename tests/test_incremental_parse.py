@@ -0,0 +1,237 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import server.endpoint_detection as endpoint_detection
+import server.parse as parse
+from conftest import write_files
+
+FILES = {
+    "app/main.py": '''\
+from fastapi import APIRouter, Depends
+from app.auth import get_current_user
+from app.helpers import audit, format_entry
+from app.legacy import legacy_report
+from app.models import User
+
+router = APIRouter()
+
+
+@router.get("/users/{user_id}")
+def read_user(user_id: int, user=Depends(get_current_user)):
+    audit(user_id)
+    return User(id=user_id)
+
+
+@router.get("/report")
+def report():
+    return legacy_report(format_entry("report"))
+''',
+    "app/auth.py": '''\
+def get_current_user(token=None):
+    return decode(token)
+
+
+def decode(token):
+    return connect()
+
+
+def connect():
+    return None
+''',
+    "app/helpers.py": '''\
+def audit(record):
+    return format_entry(record)
+
+
+def format_entry(entry):
+    return str(entry)
+''',
+    "app/legacy.py": '''\
+from app.helpers import format_entry
+
+
+def legacy_report(entry):
+    return format_entry(entry)
+''',
+    "app/models.py": '''\
+from pydantic import BaseModel
+
+
+class Base(BaseModel):
+    id: int
+
+
+class User(Base):
+    name: str = ""
+
+
+class Group(BaseModel):
+    name: str
+
+
+class Admin(User):
+    level: int = 0
+''',
+    "app/unchanged.py": '''\
+from app.auth import decode
+
+
+def check(token):
+    return decode(token)
+''',
+}
+
+
+class FakeSession:
+    # Endpoint rows go to Postgres, which these tests do not compare
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement):
+        pass
+
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def delete(self, **kwargs):
+        pass
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def parse_project(monkeypatch):
+    commits = {}
+    monkeypatch.setattr(endpoint_detection, "SessionManager", FakeSession)
+    monkeypatch.setattr(endpoint_detection.celery_worker, "send_task", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        parse.project_manager,
+        "get_project_from_db_by_id",
+        lambda project_id: {"commit_id": commits[project_id]},
+    )
+    monkeypatch.setattr(parse.project_manager, "get_parse_ignore", lambda project_id: [])
+
+    def run(directory, project_id, commit_id, commit_diff=None):
+        commits[project_id] = commit_id
+        return parse.analyze_directory(directory, "user", project_id, commit_diff)
+
+    return run
+
+
+def get_graph(project_id):
+    connection = parse.graph_db._connect()
+    nodes = {}
+    for node_id, body in connection.execute(
+        "SELECT id, body FROM nodes WHERE project_id = ?", (project_id,)
+    ):
+        properties = json.loads(body)
+        properties.pop("project_id", None)
+        nodes[node_id] = properties
+    edges = {
+        (edge_type, source, target)
+        for edge_type, source, target in connection.execute(
+            "SELECT type, source, target FROM edges WHERE project_id = ?", (project_id,)
+        )
+    }
+    return nodes, edges
+
+
+def change_repository(directory):
+    # Modified: decode no longer calls connect, which is gone, User extends
+    # BaseModel directly and Admin extends Group instead of User
+    write_files(directory, {
+        "app/auth.py": '''\
+def get_current_user(token=None):
+    return verify(decode(token))
+
+
+def decode(token):
+    return token
+
+
+def verify(claims):
+    return claims
+''',
+        "app/models.py": '''\
+from pydantic import BaseModel
+
+
+class User(BaseModel):
+    name: str = ""
+
+
+class Group(BaseModel):
+    name: str
+
+
+class Admin(Group):
+    level: int = 0
+''',
+    })
+    # Deleted: report() in the unchanged main.py loses its call to it
+    os.remove(os.path.join(directory, "app/legacy.py"))
+    # Renamed: callers importing from app.helpers no longer resolve
+    os.makedirs(os.path.join(directory, "app/util"))
+    shutil.move(
+        os.path.join(directory, "app/helpers.py"),
+        os.path.join(directory, "app/util/helpers.py"),
+    )
+    return {
+        "base_commit": "c1",
+        "files": [
+            "/app/auth.py",
+            "/app/models.py",
+            "/app/legacy.py",
+            "/app/helpers.py",
+            "/app/util/helpers.py",
+        ],
+    }
+
+
+@pytest.mark.parametrize("use_commit_diff", [True, False], ids=["commit_diff", "digest"])
+def test_incremental_parse_matches_full_parse(repo_dir, parse_project, use_commit_diff):
+    project_id = 500 + use_commit_diff
+    write_files(repo_dir, FILES)
+    first = parse_project(repo_dir, project_id, "c1")
+    assert first["metrics"]["mode"] == "full"
+    first_nodes, first_edges = get_graph(project_id)
+    assert "/app/legacy.py:legacy_report" in first_nodes
+    assert ("CALLS", "/app/main.py:report", "/app/legacy.py:legacy_report") in first_edges
+    assert ("CALLS", "/app/auth.py:decode", "/app/auth.py:connect") in first_edges
+    assert ("EXTENDS", "/app/models.py:User", "/app/models.py:Base") in first_edges
+    assert ("EXTENDS", "/app/models.py:Admin", "/app/models.py:User") in first_edges
+
+    commit_diff = change_repository(repo_dir)
+    second = parse_project(
+        repo_dir, project_id, "c2", commit_diff if use_commit_diff else None
+    )
+    assert second["metrics"]["mode"] == "incremental"
+    # auth.py, models.py and the renamed helpers; main.py and unchanged.py
+    # are carried over
+    assert second["counters"]["files_extracted"] == 3
+    assert second["counters"]["files_deleted"] == 2
+
+    full_project_id = project_id + 100
+    parse_project(repo_dir, full_project_id, "c2")
+    incremental_nodes, incremental_edges = get_graph(project_id)
+    full_nodes, full_edges = get_graph(full_project_id)
+    assert incremental_nodes == full_nodes
+    assert incremental_edges == full_edges
+    assert "/app/legacy.py:legacy_report" not in incremental_nodes
+    assert "/app/models.py:Base" not in incremental_nodes
+    assert ("EXTENDS", "/app/models.py:Admin", "/app/models.py:Group") in incremental_edges
+    assert "/app/auth.py:verify" in incremental_nodes
+    assert ("CALLS", "/app/auth.py:get_current_user", "/app/auth.py:verify") in incremental_edges
+    assert not any("/app/helpers.py:" in target for _, _, target in incremental_edges)
+